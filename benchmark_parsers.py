@@ -0,0 +1,263 @@
+import glob
+import logging
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from selenium import webdriver
+from selenium.common import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+from src.Dtos import StatDto
+from src.ScrapingService import CommandCounter, create_stealth_driver, quit_driver
+from src.Utils import parse_float, remove_duplicates, try_get_element_text
+from src.scrapers import Bet365, Dafabet, Pinnacle, pinatest
+
+# Saved match pages, one folder per scraper. Webscraper.snapshot_mode adds the pages of a real run
+corpus_folder = "./data/snapshots"
+
+# Parses of every snapshot, the throughput is averaged over all of them
+repeat = 50
+
+# Webdriver commands the script read of a match may take, every scraper reads all its markets in a single call
+read_command_budget = 1
+
+# The reference readers below walk the page one WebElement at a time, the way the scrapers read it before the
+# single script reads and the page source parsers. They share no parsing code with either, so --check catches
+# a parser drifting from what the browser shows
+
+
+def read_bet365_elements(driver: webdriver.Chrome) -> Dict[str, List[StatDto]]:
+    stats: Dict[str, List[StatDto]] = {}
+
+    def get_stat(name) -> StatDto:
+        if name not in stats:
+            stats[name] = [StatDto(-1, -1, -1)]
+        return stats[name][0]
+
+    for stat_element in driver.find_elements(By.CLASS_NAME, "gl-MarketGroup"):
+        title = stat_element.find_element(By.CLASS_NAME, "gl-MarketGroupButton_Text").text
+        stat_groups = stat_element.find_elements(By.CSS_SELECTOR, ".gl-MarketGroupContainer > div > div")
+
+        if title == Bet365.duration_map_stat_name:
+            try:
+                duration_threshold_str = stat_element.find_element(
+                    By.XPATH, './/div[contains(@class, "srb-ParticipantLabelCentered_Name")]').text
+                duration_to_float = lambda s: float(s.split(':')[0]) + float(s.split(':')[1])/60
+                over_odds = float(stat_element.find_element(
+                    By.XPATH, './/div[contains(text(), "Mais de ou Exatamente")]/following-sibling::div/span').text)
+                under_odds = float(stat_element.find_element(
+                    By.XPATH, './/div[contains(text(), "Menos de")]/following-sibling::div/span').text)
+                stats[Bet365.duration_map_stat_name] = [StatDto(
+                    total_amount=duration_to_float(duration_threshold_str),
+                    home_team_score=over_odds,
+                    away_team_score=under_odds
+                )]
+                continue
+            except Exception as e:
+                print(f"Failed to extract {title} stat. Error: {e}")
+
+        labels = []
+        table_index = 0
+        home_team = True
+        for group in stat_groups:
+            clazz = group.get_attribute("class")
+            odds = parse_float(try_get_element_text(
+                group, By.CLASS_NAME, "srb-ParticipantCenteredStackedMarketRow_Odds", "-1"))
+            handicap = parse_float(try_get_element_text(
+                group, By.CLASS_NAME, "srb-ParticipantCenteredStackedMarketRow_Handicap", "-1"))
+
+            if "gl-ParticipantBorderless" in clazz:
+                team_value = parse_float(group.find_elements(By.TAG_NAME, "span")[1].text)
+                stat = get_stat(title)
+                if stat.home_team_score == -1:
+                    stat.home_team_score = team_value
+                else:
+                    stat.away_team_score = team_value
+            elif "srb-ParticipantLabel" in clazz:
+                labels.append(group.text)
+            elif "srb-ParticipantCenteredStackedMarketRow" in clazz:
+                stat = get_stat(labels[table_index])
+                if home_team:
+                    stat.home_team_score = odds
+                else:
+                    stat.away_team_score = odds
+                stat.total_amount = abs(handicap)
+                table_index += 1
+            elif "gl-MarketColumnHeader" in clazz and table_index > 0:
+                table_index = 0
+                home_team = False
+    return stats
+
+
+def read_pinnacle_elements(driver: webdriver.Chrome) -> Dict[str, List[StatDto]]:
+    stats: Dict[str, List[StatDto]] = {}
+    buttons_xpath = "./div[@class='style_content__23pgc collapse-content']/div/div/div/button"
+    for stat in driver.find_elements(By.XPATH, pinatest.map_market_groups_xpath):
+        stat_name = stat.find_element(By.CSS_SELECTOR, "div.style_title__2wOdP > span").text
+        if stat_name not in Pinnacle.interested_stats:
+            continue
+
+        teams = [parse_float(x.text) for x in stat.find_elements(By.XPATH, buttons_xpath + "/span[2]")]
+        labels = [x.text for x in stat.find_elements(By.XPATH, buttons_xpath + "/span[1]")]
+        content = list(zip(teams, labels))
+        pairwise = [[content[i], content[i + 1]] for i in range(0, len(content), 2)]
+        if stat_name not in stats:
+            stats[stat_name] = []
+
+        for home, away in pairwise:
+            value = -1
+            if ("Acima" in home[1] or "Mais" in home[1]) or (
+                not re.match(Pinnacle.extract_number_regex, home[1])
+                and not re.match(Pinnacle.extract_number_regex, away[1])
+            ):
+                if "Minutos" in home[1]:
+                    value = Pinnacle.extract_value_from_label(home[1])
+                else:
+                    try:
+                        value = abs(parse_float(re.sub(Pinnacle.extract_number_regex, "", home[1]))) / 10
+                    except ValueError:
+                        logging.error("Failed to parse float value from string: %s", home[1])
+
+            stats[stat_name].append(StatDto(value, home[0], away[0]))
+    return remove_duplicates(stats)
+
+
+def read_dafabet_elements(driver: webdriver.Chrome) -> Dict[str, List[StatDto]]:
+    stats: Dict[str, List[StatDto]] = {}
+    for stat in driver.find_elements(By.CLASS_NAME, "PrematchMarket_eachItem"):
+        try:
+            home_team_odds = parse_float(stat.find_element(By.CLASS_NAME, "itemTeamAContent_left")
+                                         .find_element(By.CLASS_NAME, "odds_value").text)
+            away_team_odds = parse_float(stat.find_element(By.CLASS_NAME, "itemTeamBContent_right")
+                                         .find_element(By.CLASS_NAME, "odds_value").text)
+            name = (stat.find_element(By.CLASS_NAME, "itemContent_center")
+                    .find_element(By.CLASS_NAME, "resultDescription").text)
+        except NoSuchElementException:
+            continue
+        try:
+            total_amount = parse_float(stat.find_element(By.CLASS_NAME, "totalAmount_wrap")
+                                       .find_element(By.CLASS_NAME, "totalAmount").text)
+        except NoSuchElementException:
+            total_amount = -1
+
+        if name not in stats:
+            stats[name] = []
+        stats[name].append(StatDto(total_amount, home_team_odds, away_team_odds))
+    return remove_duplicates(stats)
+
+
+Parse = Callable[[str], Dict[str, List[StatDto]]]
+Read = Callable[[webdriver.Chrome], Dict[str, List[StatDto]]]
+
+# Page source parser, single script read and reference read of every scraper, by the folder its snapshots are
+# saved in
+parsers: Dict[str, Tuple[Parse, Read, Read]] = {
+    "Bet365Webscraper": (
+        Bet365.parse_page_source,
+        lambda driver: Bet365.parse_market_groups(driver.execute_script(Bet365.read_market_groups_script)),
+        read_bet365_elements,
+    ),
+    "PinnacleWebscraper": (
+        pinatest.parse_page_source,
+        lambda driver: pinatest.parse_market_groups(
+            driver.execute_script(pinatest.harvest_read_script, pinatest.map_market_groups_xpath)
+        ),
+        read_pinnacle_elements,
+    ),
+    "DafabetWebscraper": (
+        Dafabet.parse_page_source,
+        lambda driver: Dafabet.map_items_to_stats(driver.execute_script(Dafabet.read_market_items_script)),
+        read_dafabet_elements,
+    ),
+}
+
+
+def comparable(stats: Dict[str, List[StatDto]]) -> Dict[str, set]:
+    """
+    The paths dedupe through sets, so the order of the stats isn't compared
+    """
+    return {
+        name: {(stat.total_amount, stat.home_team_score, stat.away_team_score) for stat in values}
+        for name, values in stats.items()
+    }
+
+
+def read_snapshots(scraper_name: str) -> Dict[str, str]:
+    snapshots = {}
+    for file_path in sorted(glob.glob(f"{corpus_folder}/{scraper_name}/*.html")):
+        with open(file_path, "r", encoding="utf-8") as f:
+            snapshots[file_path] = f.read()
+    return snapshots
+
+
+def benchmark(scraper_name: str, snapshots: Dict[str, str]) -> str:
+    parse, _, _ = parsers[scraper_name]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page_source in snapshots.values():
+            parse(page_source)
+    elapsed = time.perf_counter() - started
+    matches = repeat * len(snapshots)
+    return (f"[INFO] {scraper_name}: {matches} matches in {elapsed:.2f}s, "
+            f"{matches / elapsed:.0f} matches/sec, {elapsed / matches * 1000:.2f} ms/match")
+
+
+def check(driver: webdriver.Chrome, scraper_name: str, snapshots: Dict[str, str]) -> int:
+    """
+    Opens every snapshot in the browser and compares the stats of the page source parser and of the single script
+    read with the reference WebElement read
+    :return: Number of snapshots a path disagrees on or whose script read goes over the command budget
+    """
+    parse, read, reference = parsers[scraper_name]
+    commands = CommandCounter()
+    commands.attach(driver)
+    mismatches = 0
+    try:
+        for file_path, page_source in snapshots.items():
+            driver.get("file://" + os.path.abspath(file_path))
+            expected = comparable(reference(driver))
+            commands.track(file_path)
+            read_stats = comparable(read(driver))
+            commands.track(None)
+            parsed_stats = comparable(parse(page_source))
+            if parsed_stats != expected:
+                mismatches += 1
+                print(f"[ERROR] {file_path}: webdriver {expected}, page source {parsed_stats}")
+            elif read_stats != expected:
+                mismatches += 1
+                print(f"[ERROR] {file_path}: webdriver {expected}, script read {read_stats}")
+            elif commands.match_count(file_path) > read_command_budget:
+                mismatches += 1
+                print(f"[ERROR] {file_path}: script read took {commands.match_count(file_path)} commands, "
+                      f"over the budget of {read_command_budget}")
+    finally:
+        commands.detach()
+    print(f"[INFO] {scraper_name}: {len(snapshots) - mismatches}/{len(snapshots)} snapshots match the webdriver path")
+    return mismatches
+
+
+def main():
+    # The scrapers log every parsed market group on debug
+    logging.getLogger().setLevel(logging.INFO)
+    corpus = {name: read_snapshots(name) for name in parsers}
+    for name, snapshots in corpus.items():
+        if not snapshots:
+            print(f"[INFO] {name}: no snapshots in {corpus_folder}/{name}")
+            continue
+        print(benchmark(name, snapshots))
+
+    if "--check" in sys.argv:
+        driver = create_stealth_driver()
+        try:
+            mismatches = sum(check(driver, name, snapshots) for name, snapshots in corpus.items())
+        finally:
+            quit_driver(driver)
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import math
+import threading
+import time
+from typing import Type, List, Dict, Union
+
+from src.Dtos import GameDetailDto, GameOverviewDto
+from src.MockBookmakers import MockBookmakers, create_matches, match_id, corpus_scrapers
+from src.ScrapingService import Webscraper, fetch_games, export_trace
+from src.scrapers import Bet365, Dafabet, PinnacleApi
+from scrap_all import registered_scrapers
+
+# Size of the mock boards and the latency of every mock request
+match_count = 500
+latency_seconds = (0.05, 0.3)
+# Serves the saved pages of data/snapshots as match pages instead of generated ones
+corpus_folder: Union[str, None] = None
+
+reported_percentiles = [50, 90, 99]
+
+bookmakers = {scraper_name: bookmaker for bookmaker, scraper_name in corpus_scrapers.items()}
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class LoadReport:
+    """
+    Latency of a match runs from the first request for its markets until the scraper records the game
+    """
+
+    def __init__(self, name: str, mock: MockBookmakers):
+        self.name = name
+        self.mock = mock
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.finished: Union[float, None] = None
+        self.latencies: List[float] = []
+        self.games = 0
+        self.failures = 0
+
+    def done(self, overview_dto: GameOverviewDto, failed: bool = False):
+        now = time.perf_counter()
+        first_hit = self.mock.first_hits.get((bookmakers.get(self.name), match_id(overview_dto.home_team)))
+        with self.lock:
+            if failed:
+                self.failures += 1
+                return
+            self.games += 1
+            if first_hit is not None:
+                self.latencies.append(now - first_hit)
+
+    def describe(self) -> str:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        summary = (f"[INFO] {self.name}: {self.games} games, {self.failures} failed in {elapsed:.1f}s, "
+                   f"{self.games / elapsed * 60:.1f} matches/min")
+        if self.latencies:
+            summary += ", latency " + " ".join(
+                f"p{p}={percentile(self.latencies, p):.2f}s" for p in reported_percentiles
+            ) + f" max={max(self.latencies):.2f}s"
+        return summary
+
+
+def instrumented(service: Type[Webscraper], report: LoadReport) -> Type[Webscraper]:
+    """
+    Same scraper, reporting every game to the load report. Nothing of the run is kept: the mock teams
+    aren't in the database and the games shouldn't land in the state and cache files
+    """
+
+    class Instrumented(service):
+        stream_output = False
+        resume_mode = False
+        prefilter_teams = False
+        detail_cache_ttl = None
+        # A parser going back to reading the markets element by element fails the load test
+        strict_command_budget = True
+
+        def record(self, game: GameDetailDto):
+            report.done(game.overview)
+            super().record(game)
+
+        def record_failure(self, overview_dto: GameOverviewDto, reason: str):
+            report.done(overview_dto, failed=True)
+            super().record_failure(overview_dto, reason)
+
+    Instrumented.__name__ = service.__name__
+    Instrumented.__qualname__ = service.__qualname__
+    return Instrumented
+
+
+def point_scrapers_at(mock: MockBookmakers):
+    urls = mock.urls()
+    Bet365.site_url = urls["BET365_URL"]
+    # The mock leagues aren't on the target list
+    Bet365.target_leagues = []
+    Dafabet.site_url = urls["DAFABET_URL"]
+    PinnacleApi.site_url = urls["PINNACLE_URL"]
+    PinnacleApi.arcadia_base_url = urls["PINNACLE_API_URL"]
+
+
+def main():
+    mock = MockBookmakers(create_matches(match_count), latency_seconds, corpus_folder, ("127.0.0.1", 0)).start()
+    print(f"[INFO] Serving {match_count} matches per bookmaker on {mock.base_url}")
+    point_scrapers_at(mock)
+
+    reports: Dict[str, LoadReport] = {}
+    try:
+        for service in registered_scrapers:
+            report = LoadReport(service.__name__, mock)
+            reports[service.__name__] = report
+            try:
+                fetch_games(instrumented(service, report))
+            except Exception as e:
+                print(f"[ERROR] Load test of {service.__name__} failed: {e}")
+            report.finished = time.perf_counter()
+    finally:
+        mock.stop()
+        export_trace()
+
+    for report in reports.values():
+        print(report.describe())
+    print(f"[INFO] Mock served {mock.requests} requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import concurrent.futures
+import threading
+import time
+from typing import Type, List, Dict, Tuple
+
+from src.Dtos import GameDetailDto
+from src.Json import write_as_json_to_file
+from src.ScrapingService import Webscraper, fetch_games, HostRateLimiter, export_trace
+from src.Utils import get_current_folder
+from src.scrapers.Bet365 import Bet365Webscraper
+from src.scrapers.Dafabet import DafabetWebscraper
+from src.scrapers.pinatest import PinnacleWebscraper
+
+# Scrapers of a run, all of them run at the same time
+registered_scrapers: List[Type[Webscraper]] = [
+    PinnacleWebscraper,
+    DafabetWebscraper,
+    Bet365Webscraper,
+]
+
+# Browsers open at the same time, scrapers without a browser don't take a slot
+max_browsers = 2
+
+# Requests per second and burst size of every host
+default_host_rate: Tuple[float, float] = (1, 3)
+host_rates: Dict[str, Tuple[float, float]] = {
+    "www.bet365.com": (0.5, 2),
+    "guest.api.arcadia.pinnacle.com": (5, 10),
+}
+
+
+def scrap(
+    service: Type[Webscraper], rate_limiter: HostRateLimiter, browser_slots: threading.BoundedSemaphore
+) -> List[GameDetailDto]:
+    print(f"[INFO] Started scrap for {service.__name__}")
+    started = time.time()
+    if service.uses_browser():
+        with browser_slots:
+            games = fetch_games(service, rate_limiter=rate_limiter)
+    else:
+        games = fetch_games(service, rate_limiter=rate_limiter)
+    write_as_json_to_file(
+        f"{get_current_folder()}/games_{service.__name__}.json", games
+    )
+    print(f"[INFO] Finished scrap for {service.__name__}: {len(games)} games in {time.time() - started:.1f}s")
+    return games
+
+
+def main():
+    print("[INFO] Starting scraper")
+    started = time.time()
+    rate_limiter = HostRateLimiter(*default_host_rate, host_rates)
+    browser_slots = threading.BoundedSemaphore(max_browsers)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(registered_scrapers)) as executor:
+        futures = {
+            executor.submit(scrap, service, rate_limiter, browser_slots): service
+            for service in registered_scrapers
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                # One bookmaker failing doesn't lose the games of the others
+                print(f"[ERROR] Scrap for {futures[future].__name__} failed: {e}")
+
+    print(f"[INFO] Finished all scraps in {time.time() - started:.1f}s")
+    export_trace()
+
+
+if __name__ == "__main__":
+    main()
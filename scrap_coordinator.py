@@ -0,0 +1,52 @@
+import concurrent.futures
+import time
+from typing import Type, List
+
+from src.Dtos import GameDetailDto
+from src.Json import write_as_json_to_file
+from src.ScrapingService import Webscraper, fetch_games, HostRateLimiter, export_trace
+from src.Utils import get_current_folder
+from src.WorkQueue import WorkQueue, coordinate
+from scrap_all import registered_scrapers, default_host_rate, host_rates
+
+
+def scrap(
+    service: Type[Webscraper], work_queue: WorkQueue, run_id: str, rate_limiter: HostRateLimiter
+) -> List[GameDetailDto]:
+    """
+    Scrapers that can't open their matches by url are scraped here, like scrap_all does
+    """
+    print(f"[INFO] Started scrap for {service.__name__}")
+    started = time.time()
+    if service.supports_work_queue():
+        games = coordinate(service, work_queue, run_id, rate_limiter)
+    else:
+        games = fetch_games(service, rate_limiter=rate_limiter)
+    write_as_json_to_file(
+        f"{get_current_folder()}/games_{service.__name__}.json", games
+    )
+    print(f"[INFO] Finished scrap for {service.__name__}: {len(games)} games in {time.time() - started:.1f}s")
+    return games
+
+
+def main():
+    run_id = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[INFO] Starting work queue run {run_id}, start the workers with scrap_worker.py")
+    work_queue = WorkQueue()
+    rate_limiter = HostRateLimiter(*default_host_rate, host_rates)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(registered_scrapers)) as executor:
+        futures = {
+            executor.submit(scrap, service, work_queue, run_id, rate_limiter): service
+            for service in registered_scrapers
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[ERROR] Scrap for {futures[future].__name__} failed: {e}")
+    export_trace()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import concurrent.futures
+import threading
+import time
+from typing import Type, List, Dict, Union
+
+from src.Dtos import GameDetailDto
+from src.Json import write_as_json_to_file
+from src.ScrapingService import Webscraper, fetch_games, HostRateLimiter, export_trace, DriverPool
+from src.Scheduler import BookmakerSchedule
+from src.Trace import tracer
+from src.Utils import get_current_folder
+from scrap_all import registered_scrapers, max_browsers, default_host_rate, host_rates
+
+# Seconds between two checks for due scraps
+tick_seconds = 5
+
+
+def refresh(
+    service: Type[Webscraper],
+    rate_limiter: HostRateLimiter,
+    browser_slots: threading.BoundedSemaphore,
+    pool: Union[DriverPool, None] = None,
+    fresh_games: Union[List[GameDetailDto], None] = None,
+) -> List[GameDetailDto]:
+    """
+    :param fresh_games: Games of the matches not due yet, returned as they are instead of scraped again
+    """
+    print(f"[INFO] Refreshing {service.__name__}, {len(fresh_games or [])} matches still fresh")
+    if service.uses_browser():
+        with browser_slots:
+            games = fetch_games(service, pool, rate_limiter, fresh_games)
+    else:
+        games = fetch_games(service, rate_limiter=rate_limiter, fresh_games=fresh_games)
+    # An empty scrap usually means a bad connection, the last snapshot is kept then
+    if games:
+        write_as_json_to_file(
+            f"{get_current_folder()}/games_{service.__name__}.json", games
+        )
+    return games
+
+
+def main():
+    print("[INFO] Starting scrape daemon")
+    rate_limiter = HostRateLimiter(*default_host_rate, host_rates)
+    browser_slots = threading.BoundedSemaphore(max_browsers)
+    schedules = {service: BookmakerSchedule(service.__name__) for service in registered_scrapers}
+    # The browsers stay open between refreshes, the pool replaces them once they're used up
+    pools = {
+        service: DriverPool.for_scraper(service) for service in registered_scrapers if service.takes_pooled_driver()
+    }
+    # A bookmaker is never scraped twice at the same time
+    running: Dict[Type[Webscraper], concurrent.futures.Future] = {}
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(registered_scrapers)) as executor:
+            while True:
+                for service, schedule in schedules.items():
+                    if service not in running and schedule.is_due():
+                        running[service] = executor.submit(
+                            refresh, service, rate_limiter, browser_slots, pools.get(service), schedule.fresh_games()
+                        )
+
+                for service, future in list(running.items()):
+                    if not future.done():
+                        continue
+                    del running[service]
+                    schedule = schedules[service]
+                    try:
+                        games = future.result()
+                    except Exception as e:
+                        print(f"[ERROR] Refresh of {service.__name__} failed: {e}")
+                        schedule.failed()
+                    else:
+                        if games:
+                            schedule.scraped(games)
+                        else:
+                            schedule.failed()
+                    print(schedule.describe())
+                    # One trace per batch of refreshes, written once none of them is running anymore
+                    if not running and tracer.events:
+                        export_trace()
+
+                time.sleep(tick_seconds)
+    finally:
+        for pool in pools.values():
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
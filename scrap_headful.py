@@ -12,7 +12,7 @@ from typing import Type, List
 
 from src.Dtos import GameDetailDto
 from src.Json import write_as_json_to_file
-from src.ScrapingService import Webscraper, fetch_games
+from src.ScrapingService import Webscraper, fetch_games, export_trace
 from src.Utils import get_current_folder
 from src.scrapers.Bet365 import Bet365Webscraper
 
@@ -32,6 +32,7 @@ def main():
     # Use ThreadPoolExecutor to run the scraping functions concurrently
     with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
         executor.map(scrap, [Bet365Webscraper])
+    export_trace()
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,16 @@
-from typing import Type, List
+from typing import Type, List, Union
 
 from src.Dtos import GameDetailDto
 from src.Json import write_as_json_to_file
-from src.ScrapingService import Webscraper, fetch_games
+from src.ScrapingService import Webscraper, fetch_games, DriverPool, export_trace
 from src.Utils import get_current_folder
 from src.scrapers.Dafabet import DafabetWebscraper
 from src.scrapers.pinatest import PinnacleWebscraper
 
 
-def scrap(service: Type[Webscraper]) -> List[GameDetailDto]:
+def scrap(service: Type[Webscraper], pool: Union[DriverPool, None] = None) -> List[GameDetailDto]:
     print(f"[INFO] Started scrap for {service.__name__}")
-    games = fetch_games(service)
+    games = fetch_games(service, pool)
     print(games)
     write_as_json_to_file(
         f"{get_current_folder()}/games_{service.__name__}.json", games
@@ -22,8 +22,14 @@ def main():
     print("[INFO] Starting scraper")
 
     # Use ThreadPoolExecutor to run the scraping functions concurrently
-    scrap(PinnacleWebscraper)
-    scrap(DafabetWebscraper)
+    # Dafabet's browser starts up while pinnacle is being scraped
+    dafabet_pool = DriverPool.for_scraper(DafabetWebscraper)
+    try:
+        scrap(PinnacleWebscraper)
+        scrap(DafabetWebscraper, dafabet_pool)
+    finally:
+        dafabet_pool.close()
+        export_trace()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,36 @@
+import os
+import socket
+from typing import Union
+
+from src.ScrapingService import HostRateLimiter, export_trace
+from src.WorkQueue import WorkQueue, work
+from scrap_all import registered_scrapers, default_host_rate, host_rates
+
+# Seconds without a job before the worker exits, None keeps it waiting for the next run
+idle_exit_seconds: Union[float, None] = None
+
+worker_name = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def main():
+    scrapers = [scraper for scraper in registered_scrapers if scraper.supports_work_queue()]
+    taken = [scraper for scraper in scrapers if not scraper.claim_worker_slot()]
+    for scraper in taken:
+        print(f"[INFO] Worker {worker_name}: another worker of this machine takes the jobs of {scraper.__name__}")
+    scrapers = [scraper for scraper in scrapers if scraper not in taken]
+    if not scrapers:
+        print(f"[ERROR] Worker {worker_name}: none of the scrapers can take queued jobs on this machine, "
+              f"bet365 needs the chrome of chrome_path and a single worker per machine, "
+              f"pinnacle needs PINNACLE_HTTP_MODE=0")
+        return
+    print(f"[INFO] Worker {worker_name} taking the jobs of {', '.join(x.__name__ for x in scrapers)}")
+    rate_limiter = HostRateLimiter(*default_host_rate, host_rates)
+    try:
+        games = work(scrapers, WorkQueue(), worker_name, rate_limiter, idle_exit_seconds)
+        print(f"[INFO] Worker {worker_name} collected {games} games")
+    finally:
+        export_trace()
+
+
+if __name__ == "__main__":
+    main()
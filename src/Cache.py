@@ -0,0 +1,116 @@
+import copy
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, List, Tuple, Union
+
+from dataclasses_json import dataclass_json
+
+from src.Dtos import GameDetailDto, GameOverviewDto
+from src.Utils import get_cache_folder
+
+
+# How old the odds of a match may get, by the seconds left until its kickoff
+refresh_schedule: List[Tuple[float, float]] = [
+    (15 * 60, 2 * 60),
+    (60 * 60, 10 * 60),
+    (6 * 60 * 60, 30 * 60),
+    (24 * 60 * 60, 60 * 60),
+]
+far_refresh_seconds = 3 * 60 * 60
+
+
+def refresh_interval(seconds_to_kickoff: float) -> float:
+    for until_kickoff, interval in refresh_schedule:
+        if seconds_to_kickoff <= until_kickoff:
+            return interval
+    return far_refresh_seconds
+
+
+@dataclass_json
+@dataclass
+class CacheEntry:
+    fingerprint: str
+    scraped_at: float
+    kickoff: float
+    detail: GameDetailDto
+
+
+def kickoff_timestamp(overview: GameOverviewDto) -> float:
+    """
+    Scraped overviews carry a datetime, overviews read back from json a timestamp
+    """
+    game_date = overview.game_date
+    if isinstance(game_date, datetime):
+        return game_date.timestamp()
+    if isinstance(game_date, date):
+        return datetime.combine(game_date, datetime.min.time()).timestamp()
+    return float(game_date)
+
+
+def overview_key(overview: GameOverviewDto) -> str:
+    return f"{int(kickoff_timestamp(overview))}|{overview.home_team}|{overview.away_team}"
+
+
+class DetailCache:
+    """
+    Last detail snapshot of every match, together with a fingerprint read from the list page.
+    A detail page only has to be visited again when the fingerprint changed or the snapshot is
+    older than the ttl.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float):
+        self.file_path = f"{get_cache_folder()}/details_{name}.json"
+        self.ttl_seconds = ttl_seconds
+        self.entries: Dict[str, CacheEntry] = {}
+        self.fingerprints: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.file_path):
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                entries = CacheEntry.schema().loads(f.read(), many=True)
+            self.entries = {overview_key(entry.detail.overview): entry for entry in entries}
+
+    def fresh(self, overview: GameOverviewDto, fingerprint: str) -> Union[GameDetailDto, None]:
+        """
+        Remembers the fingerprint for the following put
+        :return: The cached detail dto with the given overview, or None when the match has to be scraped
+        """
+        key = overview_key(overview)
+        self.fingerprints[key] = fingerprint
+        entry = self.entries.get(key)
+        # Without a fingerprint a changed price can't be told apart, so the page is always visited
+        if (not fingerprint or entry is None or entry.fingerprint != fingerprint
+                or time.time() - entry.scraped_at > self.max_age(entry)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        detail = copy.deepcopy(entry.detail)
+        detail.overview = overview
+        return detail
+
+    def max_age(self, entry: CacheEntry) -> float:
+        """
+        Markets move faster close to kickoff, so snapshots expire sooner there
+        """
+        return min(self.ttl_seconds, refresh_interval(entry.kickoff - time.time()))
+
+    def put(self, detail: GameDetailDto):
+        key = overview_key(detail.overview)
+        fingerprint = self.fingerprints.get(key)
+        if not fingerprint:
+            return
+        self.entries[key] = CacheEntry(fingerprint, time.time(), kickoff_timestamp(detail.overview), detail)
+
+    def save(self):
+        """
+        Writes the cache, leaving out the matches that already started
+        """
+        now = time.time()
+        self.entries = {key: entry for key, entry in self.entries.items() if entry.kickoff > now}
+        with open(self.file_path, "w+") as f:
+            f.write(CacheEntry.schema().dumps(list(self.entries.values()), many=True))
+
+    def report(self, name: str) -> str:
+        return f"[DEBUG] {name} detail cache: {self.hits} matches reused, {self.misses} scraped"
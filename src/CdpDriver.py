@@ -0,0 +1,610 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Union, Callable, Awaitable
+
+import requests
+import websockets
+from selenium import webdriver
+from selenium.common import (
+    ElementClickInterceptedException,
+    ElementNotInteractableException,
+    InvalidArgumentException,
+    JavascriptException,
+    NoSuchElementException,
+    NoSuchWindowException,
+    StaleElementReferenceException,
+    TimeoutException,
+    UnknownMethodException,
+    WebDriverException,
+)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.timeouts import Timeouts
+from selenium.webdriver.remote.command import Command
+
+# Seconds a page load and an async script may take, like the timeouts of a selenium session
+page_load_timeout = 30
+script_timeout = 30
+# Seconds between the lookups of find_element while the implicit wait runs
+implicit_wait_poll_interval = 0.1
+
+# Selenium locators mapped to the css selectors they stand for, xpath is evaluated as it is
+css_locators: Dict[str, Callable[[str], str]] = {
+    By.CSS_SELECTOR: lambda value: value,
+    By.ID: lambda value: f'[id="{value}"]',
+    By.NAME: lambda value: f'[name="{value}"]',
+    By.CLASS_NAME: lambda value: f".{value}",
+    By.TAG_NAME: lambda value: value,
+}
+
+query_function = """
+function(by, value, all) {
+    const root = this === window ? document : this;
+    let found;
+    if (by === "xpath") {
+        const result = document.evaluate(value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        found = Array.from({length: result.snapshotLength}, (_, i) => result.snapshotItem(i));
+    } else {
+        found = Array.from(root.querySelectorAll(value));
+    }
+    return all ? found : (found[0] || null);
+}
+"""
+
+click_target_function = """
+function() {
+    this.scrollIntoView({block: "center", inline: "center"});
+    const rect = this.getBoundingClientRect();
+    const x = rect.left + rect.width / 2, y = rect.top + rect.height / 2;
+    const hit = document.elementFromPoint(x, y);
+    return {x, y, width: rect.width, height: rect.height, hit: hit !== null && (hit === this || this.contains(hit))};
+}
+"""
+
+is_displayed_function = """
+function() {
+    const rect = this.getBoundingClientRect();
+    const style = getComputedStyle(this);
+    return rect.width > 0 && rect.height > 0 && style.visibility !== "hidden" && style.display !== "none";
+}
+"""
+
+# Attributes read as properties first, like selenium's getAttribute does for e.g. value and checked
+get_attribute_function = """
+function(name) {
+    const property = this[name];
+    if (property !== undefined && property !== null && typeof property !== "object" && typeof property !== "function") {
+        return String(property);
+    }
+    return this.getAttribute(name);
+}
+"""
+
+loop: Union[asyncio.AbstractEventLoop, None] = None
+loop_lock = threading.Lock()
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Every cdp driver of the process runs on the same loop, in a thread of its own. A scraper thread
+    blocks on its command only, so the tabs of several threads talk to the browser at the same time.
+    """
+    global loop
+    with loop_lock:
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="cdp-driver", daemon=True).start()
+    return loop
+
+
+def protocol_error(method: str, error: dict) -> WebDriverException:
+    message = f"{method}: {error.get('message')} {error.get('data', '')}".strip()
+    if "Could not find object with given id" in message or "No node with given id" in message:
+        return StaleElementReferenceException(message)
+    if "No target with given id" in message or "No session with given id" in message:
+        return NoSuchWindowException(message)
+    return WebDriverException(message)
+
+
+def script_error(details: dict) -> JavascriptException:
+    exception = details.get("exception", {})
+    return JavascriptException(exception.get("description") or details.get("text", "Script failed"))
+
+
+def script_function(script: str, asynchronous: bool = False) -> str:
+    """
+    Wraps a selenium style script body, reading its arguments from `arguments`, into a function.
+    Async scripts get the callback as their last argument and resolve the returned promise with it.
+    """
+    if not asynchronous:
+        return f"function() {{ {script}\n}}"
+    return f"""function() {{
+    const args = Array.from(arguments);
+    const timeout = args.shift();
+    return new Promise((resolve, reject) => {{
+        setTimeout(() => reject(new Error("Script timed out after " + timeout + "ms")), timeout);
+        args.push(resolve);
+        (function() {{ {script}\n}}).apply(this, args);
+    }});
+}}"""
+
+
+class CdpConnection:
+    """
+    Websocket to the browser target. Tabs get attached as flat sessions, so all of them share it.
+    """
+
+    def __init__(self, websocket, performance_log: bool):
+        self.websocket = websocket
+        self.performance_log = performance_log
+        self.command_ids = itertools.count(1)
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.tabs: Dict[str, "CdpTab"] = {}
+        self.log: List[dict] = []
+        self.reader = asyncio.ensure_future(self.read())
+
+    @staticmethod
+    async def connect(debugger_address: str, performance_log: bool = False) -> "CdpConnection":
+        version = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: requests.get(f"http://{debugger_address}/json/version", timeout=5).json()
+        )
+        websocket = await websockets.connect(version["webSocketDebuggerUrl"], max_size=None, ping_interval=None)
+        return CdpConnection(websocket, performance_log)
+
+    async def send(self, method: str, params: Union[dict, None] = None, session_id: Union[str, None] = None) -> dict:
+        command_id = next(self.command_ids)
+        message = {"id": command_id, "method": method, "params": params or {}}
+        if session_id is not None:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[command_id] = future
+        try:
+            await self.websocket.send(json.dumps(message))
+            response = await future
+        finally:
+            self.pending.pop(command_id, None)
+        if "error" in response:
+            raise protocol_error(method, response["error"])
+        return response.get("result", {})
+
+    async def read(self):
+        try:
+            async for raw in self.websocket:
+                message = json.loads(raw)
+                if "id" in message:
+                    future = self.pending.get(message["id"])
+                    if future is not None and not future.done():
+                        future.set_result(message)
+                    continue
+                tab = self.tabs.get(message.get("sessionId"))
+                if tab is not None:
+                    tab.on_event(message["method"], message.get("params", {}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(WebDriverException("DevTools websocket closed"))
+
+    async def attach(self, target_id: str) -> "CdpTab":
+        result = await self.send("Target.attachToTarget", {"targetId": target_id, "flatten": True})
+        tab = CdpTab(self, target_id, result["sessionId"])
+        self.tabs[tab.session_id] = tab
+        await tab.enable()
+        return tab
+
+    async def page_targets(self) -> List[str]:
+        targets = (await self.send("Target.getTargets"))["targetInfos"]
+        return [target["targetId"] for target in targets
+                if target["type"] == "page" and not target["url"].startswith("devtools://")]
+
+    async def close(self):
+        await self.websocket.close()
+        await self.reader
+
+
+class CdpTab:
+    """
+    Session of a single page. Its coroutines can run next to the ones of other tabs.
+    """
+
+    def __init__(self, connection: CdpConnection, target_id: str, session_id: str):
+        self.connection = connection
+        self.target_id = target_id
+        self.session_id = session_id
+        # Load events by loader id, a navigation waits on the one of its own document
+        self.loaded: "OrderedDict[str, asyncio.Event]" = OrderedDict()
+
+    async def send(self, method: str, params: Union[dict, None] = None) -> dict:
+        return await self.connection.send(method, params, self.session_id)
+
+    async def enable(self):
+        await self.send("Page.enable")
+        await self.send("Page.setLifecycleEventsEnabled", {"enabled": True})
+        if self.connection.performance_log:
+            await self.send("Network.enable")
+
+    def on_event(self, method: str, params: dict):
+        if method == "Page.lifecycleEvent" and params["name"] == "load":
+            self.load_event(params["loaderId"]).set()
+        if self.connection.performance_log and method.split(".")[0] in ("Network", "Page"):
+            self.connection.log.append({
+                "level": "INFO",
+                "timestamp": int(time.time() * 1000),
+                "message": json.dumps({"message": {"method": method, "params": params}, "webview": self.target_id}),
+            })
+
+    def load_event(self, loader_id: str) -> asyncio.Event:
+        if loader_id not in self.loaded:
+            self.loaded[loader_id] = asyncio.Event()
+            while len(self.loaded) > 32:
+                self.loaded.popitem(last=False)
+        return self.loaded[loader_id]
+
+    async def navigate(self, url: str, timeout: float = page_load_timeout):
+        result = await self.send("Page.navigate", {"url": url})
+        if result.get("errorText"):
+            raise WebDriverException(f"Navigating to {url} failed: {result['errorText']}")
+        # Same document navigations, like the hash routes of a single page app, don't load anything
+        if result.get("loaderId") is None:
+            return
+        try:
+            await asyncio.wait_for(self.load_event(result["loaderId"]).wait(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutException(f"Page {url} did not load within {timeout}s")
+
+    async def evaluate(self, expression: str, by_value: bool = True, await_promise: bool = False) -> dict:
+        result = await self.send("Runtime.evaluate", {
+            "expression": expression, "returnByValue": by_value, "awaitPromise": await_promise,
+        })
+        if "exceptionDetails" in result:
+            raise script_error(result["exceptionDetails"])
+        return result["result"]
+
+    async def call(
+        self, function: str, object_id: Union[str, None], args: list, by_value: bool = True, await_promise: bool = False
+    ) -> dict:
+        """
+        Calls the function with the element of object_id as `this`, or with the window when there's none
+        """
+        if object_id is None:
+            arguments = ", ".join(json.dumps(arg) for arg in args)
+            return await self.evaluate(f"({function}).call(window, {arguments})", by_value, await_promise)
+        result = await self.send("Runtime.callFunctionOn", {
+            "functionDeclaration": function,
+            "objectId": object_id,
+            "arguments": [{"objectId": arg.id} if isinstance(arg, CdpElement) else {"value": arg} for arg in args],
+            "returnByValue": by_value,
+            "awaitPromise": await_promise,
+        })
+        if "exceptionDetails" in result:
+            raise script_error(result["exceptionDetails"])
+        return result["result"]
+
+    async def execute_script(self, script: str, args: list, asynchronous: bool = False, timeout: float = script_timeout):
+        """
+        Runs a selenium style script. Results come back by value, so scripts returning elements
+        have to be replaced by find_element(s)
+        """
+        if asynchronous:
+            args = [int(timeout * 1000)] + list(args)
+        elements = [arg for arg in args if isinstance(arg, CdpElement)]
+        try:
+            result = await self.call(
+                script_function(script, asynchronous), elements[0].id if elements else None, args,
+                await_promise=asynchronous,
+            )
+        except JavascriptException as e:
+            if asynchronous and "Script timed out" in e.msg:
+                raise TimeoutException(e.msg)
+            raise
+        return result.get("value")
+
+    async def query(self, by: str, value: str, root: Union[str, None], all_matches: bool) -> List[str]:
+        """
+        :param root: Object id of the element to search in, the document when None
+        :return: Object ids of the matching elements
+        """
+        if by == By.XPATH:
+            selector = value
+        elif by in css_locators:
+            by, selector = By.CSS_SELECTOR, css_locators[by](value)
+        else:
+            raise InvalidArgumentException(f"Locator {by} is not supported by the cdp driver")
+        result = await self.call(query_function, root, [by, selector, all_matches], by_value=False)
+        if not all_matches:
+            return [] if result.get("subtype") == "null" else [result["objectId"]]
+        properties = await self.send("Runtime.getProperties", {"objectId": result["objectId"], "ownProperties": True})
+        indexed = [x for x in properties["result"] if x["name"].isdigit() and "objectId" in x.get("value", {})]
+        return [x["value"]["objectId"] for x in sorted(indexed, key=lambda x: int(x["name"]))]
+
+    async def click(self, object_id: str):
+        target = (await self.call(click_target_function, object_id, []))["value"]
+        if target["width"] == 0 or target["height"] == 0:
+            raise ElementNotInteractableException("Element has no size to click")
+        if not target["hit"]:
+            raise ElementClickInterceptedException("Element is covered by another element")
+        for event in ("mouseMoved", "mousePressed", "mouseReleased"):
+            await self.send("Input.dispatchMouseEvent", {
+                "type": event, "x": target["x"], "y": target["y"], "button": "left", "clickCount": 1,
+            })
+
+
+class CdpElement:
+    """
+    Element handle of the cdp driver with the parts of selenium's WebElement the scrapers use
+    """
+
+    def __init__(self, parent: "CdpDriver", tab: CdpTab, object_id: str):
+        self.parent = parent
+        self.tab = tab
+        self.id = object_id
+
+    def call(self, command: str, **params):
+        return self.parent.execute(command, dict(params, element=self))["value"]
+
+    @property
+    def text(self) -> str:
+        return self.call(Command.GET_ELEMENT_TEXT)
+
+    @property
+    def tag_name(self) -> str:
+        return self.call(Command.GET_ELEMENT_TAG_NAME)
+
+    def get_attribute(self, name: str) -> Union[str, None]:
+        return self.call(Command.GET_ELEMENT_ATTRIBUTE, name=name)
+
+    def get_property(self, name: str):
+        return self.call(Command.GET_ELEMENT_PROPERTY, name=name)
+
+    def is_displayed(self) -> bool:
+        return self.call("isElementDisplayed")
+
+    def is_enabled(self) -> bool:
+        return self.call(Command.IS_ELEMENT_ENABLED)
+
+    def click(self):
+        self.call(Command.CLICK_ELEMENT)
+
+    def find_element(self, by: str = By.ID, value: Union[str, None] = None) -> "CdpElement":
+        return self.call(Command.FIND_CHILD_ELEMENT, using=by, value=value)
+
+    def find_elements(self, by: str = By.ID, value: Union[str, None] = None) -> List["CdpElement"]:
+        return self.call(Command.FIND_CHILD_ELEMENTS, using=by, value=value, all=True)
+
+
+class CdpSwitchTo:
+    def __init__(self, driver: "CdpDriver"):
+        self.driver = driver
+
+    def window(self, window_name: str):
+        self.driver.execute(Command.SWITCH_TO_WINDOW, {"handle": window_name})
+
+    def new_window(self, type_hint: Union[str, None] = None):
+        self.driver.execute(Command.NEW_WINDOW, {"type": type_hint})
+
+
+class CdpDriver:
+    """
+    Talks to chrome over its DevTools websocket instead of going through chromedriver, with the
+    parts of selenium's WebDriver the scrapers use. Window handles are the DevTools target ids.
+    Every call goes through execute with selenium's command names, so CommandCounter counts it too.
+    ActionChains aren't supported.
+    """
+
+    def __init__(self, connection: CdpConnection, tab: CdpTab, owner: Union[webdriver.Chrome, None] = None):
+        self.connection = connection
+        self.tab: Union[CdpTab, None] = tab
+        # Selenium driver that launched the browser, quit together with this one
+        self.owner = owner
+        self.implicit_wait = 0.0
+        self.page_load_timeout = page_load_timeout
+        self.script_timeout = script_timeout
+        self.switch_to = CdpSwitchTo(self)
+        self.handlers: Dict[str, Callable[[dict], Awaitable]] = {
+            Command.GET: lambda params: self.current_tab().navigate(params["url"], self.page_load_timeout),
+            Command.GET_CURRENT_URL: lambda params: self.evaluate_value("location.href"),
+            Command.GET_TITLE: lambda params: self.evaluate_value("document.title"),
+            Command.GET_PAGE_SOURCE: lambda params: self.evaluate_value("document.documentElement.outerHTML"),
+            Command.W3C_EXECUTE_SCRIPT: lambda params: self.current_tab().execute_script(
+                params["script"], params["args"]
+            ),
+            Command.W3C_EXECUTE_SCRIPT_ASYNC: lambda params: self.current_tab().execute_script(
+                params["script"], params["args"], asynchronous=True, timeout=self.script_timeout
+            ),
+            Command.FIND_ELEMENT: self.find,
+            Command.FIND_ELEMENTS: self.find,
+            Command.FIND_CHILD_ELEMENT: self.find,
+            Command.FIND_CHILD_ELEMENTS: self.find,
+            Command.GET_ELEMENT_TEXT: lambda params: self.element_value(params, "function() { return this.innerText; }"),
+            Command.GET_ELEMENT_TAG_NAME: lambda params: self.element_value(
+                params, "function() { return this.tagName.toLowerCase(); }"
+            ),
+            Command.GET_ELEMENT_ATTRIBUTE: lambda params: self.element_value(
+                params, get_attribute_function, params["name"]
+            ),
+            Command.GET_ELEMENT_PROPERTY: lambda params: self.element_value(
+                params, "function(name) { return this[name]; }", params["name"]
+            ),
+            "isElementDisplayed": lambda params: self.element_value(params, is_displayed_function),
+            Command.IS_ELEMENT_ENABLED: lambda params: self.element_value(
+                params, "function() { return !this.disabled; }"
+            ),
+            Command.CLICK_ELEMENT: lambda params: params["element"].tab.click(params["element"].id),
+            Command.W3C_GET_CURRENT_WINDOW_HANDLE: self.current_handle,
+            Command.W3C_GET_WINDOW_HANDLES: lambda params: self.connection.page_targets(),
+            Command.SWITCH_TO_WINDOW: self.switch_window,
+            Command.NEW_WINDOW: self.new_window,
+            Command.CLOSE: self.close_tab,
+            Command.GET_LOG: self.read_log,
+            "executeCdpCommand": lambda params: self.current_tab().send(params["cmd"], params["params"]),
+        }
+
+    @staticmethod
+    def attach(debugger_address: str, performance_log: bool = False, owner: Union[webdriver.Chrome, None] = None):
+        """
+        Attaches to the first tab of the chrome listening on the debugging address
+        :param performance_log: Buffers the Network and Page events for get_log("performance"), like
+        a chromedriver session created with enable_performance_log
+        """
+
+        async def connect() -> CdpDriver:
+            connection = await CdpConnection.connect(debugger_address, performance_log)
+            targets = await connection.page_targets()
+            if targets:
+                target_id = targets[0]
+            else:
+                target_id = (await connection.send("Target.createTarget", {"url": "about:blank"}))["targetId"]
+            return CdpDriver(connection, await connection.attach(target_id), owner)
+
+        return asyncio.run_coroutine_threadsafe(connect(), event_loop()).result()
+
+    @staticmethod
+    def take_over(driver: webdriver.Chrome, performance_log: bool = False) -> "CdpDriver":
+        """
+        Runs the commands of a browser launched by chromedriver over DevTools from now on
+        """
+        debugger_address = driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        return CdpDriver.attach(debugger_address, performance_log, owner=driver)
+
+    def run(self, coroutine: Awaitable):
+        return asyncio.run_coroutine_threadsafe(coroutine, event_loop()).result()
+
+    def execute(self, driver_command: str, params: Union[dict, None] = None) -> dict:
+        handler = self.handlers.get(driver_command)
+        if handler is None:
+            raise UnknownMethodException(f"{driver_command} is not supported by the cdp driver")
+        return {"value": self.run(handler(params or {}))}
+
+    def current_tab(self) -> CdpTab:
+        if self.tab is None:
+            raise NoSuchWindowException("The current window was closed, switch to another one")
+        return self.tab
+
+    async def evaluate_value(self, expression: str):
+        return (await self.current_tab().evaluate(expression)).get("value")
+
+    async def element_value(self, params: dict, function: str, *args):
+        element: CdpElement = params["element"]
+        return (await element.tab.call(function, element.id, list(args))).get("value")
+
+    async def find(self, params: dict) -> Union[CdpElement, List[CdpElement]]:
+        """
+        Looks the elements up until the implicit wait runs out, like chromedriver does
+        """
+        element: Union[CdpElement, None] = params.get("element")
+        tab = element.tab if element is not None else self.current_tab()
+        all_matches = params.get("all", False)
+        deadline = time.monotonic() + self.implicit_wait
+        while True:
+            object_ids = await tab.query(params["using"], params["value"], element and element.id, all_matches)
+            if object_ids or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(implicit_wait_poll_interval)
+        elements = [CdpElement(self, tab, object_id) for object_id in object_ids]
+        if all_matches:
+            return elements
+        if not elements:
+            raise NoSuchElementException(f"No element found for {params['using']} {params['value']}")
+        return elements[0]
+
+    async def current_handle(self, params: dict) -> str:
+        return self.current_tab().target_id
+
+    async def switch_window(self, params: dict):
+        for tab in self.connection.tabs.values():
+            if tab.target_id == params["handle"]:
+                self.tab = tab
+                return
+        if params["handle"] not in await self.connection.page_targets():
+            raise NoSuchWindowException(f"No window with handle {params['handle']}")
+        self.tab = await self.connection.attach(params["handle"])
+
+    async def new_window(self, params: dict):
+        target = await self.connection.send("Target.createTarget", {
+            "url": "about:blank", "newWindow": params.get("type") == "window", "background": True,
+        })
+        self.tab = await self.connection.attach(target["targetId"])
+
+    async def close_tab(self, params: dict):
+        tab = self.current_tab()
+        await self.connection.send("Target.closeTarget", {"targetId": tab.target_id})
+        self.connection.tabs.pop(tab.session_id, None)
+        self.tab = None
+
+    async def read_log(self, params: dict) -> List[dict]:
+        if params["type"] != "performance":
+            return []
+        entries, self.connection.log = self.connection.log, []
+        return entries
+
+    @property
+    def current_url(self) -> str:
+        return self.execute(Command.GET_CURRENT_URL)["value"]
+
+    @property
+    def title(self) -> str:
+        return self.execute(Command.GET_TITLE)["value"]
+
+    @property
+    def page_source(self) -> str:
+        return self.execute(Command.GET_PAGE_SOURCE)["value"]
+
+    @property
+    def current_window_handle(self) -> str:
+        return self.execute(Command.W3C_GET_CURRENT_WINDOW_HANDLE)["value"]
+
+    @property
+    def window_handles(self) -> List[str]:
+        return self.execute(Command.W3C_GET_WINDOW_HANDLES)["value"]
+
+    def get(self, url: str):
+        self.execute(Command.GET, {"url": url})
+
+    def execute_script(self, script: str, *args):
+        return self.execute(Command.W3C_EXECUTE_SCRIPT, {"script": script, "args": list(args)})["value"]
+
+    def execute_async_script(self, script: str, *args):
+        return self.execute(Command.W3C_EXECUTE_SCRIPT_ASYNC, {"script": script, "args": list(args)})["value"]
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: dict) -> dict:
+        return self.execute("executeCdpCommand", {"cmd": cmd, "params": cmd_args})["value"]
+
+    def find_element(self, by: str = By.ID, value: Union[str, None] = None) -> CdpElement:
+        return self.execute(Command.FIND_ELEMENT, {"using": by, "value": value})["value"]
+
+    def find_elements(self, by: str = By.ID, value: Union[str, None] = None) -> List[CdpElement]:
+        return self.execute(Command.FIND_ELEMENTS, {"using": by, "value": value, "all": True})["value"]
+
+    def get_log(self, log_type: str) -> List[dict]:
+        return self.execute(Command.GET_LOG, {"type": log_type})["value"]
+
+    def implicitly_wait(self, time_to_wait: float):
+        self.implicit_wait = time_to_wait
+
+    def set_page_load_timeout(self, time_to_wait: float):
+        self.page_load_timeout = time_to_wait
+
+    def set_script_timeout(self, time_to_wait: float):
+        self.script_timeout = time_to_wait
+
+    @property
+    def timeouts(self) -> Timeouts:
+        return Timeouts(implicit_wait=self.implicit_wait, page_load=self.page_load_timeout, script=self.script_timeout)
+
+    def close(self):
+        self.execute(Command.CLOSE)
+
+    def quit(self):
+        """
+        Disconnects from the browser. It's only closed when chromedriver launched it
+        """
+        self.run(self.connection.close())
+        if self.owner is not None:
+            try:
+                self.owner.quit()
+            except WebDriverException as e:
+                print(f"[DEBUG] Failed quitting the browser: {e}")
@@ -72,5 +72,13 @@ class GameDetailDto:
     def __hash__(self):
         return hash(self.overview)
 
+@dataclass_json
+@dataclass
+class FailedGameDto:
+    overview: GameOverviewDto
+    reason: str
+    failed_at: float
+
+
 def date_converter(value):
     return date.fromisoformat(value)
@@ -1,10 +1,16 @@
 import copy
+import json
 import os
-from typing import List, Dict, Set
+import threading
+from typing import List, Dict, Set, Type, TypeVar
 
 from src.Dtos import GameDetailDto, GameOverviewDto
 from src.Utils import flatmap
 
+T = TypeVar("T")
+
+jsonl_lock = threading.Lock()
+
 
 def join_jsons(jsons: List[List[GameDetailDto]]) -> List[GameDetailDto]:
     fixed_json: Dict[GameOverviewDto, GameDetailDto] = {}
@@ -41,9 +47,8 @@ def join_jsons(jsons: List[List[GameDetailDto]]) -> List[GameDetailDto]:
 
 def write_as_json_to_file(file_path: str, content: List[GameDetailDto]):
     with open(file_path, "w+") as f:
-        print(file_path, content)
-        print(GameDetailDto.schema().dumps(content, many=True))
         f.write(GameDetailDto.schema().dumps(content, many=True, indent=4))
+    print(f"[DEBUG] Wrote {len(content)} games to {file_path}")
 
 
 def read_json(file_path) -> List[GameDetailDto]:
@@ -51,4 +56,49 @@ def read_json(file_path) -> List[GameDetailDto]:
         return []
     with open(file_path, "r", encoding="utf-8") as f:
         content = f.read()
-    return GameDetailDto.schema().loads(content, many=True)
\ No newline at end of file
+    return GameDetailDto.schema().loads(content, many=True)
+
+
+def write_overviews(file_path: str, content: List[GameOverviewDto]):
+    with open(file_path, "w+") as f:
+        f.write(GameOverviewDto.schema().dumps(content, many=True, indent=4))
+
+
+def read_overviews(file_path) -> List[GameOverviewDto]:
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    return GameOverviewDto.schema().loads(content, many=True)
+
+
+def append_jsonl(file_path: str, content: str):
+    """
+    Appends a single json line and flushes it, so it survives the scraper crashing right after
+    """
+    with jsonl_lock:
+        with open(file_path, "a+b") as f:
+            # A line cut off by a crash would swallow the next one
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    content = "\n" + content
+            f.write((content + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def read_jsonl(file_path: str, dto_class: Type[T]) -> List[T]:
+    """
+    Lines that can't be decoded, like one cut off by a crash, are skipped
+    """
+    if not os.path.exists(file_path):
+        return []
+    content: List[T] = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                content.append(dto_class.from_json(line))
+            except (ValueError, KeyError, TypeError, json.JSONDecodeError):
+                print(f"[DEBUG] Skipping broken line in {file_path}")
+    return content
@@ -0,0 +1,515 @@
+import glob
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple, Union
+from urllib.parse import urlparse
+
+from src.scrapers import Bet365, PinnacleApi, pinatest
+
+# Matches on every board, spread over the leagues
+match_count = 50
+league_count = 5
+# Seconds every request waits before it's answered, picked at random between both bounds
+latency_seconds: Tuple[float, float] = (0.05, 0.3)
+
+host = "127.0.0.1"
+port = 8700
+
+# Market names of the dafabet match pages, the ones create_detail_dto of the Dafabet scraper reads
+dafabet_markets = [
+    ("Game 1 Win", None),
+    ("Game 1 First Blood", None),
+    ("Game 1 First Baron", None),
+    ("Game 1 First Turret", None),
+    ("Game 1 First Dragon", None),
+    ("Game 1 Total Kills", 26.5),
+    ("Game 1 Kills Handicap", -4.5),
+    ("Game 1 Total Barons", 1.5),
+    ("Game 1 Total Dragons", 4.5),
+    ("Game 1 Duration Minutes", 31.5),
+]
+
+# Month abbreviations read_stamp understands, for the date rows of the bet365 league page
+bet365_months = ["Jan", "Fev", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Out", "Nov", "Dez"]
+bet365_route = "#/AC/B151/C1/D50/E3/F163/"
+pinnacle_matchup_path = "/pinnacle/pt/esports/league-of-legends-emea-masters/orbit-anonymo-vs-bisons/"
+
+# Snapshot folder of each bookmaker, for serving the saved match pages of benchmark_parsers.py
+corpus_scrapers = {
+    "bet365": "Bet365Webscraper",
+    "pinnacle": "PinnacleWebscraper",
+    "dafabet": "DafabetWebscraper",
+}
+
+
+@dataclass
+class MockMatch:
+    id: int
+    league: str
+    home_team: str
+    away_team: str
+    start: datetime
+
+    def odds(self, salt: int = 0) -> Tuple[float, float]:
+        """
+        Stable per match and market, so repeated scraps of the board see the same prices
+        """
+        rng = random.Random(self.id * 1000 + salt)
+        home = round(rng.uniform(1.3, 3.2), 2)
+        return home, round(1 / max(0.05, 1.05 - 1 / home), 2)
+
+
+def create_matches(count: int = match_count, leagues: int = league_count) -> List[MockMatch]:
+    """
+    Team names carry the match id, load_test.py maps the scraped games back to the matches with it
+    """
+    first_start = datetime.now().replace(second=0, microsecond=0) + timedelta(hours=1)
+    return [
+        MockMatch(
+            idx,
+            f"LOL - Mock League {idx % leagues + 1}",
+            f"Mock {idx} Blue",
+            f"Mock {idx} Red",
+            first_start + timedelta(minutes=30 * idx),
+        )
+        for idx in range(1, count + 1)
+    ]
+
+
+def match_id(team_name: str) -> Union[int, None]:
+    found = re.search(r"Mock (\d+) ", team_name)
+    return int(found.group(1)) if found else None
+
+
+def american(decimal_odds: float) -> int:
+    if decimal_odds >= 2:
+        return round((decimal_odds - 1) * 100)
+    return round(-100 / (decimal_odds - 1))
+
+
+def page(title: str, body: str, script: str = "") -> str:
+    return (f'<!DOCTYPE html>\n<html lang="pt"><head><meta charset="utf-8"><title>{title}</title></head>\n'
+            f'<body>\n{body}\n<script>{script}</script>\n</body></html>\n')
+
+
+def bet365_market_groups(match: MockMatch) -> str:
+    def two_way(salt, title):
+        home, away = match.odds(salt)
+        return (f'<div class="gl-MarketGroup"><div class="gl-MarketGroupButton"><div class="gl-MarketGroupButton_Text">'
+                f'{title}</div></div><div class="gl-MarketGroupContainer"><div class="gl-Market">'
+                f'<div class="gl-Participant gl-ParticipantBorderless"><span>{match.home_team}</span><span>{home}</span></div>'
+                f'<div class="gl-Participant gl-ParticipantBorderless"><span>{match.away_team}</span><span>{away}</span></div>'
+                f'</div></div></div>')
+
+    totals = [
+        (Bet365.total_kills_stat_name, 26.5),
+        (Bet365.kill_handicap_stat_name, 4.5),
+        (Bet365.total_towers_stat_name, 11.5),
+        (Bet365.total_dragons_stat_name, 4.5),
+        (Bet365.total_barons_stat_name, 1.5),
+        (Bet365.total_inhibitors_stat_name, 1.5),
+    ]
+
+    def side(home_side):
+        cells = ""
+        for salt, (_, amount) in enumerate(totals, 10):
+            odds = match.odds(salt)[0 if home_side else 1]
+            cells += (f'<div class="srb-ParticipantCenteredStackedMarketRow">'
+                      f'<span class="srb-ParticipantCenteredStackedMarketRow_Handicap">{amount}</span>'
+                      f'<span class="srb-ParticipantCenteredStackedMarketRow_Odds">{odds}</span></div>')
+        return (f'<div class="gl-Market"><div class="gl-MarketColumnHeader">'
+                f'{match.home_team if home_side else match.away_team}</div>{cells}</div>')
+
+    labels = "".join(f'<div class="srb-ParticipantLabel">{name}</div>' for name, _ in totals)
+    over, under = match.odds(20)
+    return "".join([
+        two_way(1, Bet365.winner_stat_name),
+        two_way(2, Bet365.first_blood_stat_name),
+        two_way(3, Bet365.first_kill_baron_stat_name),
+        two_way(4, Bet365.first_destroy_inhibitor_stat_name),
+        f'<div class="gl-MarketGroup"><div class="gl-MarketGroupButton"><div class="gl-MarketGroupButton_Text">'
+        f'Mapa 1 - Totais</div></div><div class="gl-MarketGroupContainer"><div class="gl-Market">'
+        f'<div class="gl-MarketColumnHeader"></div>{labels}</div>{side(True)}{side(False)}</div></div>',
+        f'<div class="gl-MarketGroup"><div class="gl-MarketGroupButton"><div class="gl-MarketGroupButton_Text">'
+        f'{Bet365.duration_map_stat_name}</div></div><div class="gl-MarketGroupContainer"><div class="gl-Market">'
+        f'<div class="srb-ParticipantLabelCentered_Name">31:30</div></div>'
+        f'<div class="gl-Market"><div>Mais de ou Exatamente</div><div><span>{over}</span></div></div>'
+        f'<div class="gl-Market"><div>Menos de</div><div><span>{under}</span></div></div></div></div>',
+    ])
+
+
+def bet365_league_groups(matches: List[MockMatch]) -> str:
+    leagues: Dict[str, List[MockMatch]] = {}
+    for match in matches:
+        leagues.setdefault(match.league, []).append(match)
+
+    groups = ""
+    for league, league_matches in leagues.items():
+        rows, home_odds, away_odds = "", "", ""
+        current_day = None
+        for match in league_matches:
+            if match.start.date() != current_day:
+                current_day = match.start.date()
+                rows += (f'<div class="rcl-MarketHeaderLabel rcl-MarketHeaderLabel-isdate">'
+                         f'Dia {match.start.day:02d} {bet365_months[match.start.month - 1]}</div>')
+            rows += (f'<div class="ses-ParticipantFixtureDetailsEsports" data-match="{match.id}">'
+                     f'<div class="ses-ParticipantFixtureDetailsEsports_Details">{match.start:%H:%M}</div>'
+                     f'<div class="ses-ParticipantFixtureDetailsEsports_TeamAndScoresContainer"><div>'
+                     f'<div>{match.home_team}</div><div>{match.away_team}</div></div></div></div>')
+            home, away = match.odds()
+            home_odds += f'<span class="sgl-ParticipantOddsOnly80_Odds">{home}</span>'
+            away_odds += f'<span class="sgl-ParticipantOddsOnly80_Odds">{away}</span>'
+        groups += (f'<div class="src-CompetitionMarketGroup"><div class="rcl-CompetitionMarketGroupButton">{league}</div>'
+                   f'<div class="gl-MarketGroupContainer"><div>{rows}</div>'
+                   f'<div class="sgl-MarketOddsExpand">{home_odds}</div>'
+                   f'<div class="sgl-MarketOddsExpand">{away_odds}</div></div></div>')
+    return groups
+
+
+# Hash routed like the real site: the league page, a match page and its market page under I2/
+bet365_script = """
+    const app = document.getElementById("app");
+    const render = async () => {
+        const match = location.hash.match(/\\/E(\\d+)\\/I2\\/$/);
+        const isMatch = /\\/E\\d+\\/$/.test(location.hash);
+        app.innerHTML = "";
+        if (isMatch) return;
+        const response = await fetch(match ? "/bet365/api/match/" + match[1] : "/bet365/api/leagues");
+        app.innerHTML = await response.text();
+        app.querySelectorAll("[data-match]").forEach(row => row.addEventListener("click", () => {
+            location.hash = location.hash + "E" + row.dataset.match + "/";
+        }));
+    };
+    window.addEventListener("hashchange", render);
+    render();
+"""
+
+
+def pinnacle_market_groups(match: MockMatch) -> str:
+    def group(title, buttons):
+        spans = "".join(f'<div><button><span>{label}</span><span>{price}</span></button></div>' for label, price in buttons)
+        return (f'<div class="style_marketGroup__1-qlF"><div class="style_title__2wOdP"><span>{title}</span></div>'
+                f'<div class="style_content__23pgc collapse-content"><div><div>{spans}</div></div></div></div>')
+
+    def teams(salt, title):
+        home, away = match.odds(salt)
+        return group(title, [(match.home_team, home), (match.away_team, away)])
+
+    def totals(salt, title, amount, unit=""):
+        over, under = match.odds(salt)
+        return group(title, [(f"Mais de {amount}{unit}", over), (f"Menos de {amount}{unit}", under)])
+
+    home, away = match.odds(9)
+    groups = [
+        teams(1, pinatest.winner_stat_name),
+        teams(2, pinatest.first_blood_stat_name),
+        teams(3, pinatest.first_kill_baron_stat_name),
+        teams(4, pinatest.first_destroy_inhibitor_stat_name),
+        teams(5, pinatest.first_tower_stat_name),
+        teams(6, pinatest.first_dragon_stat_name),
+        totals(7, pinatest.total_kills_stat_name, 26.5),
+        totals(8, pinatest.total_towers_stat_name, 11.5),
+        group(pinatest.tower_handicap_stat_name, [("-1.5", home), ("+1.5", away)]),
+        totals(10, pinatest.total_dragons_stat_name, 4.5),
+        totals(11, pinatest.total_barons_stat_name, 1.5),
+        totals(12, pinatest.duration_map_stat_name, 31.5, " Minutos"),
+    ]
+    return f'<div class="style_marketGroups___6K0n matchup-market-groups">{"".join(groups)}</div>'
+
+
+def arcadia_matchup(match: MockMatch) -> dict:
+    return {
+        "id": match.id,
+        "league": {"name": f"League of Legends - {match.league}"},
+        "status": "pending",
+        "startTime": match.start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "participants": [{"alignment": "home", "name": match.home_team}, {"alignment": "away", "name": match.away_team}],
+    }
+
+
+def arcadia_related(match: MockMatch) -> List[dict]:
+    kills = {"id": match.id * 100, "parentId": match.id, "units": PinnacleApi.kills_units}
+    specials = [
+        {
+            "id": match.id * 100 + idx,
+            "parentId": match.id,
+            "special": {"description": description},
+            "participants": [{"id": match.id * 1000 + idx * 2}, {"id": match.id * 1000 + idx * 2 + 1}],
+        }
+        for idx, description in enumerate(PinnacleApi.special_stat_fields, 1)
+    ]
+    return [kills] + specials
+
+
+def arcadia_markets(match: MockMatch) -> List[dict]:
+    period = PinnacleApi.map_period
+    home, away = match.odds(1)
+    kill_home, kill_away = match.odds(2)
+    over, under = match.odds(3)
+    markets = [
+        {"matchupId": match.id, "period": period, "type": "moneyline", "prices": [
+            {"designation": "home", "price": american(home)}, {"designation": "away", "price": american(away)}]},
+        {"matchupId": match.id * 100, "period": period, "type": "spread", "prices": [
+            {"designation": "home", "points": -4.5, "price": american(kill_home)},
+            {"designation": "away", "points": 4.5, "price": american(kill_away)}]},
+        {"matchupId": match.id * 100, "period": period, "type": "total", "prices": [
+            {"designation": "over", "points": 26.5, "price": american(over)},
+            {"designation": "under", "points": 26.5, "price": american(under)}]},
+    ]
+    for special in arcadia_related(match)[1:]:
+        first, second = match.odds(special["id"])
+        prices = [
+            {"participantId": special["participants"][0]["id"], "price": american(first)},
+            {"participantId": special["participants"][1]["id"], "price": american(second)},
+        ]
+        # Only the over/under specials carry a line
+        if "First" not in special["special"]["description"]:
+            for price in prices:
+                price["points"] = 1.5
+        markets.append({"matchupId": special["id"], "period": period, "type": "moneyline", "prices": prices})
+    return markets
+
+
+def dafabet_items(match: MockMatch) -> str:
+    items = ""
+    for salt, (name, amount) in enumerate(dafabet_markets, 1):
+        home, away = match.odds(salt)
+        total = ("" if amount is None else
+                 f'<div class="totalAmount_wrap"><span class="totalAmount">{amount}</span></div>')
+        items += (f'<div class="PrematchMarket_eachItem"><div class="itemTeamAContent_left"><span class="odds_value">'
+                  f'{home}</span></div><div class="itemContent_center"><span class="resultDescription">{name}</span>'
+                  f'{total}</div><div class="itemTeamBContent_right"><span class="odds_value">{away}</span></div></div>')
+    return items
+
+
+def dafabet_match_list(matches: List[MockMatch]) -> List[dict]:
+    return [{
+        "id": match.id,
+        "league": match.league,
+        "date": f"{match.start:%m/%d}",
+        "time": f"{match.start:%H:%M}",
+        "home": match.home_team,
+        "away": match.away_team,
+        "odds": match.odds(),
+    } for match in matches]
+
+
+# League filter of the real site: LOL, then Clear, then one league label at a time
+dafabet_list_script = """
+    let matches = [];
+    const selected = new Set();
+    const matchList = document.querySelector(".matchList");
+    const container = document.querySelector("#scrContainer > div");
+    const renderMatches = () => {
+        container.innerHTML = matches.filter(match => selected.has(match.league)).map(match => `
+            <div class="matchItem"><a href="/dafabet/match/${match.id}" target="_blank"><div>
+                <div class="startTime"><div class="date">${match.date}</div><div class="time">${match.time}</div></div>
+                <div class="teams">
+                    <div class="teamHome"><div class="teamName"><div>${match.home}</div></div></div>
+                    <div class="teamAway"><div class="teamName"><div>${match.away}</div></div></div>
+                </div>
+                <div class="odds">${match.odds[0]} ${match.odds[1]}</div>
+            </div></a></div>`).join("");
+    };
+    document.querySelector(".sportLol").addEventListener("click", async () => {
+        matches = await (await fetch("/dafabet/api/matches")).json();
+        const leagues = [...new Set(matches.map(match => match.league))];
+        matchList.innerHTML = leagues.map(league => `
+            <div><label class="options_items">${league}</label><div class="countOfmatch">${
+                matches.filter(match => match.league === league).length
+            }</div></div>`).join("");
+        matchList.querySelectorAll("label").forEach(label => label.addEventListener("click", () => {
+            selected.has(label.innerText) ? selected.delete(label.innerText) : selected.add(label.innerText);
+            renderMatches();
+        }));
+    });
+    document.querySelector(".clear").addEventListener("click", () => {
+        selected.clear();
+        renderMatches();
+    });
+"""
+
+dafabet_match_script = """
+    document.querySelector(".gameTab").addEventListener("click", async () => {
+        const id = location.pathname.split("/").pop();
+        document.querySelector(".games_scroll").innerHTML = await (await fetch("/dafabet/api/match/" + id)).text();
+    });
+"""
+
+
+class MockBookmakers:
+    """
+    Local stand in for bet365, pinnacle, its arcadia api and dafabet, serving pages shaped like the
+    ones the scrapers read. Every request waits for latency_seconds, and the first request for the
+    markets of each match is timed for the latency report of load_test.py.
+    """
+
+    def __init__(
+        self,
+        matches: Union[List[MockMatch], None] = None,
+        latency: Tuple[float, float] = latency_seconds,
+        corpus_folder: Union[str, None] = None,
+        address: Tuple[str, int] = (host, port),
+    ):
+        """
+        :param corpus_folder: snapshot folder of benchmark_parsers.py. When given, match pages show the
+        markets of the saved pages, one after another, instead of generated ones
+        """
+        self.matches = {match.id: match for match in (matches if matches is not None else create_matches())}
+        self.latency = latency
+        self.corpus: Dict[str, List[str]] = {}
+        if corpus_folder is not None:
+            self.corpus = {bookmaker: read_corpus(corpus_folder, name) for bookmaker, name in corpus_scrapers.items()}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.first_hits: Dict[Tuple[str, int], float] = {}
+        self.server = ThreadingHTTPServer(address, self.handler())
+        self.server.daemon_threads = True
+        self.thread: Union[threading.Thread, None] = None
+
+    @property
+    def base_url(self) -> str:
+        address, server_port = self.server.server_address[:2]
+        return f"http://{address}:{server_port}"
+
+    def urls(self) -> Dict[str, str]:
+        """
+        Environment variables pointing the scrapers at this server
+        """
+        return {
+            "BET365_URL": f"{self.base_url}/bet365/{bet365_route}",
+            "DAFABET_URL": f"{self.base_url}/dafabet/index.html#/",
+            "PINNACLE_URL": f"{self.base_url}/pinnacle",
+            "PINNACLE_API_URL": f"{self.base_url}/arcadia/0.1",
+        }
+
+    def start(self) -> "MockBookmakers":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def hit(self, bookmaker: str, match: MockMatch):
+        with self.lock:
+            self.first_hits.setdefault((bookmaker, match.id), time.perf_counter())
+
+    def markets(self, bookmaker: str, match: MockMatch) -> str:
+        pages = self.corpus.get(bookmaker)
+        if pages:
+            return pages[match.id % len(pages)]
+        if bookmaker == "bet365":
+            return bet365_market_groups(match)
+        if bookmaker == "pinnacle":
+            return pinnacle_market_groups(match)
+        return dafabet_items(match)
+
+    def route(self, path: str) -> Tuple[int, str, str]:
+        """
+        :return: Status, content type and body of the response
+        """
+        matches = sorted(self.matches.values(), key=lambda x: x.start)
+
+        def match_of(prefix) -> Union[MockMatch, None]:
+            found = re.fullmatch(prefix + r"(\d+)/?", path)
+            return self.matches.get(int(found.group(1))) if found else None
+
+        if path in ("/bet365", "/bet365/"):
+            return 200, "text/html", page("bet365", '<div id="app"></div>', bet365_script)
+        if path == "/bet365/api/leagues":
+            return 200, "text/html", bet365_league_groups(matches)
+        if match_of("/bet365/api/match/"):
+            match = match_of("/bet365/api/match/")
+            self.hit("bet365", match)
+            return 200, "text/html", self.markets("bet365", match)
+
+        if path == "/pinnacle/pt/esports/games/league-of-legends/matchups":
+            return 200, "text/html", page("pinnacle", "<div>League of Legends</div>")
+        if match_of(pinnacle_matchup_path):
+            match = match_of(pinnacle_matchup_path)
+            self.hit("pinnacle", match)
+            return 200, "text/html", page(f"{match.home_team} vs {match.away_team}", self.markets("pinnacle", match))
+
+        if path == "/arcadia/0.1/sports/12/matchups":
+            return 200, "application/json", json.dumps([arcadia_matchup(x) for x in matches])
+        found = re.fullmatch(r"/arcadia/0\.1/matchups/(\d+)/(related|markets/related/straight)", path)
+        if found and int(found.group(1)) in self.matches:
+            match = self.matches[int(found.group(1))]
+            self.hit("pinnacle", match)
+            body = arcadia_related(match) if found.group(2) == "related" else arcadia_markets(match)
+            return 200, "application/json", json.dumps(body)
+
+        if path == "/dafabet/index.html":
+            return 200, "text/html", page("dafabet", (
+                '<div class="sportLol">LOL</div><div class="clear active"><span>Clear</span></div>'
+                '<div class="matchList"></div><div id="scrContainer"><div></div></div>'
+            ), dafabet_list_script)
+        if path == "/dafabet/api/matches":
+            return 200, "application/json", json.dumps(dafabet_match_list(matches))
+        if match_of("/dafabet/match/"):
+            match = match_of("/dafabet/match/")
+            self.hit("dafabet", match)
+            return 200, "text/html", page(f"{match.home_team} vs {match.away_team}", (
+                '<div class="gameTab">Game 1</div>'
+                '<div class="games_scroll" style="height: 600px; overflow-y: auto"></div>'
+            ), dafabet_match_script)
+        if match_of("/dafabet/api/match/"):
+            return 200, "text/html", self.markets("dafabet", match_of("/dafabet/api/match/"))
+        return 404, "text/plain", "Not found"
+
+    def handler(self) -> type:
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with mock.lock:
+                    mock.requests += 1
+                time.sleep(random.uniform(*mock.latency))
+                status, content_type, body = mock.route(urlparse(self.path).path)
+                encoded = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def read_corpus(corpus_folder: str, scraper_name: str) -> List[str]:
+    """
+    Body of every saved page of a scraper
+    """
+    bodies = []
+    for file_path in sorted(glob.glob(f"{corpus_folder}/{scraper_name}/*.html")):
+        with open(file_path, "r", encoding="utf-8") as f:
+            page_source = f.read()
+        body = re.search(r"<body[^>]*>(.*)</body>", page_source, flags=re.S | re.I)
+        bodies.append(body.group(1) if body else page_source)
+    return bodies
+
+
+def main():
+    mock = MockBookmakers().start()
+    print(f"[INFO] Serving {len(mock.matches)} matches on {mock.base_url}, point the scrapers at it with")
+    for name, url in mock.urls().items():
+        print(f"{name}={url}")
+    try:
+        mock.thread.join()
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
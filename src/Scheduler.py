@@ -0,0 +1,75 @@
+import time
+from typing import Dict, List, Set
+
+from src.Cache import kickoff_timestamp, refresh_interval, far_refresh_seconds, overview_key
+from src.Dtos import GameDetailDto
+
+# Wait after a failed or empty scrap, doubled on every further failure up to far_refresh_seconds
+retry_seconds = 60
+
+
+class BookmakerSchedule:
+    """
+    Last game and scrape time of every match a bookmaker listed. A scrap is due once one of the
+    matches needs fresher odds, or the list wasn't checked for new matches for far_refresh_seconds.
+    The matches still fresh are passed to the scrap, so only the due ones get their details scraped.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.games: Dict[str, GameDetailDto] = {}
+        self.scraped_at: Dict[str, float] = {}
+        # Matches handed to the running scrap as fresh, their games come back without being scraped
+        self.reused: Set[str] = set()
+        self.last_run = 0.0
+        self.next_run = 0.0
+        self.failures = 0
+
+    def is_due(self) -> bool:
+        return time.time() >= self.next_run
+
+    def is_fresh(self, key: str, now: float) -> bool:
+        kickoff = kickoff_timestamp(self.games[key].overview)
+        return kickoff > now and now - self.scraped_at[key] < refresh_interval(kickoff - now)
+
+    def fresh_games(self) -> List[GameDetailDto]:
+        """
+        Games whose odds don't need a refresh yet, call it right before the scrap
+        """
+        now = time.time()
+        self.reused = {key for key in self.games if self.is_fresh(key, now)}
+        return [self.games[key] for key in self.reused]
+
+    def next_due(self) -> float:
+        now = time.time()
+        due_times = [
+            self.scraped_at[key] + refresh_interval(kickoff_timestamp(game.overview) - now)
+            for key, game in self.games.items() if kickoff_timestamp(game.overview) > now
+        ]
+        return min(due_times + [self.last_run + far_refresh_seconds])
+
+    def scraped(self, games: List[GameDetailDto]):
+        """
+        :param games: All games of the scrap, the reused fresh ones included
+        """
+        now = time.time()
+        self.games = {overview_key(game.overview): game for game in games}
+        self.scraped_at = {
+            key: self.scraped_at[key] if key in self.reused and key in self.scraped_at else now for key in self.games
+        }
+        self.reused = set()
+        self.last_run = now
+        self.failures = 0
+        self.next_run = self.next_due()
+
+    def failed(self):
+        """
+        Keeps the known games, a failed scrap doesn't mean the matches are gone
+        """
+        self.reused = set()
+        self.failures += 1
+        self.next_run = time.time() + min(retry_seconds * 2 ** (self.failures - 1), far_refresh_seconds)
+
+    def describe(self) -> str:
+        return (f"[INFO] {self.name}: {len(self.games)} matches, next scrap "
+                f"{time.strftime('%H:%M:%S', time.localtime(self.next_run))}")
@@ -1,31 +1,779 @@
+import json
+import math
+import os
+import queue
 import random
+import re
+import threading
 import time
 from abc import abstractmethod
-from typing import List, Type, Union
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Type, Union, Tuple, Generator, Dict, Callable, Set
+from urllib.parse import urlparse
 
+import psutil
+from dataclasses_json import dataclass_json
 from fake_useragent import UserAgent
 from selenium import webdriver
-from selenium.common import InvalidSessionIdException
+from selenium.common import InvalidSessionIdException, WebDriverException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium_stealth import stealth
 
-from src.Dtos import GameDetailDto
+from src.Cache import DetailCache, overview_key
+from src.CdpDriver import CdpDriver
+from src.Dtos import GameDetailDto, GameOverviewDto, FailedGameDto
+from src.Json import append_jsonl, read_jsonl, read_json
+from src.TeamIndex import TeamIndex, load_team_index
+from src.Trace import span, tracer
+from src.Utils import run_steps, get_state_folder, get_current_folder, Deadline, get_snapshot_folder
 
 WAIT_TIMEOUT_BETWEEN_QUERIES_SECONDS = 0.5
 
+# Installs a mutation observer on first use and reports how long the DOM and the network have been quiet
+readiness_state_script = """
+    if (!window.__readiness) {
+        window.__readiness = {lastMutation: Date.now()};
+        new MutationObserver(() => window.__readiness.lastMutation = Date.now()).observe(
+            document, {childList: true, subtree: true, attributes: true, characterData: true}
+        );
+    }
+    const resources = performance.getEntriesByType("resource");
+    const lastResponse = resources.reduce((last, resource) => Math.max(last, resource.responseEnd), 0);
+    return {
+        complete: document.readyState === "complete",
+        domQuietMs: Date.now() - window.__readiness.lastMutation,
+        networkQuietMs: performance.now() - lastResponse,
+    };
+"""
 
-class Webscraper:
+
+@dataclass
+class ReadinessProfile:
+    """
+    Per bookmaker tuning of the readiness waits
+    :param min_wait: Floor waited before checking any condition, keeps the pacing bookmakers expect
+    :param timeout: Upper bound of a single wait, the page is used as it is afterwards
+    :param dom_quiet_ms: Time without DOM mutations after which the page counts as stable
+    :param network_quiet_ms: Time without finished resource requests after which the network counts as idle
+    :param poll_interval: Seconds between two checks
+    """
+    min_wait: float = 0
+    timeout: float = 10
+    dom_quiet_ms: int = 300
+    network_quiet_ms: int = 500
+    poll_interval: float = 0.1
+
+
+@dataclass
+class ThreadTimings:
+    started: float
+    last: float
+    waiting: float = 0.0
+
+
+class ScrapeTimings:
+    """
+    Splits the wall time of a scrape into time spent waiting for pages and time spent working. Bet365
+    fetches matches on several threads, so the waits are kept per thread and summed as thread time,
+    which is then compared with the wall time instead of subtracted from it.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.threads: Dict[int, ThreadTimings] = {threading.get_ident(): ThreadTimings(self.started, self.started)}
+
+    def add_wait(self, seconds: float):
+        now = time.time()
+        with self.lock:
+            thread = self.threads.setdefault(threading.get_ident(), ThreadTimings(now - seconds, now))
+            thread.waiting += seconds
+            thread.last = now
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+        self.add_wait(seconds)
+
+    def report(self, name: str) -> str:
+        now = time.time()
+        total = now - self.started
+        with self.lock:
+            threads = list(self.threads.values())
+        if len(threads) == 1:
+            waiting = threads[0].waiting
+            return (f"[INFO] {name} took {total:.1f}s: {waiting:.1f}s waiting, "
+                    f"{max(0.0, total - waiting):.1f}s working")
+        # The scraping thread is busy until the report, the workers until their last wait
+        thread_time = total + sum(thread.last - thread.started for thread in threads[1:])
+        waiting = sum(thread.waiting for thread in threads)
+        return (f"[INFO] {name} took {total:.1f}s on {len(threads)} threads: {thread_time:.1f}s thread time, "
+                f"{waiting:.1f}s waiting, {max(0.0, thread_time - waiting):.1f}s working, "
+                f"{thread_time / max(total, 0.001):.1f}x overlap")
+
+
+@dataclass
+class CommandStats:
+    count: int = 0
+    seconds: float = 0.0
+
+
+class CommandBudgetExceeded(Exception):
+    pass
+
+
+class CommandCounter:
+    """
+    Counts the chromedriver round trips of the attached drivers by command, for the whole run and for
+    every match. WebElement calls like .text or get_attribute go through driver.execute too, so they
+    get counted as well.
+    """
+
+    def __init__(self, strict_budget: Union[int, None] = None):
+        self.lock = threading.Lock()
+        self.totals: Dict[str, CommandStats] = {}
+        self.matches: Dict[str, Dict[str, CommandStats]] = {}
+        # The command taking a match over the strict budget raises, so a chatty parser stops right there
+        self.strict_budget = strict_budget
+        self.exceeded: Set[str] = set()
+        self.attached: List[Tuple[webdriver.Chrome, Callable]] = []
+        # Bet365 fetches matches on several threads, each with a driver of its own
+        self.local = threading.local()
+
+    def attach(self, driver: webdriver.Chrome) -> webdriver.Chrome:
+        execute = driver.execute
+
+        def counted_execute(driver_command: str, params: Union[dict, None] = None):
+            started = time.perf_counter()
+            try:
+                result = execute(driver_command, params)
+            finally:
+                self.add(driver_command, time.perf_counter() - started)
+            self.check_budget()
+            return result
+
+        driver.execute = counted_execute
+        with self.lock:
+            self.attached.append((driver, execute))
+        return driver
+
+    def detach(self):
+        """
+        Pooled drivers outlive the scraper, so they get their plain execute back
+        """
+        with self.lock:
+            attached, self.attached = self.attached, []
+        for driver, execute in attached:
+            driver.execute = execute
+
+    def track(self, match_key: Union[str, None]):
+        """
+        Counts the following commands of this thread to the given match, None counts them to the run only
+        """
+        self.local.match_key = match_key
+        if match_key is not None:
+            with self.lock:
+                self.matches.setdefault(match_key, {})
+
+    def add(self, command: str, seconds: float):
+        match_key = getattr(self.local, "match_key", None)
+        with self.lock:
+            groups = [self.totals] if match_key is None else [self.totals, self.matches[match_key]]
+            for group in groups:
+                stats = group.setdefault(command, CommandStats())
+                stats.count += 1
+                stats.seconds += seconds
+
+    def match_count(self, match_key: str) -> int:
+        with self.lock:
+            return sum(stats.count for stats in self.matches.get(match_key, {}).values())
+
+    def check_budget(self):
+        """
+        Raises once per match, the commands cleaning up after the failed match still go through
+        :raise CommandBudgetExceeded: The match of this thread just went over the strict budget
+        """
+        match_key = getattr(self.local, "match_key", None)
+        if self.strict_budget is None or match_key is None:
+            return
+        with self.lock:
+            count = sum(stats.count for stats in self.matches[match_key].values())
+            if count <= self.strict_budget or match_key in self.exceeded:
+                return
+            self.exceeded.add(match_key)
+        raise CommandBudgetExceeded(f"{match_key} took more than {self.strict_budget} webdriver commands")
+
+    def report(self, name: str) -> str:
+        with self.lock:
+            count = sum(stats.count for stats in self.totals.values())
+            seconds = sum(stats.seconds for stats in self.totals.values())
+            slowest = sorted(self.totals.items(), key=lambda x: x[1].seconds, reverse=True)[:5]
+            matches = len(self.matches)
+        per_match = f", {count / matches:.0f} per match" if matches else ""
+        commands = ", ".join(f"{command} {stats.count}x {stats.seconds:.1f}s" for command, stats in slowest)
+        return f"[DEBUG] {name}: {count} webdriver commands in {seconds:.1f}s{per_match} ({commands})"
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average and bursts of up to capacity requests
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token, going into debt when the bucket is empty so callers queue up in order
+        :return: The seconds to wait before the request may be sent
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+class HostRateLimiter:
+    """
+    One token bucket per host, shared by every scraper of a run
+    """
+
+    def __init__(self, rate: float, capacity: float, host_rates: Union[Dict[str, Tuple[float, float]], None] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.host_rates = host_rates or {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(*self.host_rates.get(host, (self.rate, self.capacity)))
+            return self.buckets[host]
+
+    def reserve(self, url: str) -> float:
+        return self.bucket(urlparse(url).hostname or "").reserve()
+
+
+class Readiness:
+    """
+    Waits on readiness conditions instead of fixed sleeps: selector presence, DOM stability and
+    network idle, each bounded by the timeout of the profile
+    """
+    def __init__(
+        self,
+        profile: ReadinessProfile,
+        timings: Union[ScrapeTimings, None] = None,
+        rate_limiter: Union[HostRateLimiter, None] = None,
+    ):
+        self.profile = profile
+        self.timings = timings or ScrapeTimings()
+        self.rate_limiter = rate_limiter
+
+    def steps(
+        self,
+        driver: webdriver.Chrome,
+        locator: Union[Tuple[str, str], None] = None,
+        dom_stable: bool = True,
+        network_idle: bool = False,
+        deadline: Union[Deadline, None] = None,
+    ) -> Generator[float, None, bool]:
+        """
+        Yields the seconds to wait between the checks, so it can run inside other step generators
+        :param deadline: Budget of the match, the wait never outlasts it
+        :return: Whether all conditions were met before the timeout
+        :raise DeadlineExceeded: when the deadline passed before the page got ready
+        """
+        if self.profile.min_wait > 0:
+            yield self.profile.min_wait
+        timeout_at = time.time() + self.profile.timeout
+        if deadline is not None:
+            timeout_at = min(timeout_at, deadline.expires_at)
+        while not self.is_ready(driver, locator, dom_stable, network_idle):
+            if time.time() > timeout_at:
+                if deadline is not None:
+                    deadline.check("Waiting for the page")
+                return False
+            yield self.profile.poll_interval
+        return True
+
+    def wait(
+        self,
+        driver: webdriver.Chrome,
+        locator: Union[Tuple[str, str], None] = None,
+        dom_stable: bool = True,
+        network_idle: bool = False,
+        deadline: Union[Deadline, None] = None,
+    ) -> bool:
+        started = time.time()
+        try:
+            with span("wait for page", "wait", locator=str(locator), network_idle=network_idle):
+                ready = run_steps(self.steps(driver, locator, dom_stable, network_idle, deadline))
+        finally:
+            self.timings.add_wait(time.time() - started)
+        if not ready:
+            print(f"[DEBUG] Page not ready after {self.profile.timeout}s, continuing anyway")
+        return ready
+
+    def pause(self):
+        """
+        Waits the floor of the profile only, for pacing between two page loads
+        """
+        self.timings.sleep(self.profile.min_wait)
+
+    def throttle(self, url: str):
+        """
+        Waits for the request budget of the url's host, call it right before loading a page
+        """
+        if self.rate_limiter is not None:
+            with span("throttle", "wait", url=url):
+                self.timings.sleep(self.rate_limiter.reserve(url))
+
+    def is_ready(
+        self,
+        driver: webdriver.Chrome,
+        locator: Union[Tuple[str, str], None],
+        dom_stable: bool,
+        network_idle: bool,
+    ) -> bool:
+        if locator is not None and not driver.find_elements(*locator):
+            return False
+        state = driver.execute_script(readiness_state_script)
+        if dom_stable and state["domQuietMs"] < self.profile.dom_quiet_ms:
+            return False
+        if network_idle and (not state["complete"] or state["networkQuietMs"] < self.profile.network_quiet_ms):
+            return False
+        return True
+
+
+@dataclass_json
+@dataclass
+class CapturedPayload:
+    url: str
+    kind: str  # "response" or "websocket"
+    body: str
+
+
+class PerformanceLog:
+    """
+    Reads the DevTools events of chrome's performance log, so the driver must be created with
+    enable_performance_log. Reading drains the log, so every consumer registers a listener instead.
+    """
     def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.listeners: List[Callable[[str, dict], None]] = []
+        self.driver.execute_cdp_cmd("Network.enable", {})
+
+    def add_listener(self, listener: Callable[[str, dict], None]):
+        self.listeners.append(listener)
+
+    def drain(self):
+        for entry in self.driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            for listener in self.listeners:
+                listener(message.get("method"), message.get("params", {}))
+
+
+class NetworkCapture:
+    """
+    Records network responses and websocket frames of a driver through the DevTools protocol
+    """
+    def __init__(self, performance_log: PerformanceLog, url_patterns: List[str]):
+        self.performance_log = performance_log
+        self.url_patterns = [re.compile(pattern) for pattern in url_patterns]
+        self.responses: Dict[str, str] = {}
+        self.websockets: Dict[str, str] = {}
+        self.finished: List[str] = []
+        self.frames: List[CapturedPayload] = []
+        performance_log.add_listener(self.on_event)
+
+    def matches(self, url: str) -> bool:
+        return any(pattern.search(url) for pattern in self.url_patterns)
+
+    def on_event(self, method: str, params: dict):
+        if method == "Network.responseReceived" and self.matches(params["response"]["url"]):
+            self.responses[params["requestId"]] = params["response"]["url"]
+        elif method == "Network.loadingFinished" and params["requestId"] in self.responses:
+            self.finished.append(params["requestId"])
+        elif method == "Network.webSocketCreated" and self.matches(params["url"]):
+            self.websockets[params["requestId"]] = params["url"]
+        elif method == "Network.webSocketFrameReceived" and params["requestId"] in self.websockets:
+            self.frames.append(CapturedPayload(
+                self.websockets[params["requestId"]], "websocket", params["response"]["payloadData"]
+            ))
+
+    def clear(self):
+        """
+        Drops everything recorded so far, e.g. before navigating to the next match
+        """
+        self.performance_log.drain()
+        self.finished, self.frames = [], []
+
+    def collect(self) -> List[CapturedPayload]:
+        self.performance_log.drain()
+        payloads: List[CapturedPayload] = list(self.frames)
+        for request_id in self.finished:
+            try:
+                body = self.performance_log.driver.execute_cdp_cmd(
+                    "Network.getResponseBody", {"requestId": request_id}
+                )
+            except WebDriverException:
+                # Chrome already evicted the body from its buffer
+                continue
+            payloads.append(CapturedPayload(self.responses[request_id], "response", body["body"]))
+        self.finished, self.frames = [], []
+        return payloads
+
+
+# Url patterns of the resources a blocking profile can block, in Network.setBlockedURLs syntax
+resource_url_patterns = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf"],
+    "media": ["*.mp4", "*.webm", "*.m3u8", "*.ts"],
+    "stylesheets": ["*.css"],
+    "trackers": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+                 "*facebook.net*", "*hotjar.com*"],
+}
+
+
+@dataclass
+class BlockingProfile:
+    """
+    Resources not needed to read the odds, blocked when a driver gets created
+    :param blocked: Groups of resource_url_patterns to block
+    :param allowed: Patterns the bookmaker needs, never blocked even when their group is
+    """
+    blocked: List[str] = field(default_factory=lambda: list(resource_url_patterns.keys()))
+    allowed: List[str] = field(default_factory=list)
+
+    def url_patterns(self) -> List[str]:
+        return [pattern for group in self.blocked for pattern in resource_url_patterns[group]
+                if pattern not in self.allowed]
+
+    def blocks_images(self) -> bool:
+        return "images" in self.blocked and not set(resource_url_patterns["images"]) & set(self.allowed)
+
+
+def apply_blocking(driver: webdriver.Chrome, profile: BlockingProfile):
+    """
+    Blocks the resources of the profile in the current tab of the driver
+    """
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": profile.url_patterns()})
+
+
+class BlockingReport:
+    """
+    Counts the requests blocked by the blocking profile and the bytes still transferred, by resource
+    type. Blocked resources never get downloaded, so there is no size to report for them.
+    """
+    def __init__(self, performance_log: PerformanceLog):
+        self.performance_log = performance_log
+        self.types: Dict[str, str] = {}
+        self.blocked: Dict[str, int] = {}
+        self.loaded_bytes: Dict[str, float] = {}
+        performance_log.add_listener(self.on_event)
+
+    def on_event(self, method: str, params: dict):
+        if method == "Network.requestWillBeSent":
+            self.types[params["requestId"]] = params.get("type", "Other")
+        elif method == "Network.loadingFailed" and params.get("blockedReason") == "inspector":
+            resource_type = params.get("type", "Other")
+            self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+        elif method == "Network.loadingFinished":
+            resource_type = self.types.get(params["requestId"], "Other")
+            self.loaded_bytes[resource_type] = self.loaded_bytes.get(resource_type, 0) + params["encodedDataLength"]
+
+    def merge(self, other: "BlockingReport"):
+        other.performance_log.drain()
+        for resource_type, count in other.blocked.items():
+            self.blocked[resource_type] = self.blocked.get(resource_type, 0) + count
+        for resource_type, size in other.loaded_bytes.items():
+            self.loaded_bytes[resource_type] = self.loaded_bytes.get(resource_type, 0) + size
+
+    def report(self, name: str) -> str:
+        self.performance_log.drain()
+        transferred = {resource_type: round(size / 1e6, 2) for resource_type, size in self.loaded_bytes.items()}
+        return (f"[INFO] {name} blocked {sum(self.blocked.values())} requests {self.blocked}, "
+                f"transferred {sum(self.loaded_bytes.values()) / 1e6:.1f} MB {transferred}")
+
+
+def write_payloads(file_path: str, payloads: List[CapturedPayload]):
+    """
+    Stores captured payloads as a fixture, the decoders can be run against it without a browser
+    """
+    with open(file_path, "w+", encoding="utf-8") as f:
+        f.write(CapturedPayload.schema().dumps(payloads, many=True, indent=4))
+
+
+def read_payloads(file_path: str) -> List[CapturedPayload]:
+    with open(file_path, "r", encoding="utf-8") as f:
+        return CapturedPayload.schema().loads(f.read(), many=True)
+
+
+# Last game streamed for every match, by stream file. Processes scraping the same bookmaker again and
+# again, like scrap_daemon, only append the games that changed since
+streamed_games: Dict[str, Dict[str, dict]] = {}
+streamed_games_lock = threading.Lock()
+
+
+class Webscraper:
+    readiness_profile = ReadinessProfile()
+
+    # Capture mode records the bookmaker payloads matching capture_url_patterns over CDP. With snapshot
+    # mode they are saved next to the match page, which makes a fixture for tests/test_payloads.py
+    capture_mode = False
+    capture_url_patterns: List[str] = []
+    # Experimental, not a supported mode: reads the stats from the recorded payloads instead of the
+    # rendered DOM. The decoders were written against made up payloads, their keys stay guessed until
+    # tests/test_payloads.py runs against payloads recorded from the sites
+    decode_mode = False
+
+    # Resources blocked in every browser of the scraper, None loads everything. Every bookmaker opts in
+    # with the groups its pages don't need
+    blocking_profile: Union[BlockingProfile, None] = None
+    # Counts the blocked requests and the transferred bytes over the performance log, printed at the
+    # end of the run. Blocking itself doesn't need the log
+    blocking_report_mode = False
+
+    # Seconds a cached match detail is reused while its list page fingerprint is unchanged, None
+    # scrapes every match again
+    detail_cache_ttl: Union[float, None] = None
+
+    # Every collected game is appended to games_<scraper>.jsonl in the state folder as soon as it's
+    # built, so a crash late in a run doesn't lose the games collected until then
+    stream_output = True
+    # Skips the games already captured today, so only the missing and failed ones get scraped again
+    resume_mode = False
+
+    # Seconds a single match and a whole run may take, a match running out of time is abandoned and
+    # recorded as failed. None doesn't limit it
+    match_budget_seconds: Union[float, None] = 180
+    run_budget_seconds: Union[float, None] = 2 * 60 * 60
+
+    # Skips the matches of teams missing from the database before their market page gets loaded,
+    # best.py would throw them away anyway. The scraper fails to start without database/data_transformed.csv
+    prefilter_teams = True
+
+    # Saves the source of every match page read from the DOM, to grow the snapshot corpus
+    snapshot_mode = False
+
+    # Webdriver commands a single match may take, the matches going over it are reported at the end of
+    # the run. Strict mode fails the match on the command going over it and the run at its end, to catch
+    # parsers going back to chatty DOM access
+    command_budget: Union[int, None] = 100
+    strict_command_budget = False
+
+    # "cdp" sends the commands straight to the DevTools websocket of the browser instead of going through
+    # chromedriver, chromedriver only launches it. The cdp driver has no ActionChains
+    driver_backend = "selenium"
+
+    def __init__(self, driver: webdriver.Chrome, rate_limiter: Union[HostRateLimiter, None] = None):
         self.driver = driver
         self.wait = WebDriverWait(self.driver, 10)
+        self.timings = ScrapeTimings()
+        self.readiness = Readiness(self.readiness_profile, self.timings, rate_limiter)
+        self.performance_log: Union[PerformanceLog, None] = None
+        self.capture: Union[NetworkCapture, None] = None
+        self.blocking_report: Union[BlockingReport, None] = None
+        self.cache: Union[DetailCache, None] = None
+        if self.detail_cache_ttl is not None:
+            self.cache = DetailCache(type(self).__name__, self.detail_cache_ttl)
+        self.stream_path = f"{get_state_folder()}/games_{type(self).__name__}.jsonl"
+        self.failed_path = f"{get_state_folder()}/failed_{type(self).__name__}.jsonl"
+        self.failures = 0
+        self.team_index: Union[TeamIndex, None] = load_team_index() if self.prefilter_teams else None
+        self.skipped = 0
+        self.run_deadline = Deadline(self.run_budget_seconds or math.inf)
+        self.match_deadline: Union[Deadline, None] = None
+        self.captured: Dict[str, GameDetailDto] = {}
+        self.commands = CommandCounter(self.command_budget if self.strict_command_budget else None)
+        self.over_budget: List[str] = []
+        # Set by fetch_games when the driver comes from a pool
+        self.pool: Union[DriverPool, None] = None
+        self.pooled: Union[PooledDriver, None] = None
+        if self.resume_mode:
+            captured_games = (read_json(f"{get_current_folder()}/games_{type(self).__name__}.json")
+                              + read_jsonl(self.stream_path, GameDetailDto))
+            self.captured = {overview_key(game.overview): game for game in captured_games}
+            print(f"[DEBUG] Resuming with {len(self.captured)} games captured today")
+        if driver is not None:
+            self.use_driver(driver)
+
+    def use_driver(self, driver: webdriver.Chrome):
+        """
+        Binds the command counter and the performance log consumers to the driver
+        """
+        self.driver = driver
+        self.wait = WebDriverWait(self.driver, 10)
+        self.commands.attach(driver)
+        if self.uses_performance_log():
+            self.performance_log = PerformanceLog(driver)
+        if self.capture_mode and self.performance_log is not None:
+            self.capture = NetworkCapture(self.performance_log, self.capture_url_patterns)
+        if self.blocking_report_mode and self.blocking_profile is not None and self.performance_log is not None:
+            # The counts of the replaced driver are kept
+            previous, self.blocking_report = self.blocking_report, BlockingReport(self.performance_log)
+            if previous is not None:
+                self.blocking_report.merge(previous)
+
+    @classmethod
+    def uses_performance_log(cls) -> bool:
+        """
+        The performance log makes chromedriver buffer every network event, so it's only enabled when read
+        """
+        return cls.capture_mode or (cls.blocking_report_mode and cls.blocking_profile is not None)
+
+    def apply_blocking(self):
+        """
+        Blocked urls only apply to a single tab, so tabs opened by the scraper need them again
+        """
+        if self.blocking_profile is not None:
+            apply_blocking(self.driver, self.blocking_profile)
+        if self.performance_log is not None:
+            # Keeps chromedriver from buffering the events of a whole run
+            self.performance_log.drain()
+
+    def start_match(self, overview_dto: Union[GameOverviewDto, None] = None) -> Deadline:
+        """
+        Starts the budget of the next match, find_element is bounded by it from now on
+        :param overview_dto: Match the following webdriver commands are counted to
+        """
+        self.recycle_driver()
+        self.match_deadline = self.new_match_deadline()
+        self.track_commands(overview_dto)
+        return self.match_deadline
+
+    def new_match_deadline(self) -> Deadline:
+        """
+        Budget of a single match. Scrapers fetching matches on several threads keep one per thread
+        instead of going through start_match
+        """
+        return Deadline(self.match_budget_seconds or math.inf, self.run_deadline)
+
+    def recycle_driver(self):
+        """
+        Swaps a used up pooled browser for a fresh one between two matches, so a long run doesn't keep
+        growing it until the end. Scrapers that can't swap get it replaced when the run releases it.
+        """
+        if self.pool is None or self.pooled is None or not self.swaps_driver_between_matches():
+            return
+        if not self.pool.needs_recycling(self.pooled):
+            return
+        with span("recycle pooled driver", "driver"):
+            self.pooled = self.pool.replace(self.pooled)
+        self.use_driver(self.pooled.driver)
+        self.apply_blocking()
+
+    def track_commands(self, overview_dto: Union[GameOverviewDto, None]):
+        self.commands.track(None if overview_dto is None else overview_key(overview_dto))
+
+    def check_command_budget(self, overview_dto: GameOverviewDto):
+        """
+        Ends the command count of the match
+        """
+        count = self.commands.match_count(overview_key(overview_dto))
+        self.commands.track(None)
+        if self.command_budget is not None and count > self.command_budget:
+            self.over_budget.append(f"{overview_dto.home_team} vs {overview_dto.away_team} ({count})")
+            print(f"[DEBUG] {overview_dto.home_team} vs {overview_dto.away_team} took {count} webdriver commands, "
+                  f"over the budget of {self.command_budget}")
+
+    def deadline(self) -> Deadline:
+        return self.match_deadline or self.run_deadline
+
+    def is_covered(self, overview_dto: GameOverviewDto) -> bool:
+        """
+        Counts the uncovered matches for the run summary
+        """
+        if self.team_index is None or self.team_index.covers(overview_dto):
+            return True
+        self.skipped += 1
+        print(f"[DEBUG] Skipping {overview_dto.home_team} vs {overview_dto.away_team}, no team data")
+        return False
+
+    def is_captured(self, overview_dto: GameOverviewDto) -> bool:
+        return overview_key(overview_dto) in self.captured
+
+    def record(self, game: GameDetailDto):
+        """
+        Call it for every game as soon as it's built
+        """
+        self.check_command_budget(game.overview)
+        if self.stream_output and self.stream_changed(game):
+            append_jsonl(self.stream_path, game.to_json())
+
+    def stream_changed(self, game: GameDetailDto) -> bool:
+        """
+        Remembers the game as the last one streamed for its match
+        :return: Whether it differs from the game streamed for the match before
+        """
+        # Compared as parsed json, games read back from the stream carry timestamps instead of datetimes
+        game_json = json.loads(game.to_json())
+        key = overview_key(game.overview)
+        stream_path = os.path.abspath(self.stream_path)
+        with streamed_games_lock:
+            if stream_path not in streamed_games:
+                streamed_games[stream_path] = {
+                    overview_key(streamed.overview): json.loads(streamed.to_json())
+                    for streamed in read_jsonl(stream_path, GameDetailDto)
+                }
+            streamed = streamed_games[stream_path]
+            if streamed.get(key) == game_json:
+                return False
+            streamed[key] = game_json
+            return True
+
+    def record_failure(self, overview_dto: GameOverviewDto, reason: str):
+        self.check_command_budget(overview_dto)
+        self.failures += 1
+        if self.stream_output:
+            append_jsonl(self.failed_path, FailedGameDto(overview_dto, reason, time.time()).to_json())
+
+    def save_snapshot(self, overview_dto: GameOverviewDto):
+        save_snapshot(self.driver, type(self).__name__, overview_dto)
+
+    def reuse(self, games: List[GameDetailDto]):
+        """
+        Skips the matches of the games like captured ones, merge_captured adds the games back
+        """
+        self.captured.update({overview_key(game.overview): game for game in games})
+
+    def merge_captured(self, games: List[GameDetailDto]) -> List[GameDetailDto]:
+        """
+        Adds the games captured before the resume, newly scraped games replace them
+        """
+        if not self.captured:
+            return games
+        merged = dict(self.captured)
+        merged.update({overview_key(game.overview): game for game in games})
+        return list(merged.values())
 
     def find_element(self, by: str, value: str):
-        return self.wait.until(EC.presence_of_element_located((by, value)))
+        with span("find element", "wait", by=by, value=value):
+            return self.bounded_wait().until(EC.presence_of_element_located((by, value)))
 
     def find_elements(self, by: str, value: str):
-        return self.wait.until(EC.presence_of_all_elements_located((by, value)))
+        with span("find elements", "wait", by=by, value=value):
+            return self.bounded_wait().until(EC.presence_of_all_elements_located((by, value)))
+
+    def bounded_wait(self) -> WebDriverWait:
+        """
+        The usual 10 second wait, cut short by the current match or run deadline
+        :raise DeadlineExceeded: when the deadline already passed
+        """
+        deadline = self.deadline()
+        deadline.check("Finding the element")
+        if deadline.remaining() >= 10:
+            return self.wait
+        return WebDriverWait(self.driver, deadline.remaining())
 
     @staticmethod
     def timeout(min_timeout: float = 1, max_timeout: float = 2):
@@ -33,10 +781,66 @@ class Webscraper:
 
     @staticmethod
     def create_driver(scraper: type) -> webdriver.Chrome:
-        driver = create_stealth_driver()
+        driver = create_stealth_driver(
+            performance_log=scraper.uses_performance_log(), blocking=scraper.blocking_profile
+        )
+        if scraper.driver_backend == "cdp":
+            driver = CdpDriver.take_over(driver, performance_log=scraper.uses_performance_log())
         driver.get(scraper.get_url())
         return driver
 
+    @classmethod
+    def takes_pooled_driver(cls) -> bool:
+        """
+        The pool holds selenium drivers only, scrapers with their own create_driver always start their
+        browser themselves
+        """
+        return cls.uses_browser() and cls.create_driver is Webscraper.create_driver and cls.driver_backend == "selenium"
+
+    @staticmethod
+    def swaps_driver_between_matches() -> bool:
+        """
+        Whether every match is opened by its url, so the scraper can go on in another browser between two
+        matches. Scrapers reading their matches off a list page can't.
+        """
+        return False
+
+    @staticmethod
+    def uses_browser() -> bool:
+        """
+        Scrapers working only over http return False, so no browser gets started for them
+        """
+        return True
+
+    @staticmethod
+    def supports_work_queue() -> bool:
+        """
+        Scrapers opening every match by the url of its overview return True and implement discover_jobs and
+        fetch_job, so the workers of the work queue can share their matches
+        """
+        return False
+
+    @staticmethod
+    def claim_worker_slot() -> bool:
+        """
+        Called by a worker before it takes the queued jobs of the scraper. Scrapers driving a browser
+        shared by the whole machine let a single worker of the machine have them.
+        """
+        return True
+
+    def discover_jobs(self) -> Tuple[List[GameOverviewDto], List[GameDetailDto]]:
+        """
+        :return: The overviews of the matches to fetch, with their match url, and the games already known
+        without fetching them
+        """
+        raise Exception("Not implemented")
+
+    def fetch_job(self, overview_dto: GameOverviewDto) -> GameDetailDto:
+        """
+        Collects a single match discovered by discover_jobs, possibly on another machine
+        """
+        raise Exception("Not implemented")
+
     @staticmethod
     @abstractmethod
     def get_url() -> str:
@@ -52,6 +856,44 @@ class Webscraper:
         raise Exception("Not implemented")
 
 
+def export_trace() -> str:
+    """
+    Writes the spans of the run to the state folder of the day
+    :return: Path of the trace
+    """
+    file_path = f"{get_state_folder()}/trace_{time.strftime('%H%M%S')}.json"
+    events = tracer.export(file_path)
+    print(f"[DEBUG] Wrote trace of {events} spans to {file_path}")
+    return file_path
+
+
+def snapshot_path(scraper_name: str, overview_dto: GameOverviewDto, extension: str) -> str:
+    file_name = re.sub(r"[^A-Za-z0-9]+", "_", overview_key(overview_dto))
+    return f"{get_snapshot_folder(scraper_name)}/{file_name}{extension}"
+
+
+def save_snapshot(driver: webdriver.Chrome, scraper_name: str, overview_dto: GameOverviewDto):
+    """
+    Scripts are dropped, so the snapshot stays as it was rendered when it gets opened again
+    """
+    page_source = re.sub(r"<script\b[^>]*>.*?</script>", "", driver.page_source, flags=re.S | re.I)
+    with open(snapshot_path(scraper_name, overview_dto, ".html"), "w", encoding="utf-8") as f:
+        f.write(page_source)
+
+
+def save_payloads(scraper_name: str, overview_dto: GameOverviewDto, payloads: List[CapturedPayload]):
+    """
+    Stores the payloads recorded for a match next to its snapshot, the pair is a decoder fixture
+    """
+    if payloads:
+        write_payloads(snapshot_path(scraper_name, overview_dto, ".payloads.json"), payloads)
+
+
+def enable_performance_log(options: Options) -> Options:
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
 def create_stealth_options() -> Options:
     ua = UserAgent()
     user_agent = ua.random
@@ -68,10 +910,18 @@ def create_stealth_options() -> Options:
 
 
 def create_stealth_driver(
-    driver: Union[webdriver.Chrome, None] = None
+    driver: Union[webdriver.Chrome, None] = None,
+    performance_log: bool = False,
+    blocking: Union[BlockingProfile, None] = None,
 ) -> webdriver.Chrome:
     if driver is None:
-        driver = webdriver.Chrome(options=create_stealth_options())
+        options = create_stealth_options()
+        if performance_log:
+            enable_performance_log(options)
+        if blocking is not None and blocking.blocks_images():
+            # Unlike the blocked urls, this also covers tabs opened later on
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        driver = webdriver.Chrome(options=options)
 
     stealth(
         driver,
@@ -93,18 +943,252 @@ def create_stealth_driver(
                   """
         },
     )
+    if blocking is not None:
+        apply_blocking(driver, blocking)
     return driver
 
 
-def fetch_games(scraper: Type[Webscraper]):
-    driver = scraper.create_driver(scraper)
-    driver.implicitly_wait(WAIT_TIMEOUT_BETWEEN_QUERIES_SECONDS)
-    print("[DEBUG] Browser started")
-    games = scraper(driver).fetch_games()
-    print(games)
+def quit_driver(driver: webdriver.Chrome):
     try:
-        driver.close()
-        driver.quit()
+        with span("quit driver", "driver"):
+            driver.close()
+            driver.quit()
     except InvalidSessionIdException:
         print("Failed closing browser due to invalid session id")
-    return games
+
+
+class PooledDriver:
+    """
+    A browser of the pool, counting the pages loaded through it. Dafabet opens its matches by ctrl
+    clicking them, so every new tab switched to counts as a page as well.
+    """
+
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.pages = 0
+        self.broken = False
+        self.load_page = driver.get
+        driver.get = self.get
+        self.seen_handles = set(driver.window_handles)
+        self.switch_window = driver.switch_to.window
+        driver.switch_to.window = self.window
+
+    def get(self, url: str):
+        self.pages += 1
+        self.load_page(url)
+
+    def window(self, window_name: str):
+        if window_name not in self.seen_handles:
+            self.seen_handles.add(window_name)
+            self.pages += 1
+        self.switch_window(window_name)
+
+    def rss_mb(self) -> float:
+        """
+        Resident memory of chromedriver and every browser process started by it
+        """
+        try:
+            root = psutil.Process(self.driver.service.process.pid)
+            processes = [root] + root.children(recursive=True)
+        except (AttributeError, psutil.Error):
+            return 0
+        rss = 0
+        for process in processes:
+            try:
+                rss += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss / (1024 * 1024)
+
+    def reset(self):
+        """
+        Closes the tabs opened by the last scraper and leaves the browser on a blank page
+        """
+        handles = self.driver.window_handles
+        for handle in handles[1:]:
+            self.switch_window(handle)
+            self.driver.close()
+        self.switch_window(handles[0])
+        self.seen_handles = {handles[0]}
+        self.load_page("about:blank")
+
+
+class DriverPool:
+    """
+    Keeps browsers started ahead of time, so scrapers don't pay the browser startup on every run.
+    A browser gets replaced once it loaded max_pages pages or its memory passed max_rss_mb, since
+    long-lived chrome sessions keep growing until the container runs out of memory.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], webdriver.Chrome],
+        size: int = 1,
+        max_pages: int = 200,
+        max_rss_mb: float = 1500,
+    ):
+        self.factory = factory
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.idle: "queue.Queue[PooledDriver]" = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=size)
+        self.closed = False
+        for _ in range(size):
+            self.start_driver()
+
+    @staticmethod
+    def for_scraper(scraper: type, size: int = 1, **kwargs) -> "DriverPool":
+        return DriverPool(
+            lambda: create_stealth_driver(
+                performance_log=scraper.uses_performance_log(), blocking=scraper.blocking_profile
+            ),
+            size,
+            **kwargs,
+        )
+
+    def start_driver(self):
+        self.executor.submit(self.warm_up)
+
+    def warm_up(self):
+        try:
+            with span("start pooled driver", "driver"):
+                driver = self.factory()
+            driver.implicitly_wait(WAIT_TIMEOUT_BETWEEN_QUERIES_SECONDS)
+        except WebDriverException as e:
+            print(f"[DEBUG] Failed starting pooled browser: {e}")
+            return
+        print("[DEBUG] Pooled browser started")
+        self.idle.put(PooledDriver(driver))
+
+    def acquire(self, timeout: float = 120) -> PooledDriver:
+        """
+        Waits for a warm browser
+        :raise queue.Empty: when no browser got ready within the timeout
+        """
+        return self.idle.get(timeout=timeout)
+
+    def release(self, pooled: PooledDriver):
+        """
+        Hands the browser back to the pool, or replaces it when it's broken or used up
+        """
+        if self.closed:
+            quit_driver(pooled.driver)
+            return
+        if self.needs_recycling(pooled):
+            quit_driver(pooled.driver)
+            self.start_driver()
+            return
+        try:
+            pooled.reset()
+        except WebDriverException:
+            quit_driver(pooled.driver)
+            self.start_driver()
+            return
+        self.idle.put(pooled)
+
+    def replace(self, pooled: PooledDriver, timeout: float = 120) -> PooledDriver:
+        """
+        Quits a used up browser in the middle of a run and hands out a warm one instead
+        :raise queue.Empty: when no browser got ready within the timeout
+        """
+        quit_driver(pooled.driver)
+        self.start_driver()
+        return self.acquire(timeout)
+
+    def needs_recycling(self, pooled: PooledDriver) -> bool:
+        if pooled.broken:
+            return True
+        if pooled.pages >= self.max_pages:
+            print(f"[DEBUG] Recycling browser after {pooled.pages} pages")
+            return True
+        rss_mb = pooled.rss_mb()
+        if rss_mb > self.max_rss_mb:
+            print(f"[DEBUG] Recycling browser using {rss_mb:.0f}MB after {pooled.pages} pages")
+            return True
+        return False
+
+    def close(self):
+        self.closed = True
+        self.executor.shutdown(wait=True)
+        while not self.idle.empty():
+            quit_driver(self.idle.get().driver)
+
+
+def fetch_games(
+    scraper: Type[Webscraper],
+    pool: Union[DriverPool, None] = None,
+    rate_limiter: Union[HostRateLimiter, None] = None,
+    fresh_games: Union[List[GameDetailDto], None] = None,
+):
+    """
+    :param pool: warm browsers to take the driver from. Scrapers with their own create_driver
+    always start their browser themselves
+    :param rate_limiter: request budget per host, shared with the other scrapers of the run
+    :param fresh_games: games whose odds are still fresh, their matches are skipped like captured
+    ones and the games returned as they are
+    """
+    with span(scraper.__name__, "scraper"):
+        if not scraper.uses_browser():
+            print("[DEBUG] Scraping without browser")
+            instance = scraper(None, rate_limiter)
+            instance.reuse(fresh_games or [])
+            games = instance.merge_captured(instance.fetch_games())
+            print(instance.timings.report(scraper.__name__))
+            if instance.skipped:
+                print(f"[DEBUG] {scraper.__name__}: {instance.skipped} matches skipped without team data")
+            return games
+
+        if rate_limiter is not None:
+            time.sleep(rate_limiter.reserve(scraper.get_url()))
+        pooled = None
+        if pool is not None and scraper.takes_pooled_driver():
+            with span("take pooled driver", "driver"):
+                pooled = pool.acquire()
+                driver = pooled.driver
+                driver.get(scraper.get_url())
+            print("[DEBUG] Browser taken from pool")
+        else:
+            with span("start driver", "driver"):
+                driver = scraper.create_driver(scraper)
+                driver.implicitly_wait(WAIT_TIMEOUT_BETWEEN_QUERIES_SECONDS)
+            print("[DEBUG] Browser started")
+        instance = None
+        try:
+            instance = scraper(driver, rate_limiter)
+            instance.reuse(fresh_games or [])
+            if pooled is not None:
+                instance.pool, instance.pooled = pool, pooled
+            games = instance.merge_captured(instance.fetch_games())
+        except Exception:
+            if pooled is not None:
+                # The scraper may have swapped the browser between matches, the one it failed on is flagged
+                if instance is not None and instance.pooled is not None:
+                    pooled = instance.pooled
+                pooled.broken = True
+            raise
+        finally:
+            if instance is not None:
+                instance.commands.detach()
+                pooled = instance.pooled or pooled
+            if pooled is not None:
+                pool.release(pooled)
+        print(f"[DEBUG] {scraper.__name__}: {len(games)} games")
+        print(instance.timings.report(scraper.__name__))
+        print(instance.commands.report(scraper.__name__))
+        if instance.cache is not None:
+            instance.cache.save()
+            print(instance.cache.report(scraper.__name__))
+        if instance.blocking_report is not None:
+            print(instance.blocking_report.report(scraper.__name__))
+        if instance.skipped:
+            print(f"[DEBUG] {scraper.__name__}: {instance.skipped} matches skipped without team data")
+        if instance.failures:
+            print(f"[DEBUG] {scraper.__name__}: {instance.failures} games failed, see {instance.failed_path}")
+        if pooled is None:
+            quit_driver(driver)
+        if instance.over_budget and scraper.strict_command_budget:
+            raise CommandBudgetExceeded(
+                f"{scraper.__name__}: {len(instance.over_budget)} matches over the budget of "
+                f"{scraper.command_budget} webdriver commands: {', '.join(instance.over_budget)}"
+            )
+        return games
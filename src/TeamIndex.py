@@ -0,0 +1,93 @@
+import csv
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Set, Dict
+
+from fuzzywuzzy import process
+
+from src.Dtos import GameOverviewDto
+
+teams_file = "./database/data_transformed.csv"
+
+# Names used by the bookmakers mapped to the ones of the database
+name_corrections = {
+    "Karmine Corp.A": "Karmine Corp Blue",
+    "Team BDS.A": "Team BDS Academy",
+    "Orbit Anonymo": "Orbit Anonymo Esports",
+    "Kwangdong Freecs.Ch": "Kwangdong Freecs Challengers",
+    "DRX.Ch": "DRX Challengers",
+    "FearX.Y": "FearX Youth",
+    "Hanwha Life Esports.Ch":"Hanwha Life Esports Challengers",
+    "Gen.G.GA":"Gen.G Global Academy",
+    "T1.EA":"T1 Esports Academy",
+    "KT Rolster.Ch":"KT Rolster Challengers",
+    "OKSavingsBank BRION.Ch":"OKSavingsBank BRION Challengers",
+    "Dplus KIA.Ch":"Dplus KIA Challengers",
+    "Nongshim.EA":"",
+    "Besiktas Esports":"Beşiktaş Esports",
+    "BKROG": "BK ROG Esports",
+    "UCAM Tokiers": "UCAM Esports",
+    "big":"Berlin International Gaming",
+    "AF willhaben":"Austrian Force willhaben"
+}
+
+# Score process.extractOne needs, with its default WRatio scorer, like the fuzzy matching of
+# stats/json_names_fix.py. Names it corrects there have to get through the prefilter
+fuzzy_score_cutoff = 90
+
+
+def correct_team_name(team_name: str) -> str:
+    team_name = team_name.replace(" (Kills)", "")
+    return name_corrections.get(team_name, team_name)
+
+
+def normalize_team_name(team_name: str) -> str:
+    """
+    Drops case, accents and punctuation, so "Beşiktaş Esports" and "besiktas esports" match
+    """
+    team_name = unicodedata.normalize("NFKD", correct_team_name(team_name))
+    team_name = "".join(x for x in team_name if not unicodedata.combining(x)).casefold()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", team_name).split())
+
+
+class TeamIndex:
+    """
+    Teams of the database, used to skip matches best.py would throw away before their market page
+    gets loaded
+    """
+
+    def __init__(self, team_names: Set[str]):
+        self.raw_names = sorted(team_names - {""})
+        self.team_names = {normalize_team_name(x) for x in team_names} - {""}
+        self.known: Dict[str, bool] = {}
+
+    def covers_team(self, team_name: str) -> bool:
+        corrected = correct_team_name(team_name)
+        if corrected not in self.known:
+            normalized = normalize_team_name(corrected)
+            self.known[corrected] = bool(normalized) and (
+                normalized in self.team_names
+                or process.extractOne(corrected, self.raw_names, score_cutoff=fuzzy_score_cutoff) is not None
+            )
+        return self.known[corrected]
+
+    def covers(self, overview_dto: GameOverviewDto) -> bool:
+        return self.covers_team(overview_dto.home_team) and self.covers_team(overview_dto.away_team)
+
+
+@lru_cache(maxsize=1)
+def load_team_index(file_path: str = teams_file) -> TeamIndex:
+    """
+    :raise FileNotFoundError: when there's no database. Skipping the prefilter silently would scrape
+    every match again, so set prefilter_teams = False on the scraper to run without one
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(
+            f"No team database at {os.path.abspath(file_path)} to prefilter the matches with. Mount or copy the "
+            f"database folder, or set prefilter_teams = False"
+        )
+    with open(file_path, "r", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return TeamIndex({row["t1"] for row in rows} | {row["t2"] for row in rows})
@@ -0,0 +1,99 @@
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Union
+
+# Records spans of the driver start, page loads, waits, extraction and parsing of every match. A run
+# exports them as a chrome trace, open it in chrome://tracing or ui.perfetto.dev
+tracing = True
+
+
+class Tracer:
+    """
+    Collects spans as chrome trace events. Spans of one thread nest, so every scraper thread gets its
+    own lane; spans that overlap on a thread, like the matches scrolled in parallel tabs, use begin/end.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events: List[dict] = []
+        self.thread_names: Dict[int, str] = {}
+        self.open_spans: Dict[int, Tuple[str, str]] = {}
+        self.span_ids = itertools.count(1)
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    def timestamp(self) -> float:
+        """
+        Microseconds since the tracer got created
+        """
+        return (time.perf_counter() - self.origin) * 1e6
+
+    def add(self, event: dict):
+        tid = threading.get_ident()
+        event["pid"] = self.pid
+        event["tid"] = tid
+        with self.lock:
+            self.thread_names.setdefault(tid, threading.current_thread().name)
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        if not tracing:
+            yield
+            return
+        started = self.timestamp()
+        try:
+            yield
+        finally:
+            self.add({
+                "name": name, "cat": category, "ph": "X", "ts": started, "dur": self.timestamp() - started, "args": args
+            })
+
+    def begin(self, name: str, category: str, **args) -> Union[int, None]:
+        """
+        :return: Id of the span to end it with
+        """
+        if not tracing:
+            return None
+        span_id = next(self.span_ids)
+        with self.lock:
+            self.open_spans[span_id] = (name, category)
+        self.add({"name": name, "cat": category, "ph": "b", "id": span_id, "ts": self.timestamp(), "args": args})
+        return span_id
+
+    def end(self, span_id: Union[int, None], **args):
+        if span_id is None:
+            return
+        with self.lock:
+            name, category = self.open_spans.pop(span_id)
+        self.add({"name": name, "cat": category, "ph": "e", "id": span_id, "ts": self.timestamp(), "args": args})
+
+    def export(self, file_path: str) -> int:
+        """
+        Writes the spans recorded since the last export and forgets them
+        :return: Number of exported events
+        """
+        with self.lock:
+            events, self.events = self.events, []
+            thread_names = dict(self.thread_names)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        with open(file_path, "w+") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+tracer = Tracer()
+
+
+def span(name: str, category: str, **args):
+    """
+    Times the enclosed block as a span of the current thread
+    """
+    return tracer.span(name, category, **args)
@@ -4,16 +4,18 @@ import random
 import time
 from datetime import datetime
 from itertools import chain
-from typing import Callable, TypeVar, Dict, List
+from typing import Callable, TypeVar, Dict, List, Generator, Union
 
+from lxml import html
 from selenium import webdriver
-from selenium.common import NoSuchElementException
+from selenium.common import NoSuchElementException, TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 
 from src.Dtos import GameDetailDto
+from src.Trace import span
 
 T = TypeVar("T")
 
@@ -29,16 +31,105 @@ def get_current_folder() -> str:
     os.makedirs(folder_path, exist_ok=True)
     return folder_path
 
-def click_element(driver, element):
-    while True:
-        try:
-            element.click()
-            break
-        except Exception:
-            scroll = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "html"))
-            )
-            driver.execute_script(f"arguments[0].scrollTop += 250;", scroll)
+
+def get_state_folder() -> str:
+    """
+    Folder for intermediate scraper state of the current day. Kept apart from the games files,
+    so the stats scripts scanning the data folder never pick it up
+    """
+    folder_path = f"{get_current_folder()}/state"
+
+    os.makedirs(folder_path, exist_ok=True)
+    return folder_path
+
+
+def get_snapshot_folder(scraper_name: str) -> str:
+    """
+    Saved match pages of a scraper, the corpus of benchmark_parsers.py
+    """
+    folder_path = f"./data/snapshots/{scraper_name}"
+
+    os.makedirs(folder_path, exist_ok=True)
+    return folder_path
+
+
+def get_cache_folder() -> str:
+    """
+    Folder for state kept across days, outside the day folders the stats scripts read
+    """
+    folder_path = "./data/cache"
+
+    os.makedirs(folder_path, exist_ok=True)
+    return folder_path
+
+
+def has_class(class_name: str) -> str:
+    """
+    XPath condition matching one class of the class attribute, like getElementsByClassName
+    """
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+def inner_text(element: Union[html.HtmlElement, None], fallback: Union[str, None] = None) -> Union[str, None]:
+    """
+    Text of an lxml element with the whitespace collapsed the way innerText renders it
+    """
+    if element is None:
+        return fallback
+    return " ".join(element.text_content().split())
+
+
+def first(elements: list):
+    return elements[0] if elements else None
+
+
+class DeadlineExceeded(TimeoutException):
+    pass
+
+
+class Deadline:
+    """
+    Point in time an interaction has to be done by. A deadline never outlives its parent, so a
+    match deadline also ends with the deadline of its run.
+    """
+
+    def __init__(self, seconds: float = math.inf, parent: Union["Deadline", None] = None):
+        self.expires_at = time.time() + seconds
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.time())
+
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def check(self, action: str):
+        """
+        :raise DeadlineExceeded: when the deadline passed
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"{action} ran out of time")
+
+
+def click_element(driver, element, deadline: Union[Deadline, None] = None):
+    """
+    Scrolls down until the element takes the click
+    :param deadline: When to give up, 30 seconds from now when not given
+    :raise DeadlineExceeded: when the element never took the click
+    """
+    deadline = deadline or Deadline(30)
+    with span("click", "navigation"):
+        while True:
+            try:
+                element.click()
+                break
+            except Exception:
+                deadline.check("Clicking the element")
+                scroll = WebDriverWait(driver, min(10.0, deadline.remaining())).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "html"))
+                )
+                driver.execute_script("arguments[0].scrollTop += 250;", scroll)
 
 
 def read_stamp(date_string: str):
@@ -112,30 +203,227 @@ def find_changed_overviews_and_stats(
     return changed_overviews, changed_stats
 
 
+def run_steps(steps: Generator[float, None, T], timings=None) -> T:
+    """
+    Drives a step generator to its end, sleeping for the seconds yielded between the steps
+    :param timings: Optional ScrapeTimings the sleeps get accounted to as waiting time
+    """
+    while True:
+        try:
+            seconds = next(steps)
+        except StopIteration as result:
+            return result.value
+        if timings is None:
+            time.sleep(seconds)
+        else:
+            timings.sleep(seconds)
+
+
+# Scroll loop of ScrollBox.harvest, running inside the page. After every scroll step it runs the
+# prepare function, waits until no mutation happened for settleMs and stores the items returned by
+# the extract function, keyed by keyField or by their json when no key field is given.
+harvest_script = """
+    const [element, scrollAmount, maxScroll, settleMs, stepTimeoutMs, prepareSource, extractSource,
+           extractArgs, keyField, done] = arguments;
+    const prepare = new Function(prepareSource || "");
+    const extract = new Function(extractSource);
+    const harvested = new Map();
+    const limit = () => Math.min(element.scrollHeight, maxScroll === null ? Infinity : maxScroll);
+    const settle = () => new Promise(resolve => {
+        let finished = false;
+        const finish = () => {
+            if (finished) return;
+            finished = true;
+            observer.disconnect();
+            clearTimeout(quietTimer);
+            clearTimeout(stepTimer);
+            resolve();
+        };
+        let quietTimer = setTimeout(finish, settleMs);
+        const stepTimer = setTimeout(finish, stepTimeoutMs);
+        const observer = new MutationObserver(() => {
+            clearTimeout(quietTimer);
+            quietTimer = setTimeout(finish, settleMs);
+        });
+        observer.observe(document.body, {childList: true, subtree: true, characterData: true, attributes: true});
+    });
+    (async () => {
+        let currentScroll = 0;
+        let maxHeight = limit();
+        while (currentScroll < maxHeight) {
+            prepare.apply(null, extractArgs);
+            await settle();
+            for (const item of extract.apply(null, extractArgs)) {
+                harvested.set(keyField ? item[keyField] : JSON.stringify(item), item);
+            }
+            currentScroll += scrollAmount;
+            element.scrollTop = currentScroll;
+            maxHeight = limit();
+        }
+        done({items: Array.from(harvested.values())});
+    })().catch(e => done({error: String(e)}));
+"""
+
+# Starts the harvest loop without waiting for it, the result is left in the page for
+# harvest_poll_script. Used by ScrollBox.harvest_steps, so other tabs can run while it scrolls.
+harvest_start_script = """
+    const args = Array.from(arguments);
+    window.__scrollHarvest = null;
+    args.push(result => { window.__scrollHarvest = result; });
+    (function () {
+""" + harvest_script + """
+    }).apply(null, args);
+"""
+harvest_poll_script = "return window.__scrollHarvest;"
+
+
 class ScrollBox:
     def __init__(
         self,
         scrollable_element_provider: Callable[[], WebElement],
         scroll_amount: int = 500,
         max_scroll: int = math.inf,
+        settle_ms: int = 300,
+        step_timeout_ms: int = 3000,
+        harvest_timeout: float = 120,
+        readiness=None,
     ):
+        """
+        :param readiness: Optional Readiness of the scraper. When given, every scroll step waits for the
+        DOM to settle instead of sleeping a random second
+        """
         self.scrollable_element_provider = scrollable_element_provider
         self.scroll_amount = scroll_amount
         self.max_scroll = max_scroll
+        self.settle_ms = settle_ms
+        self.step_timeout_ms = step_timeout_ms
+        self.harvest_timeout = harvest_timeout
+        self.readiness = readiness
+
+    def harvest(
+        self,
+        driver: webdriver.Chrome,
+        extract_script: str,
+        extract_args: Union[List, None] = None,
+        prepare_script: Union[str, None] = None,
+        key: Union[str, None] = None,
+        deadline: Union[Deadline, None] = None,
+    ) -> List[dict]:
+        """
+        Runs the whole scroll loop inside the page with a single webdriver call. Instead of sleeping
+        a fixed time, each step waits until the DOM stopped changing.
+        :param extract_script: Function body returning the items visible at the current scroll position
+        :param extract_args: Arguments passed to the extract and prepare functions
+        :param prepare_script: Function body ran before waiting for the DOM at every step, e.g. to expand items
+        :param key: Item field to deduplicate by, the whole item is used when not given
+        :param deadline: Cuts the script timeout short, so the harvest ends with the match budget
+        :return: All harvested items, deduplicated
+        """
+        timeout = self.harvest_timeout
+        if deadline is not None:
+            deadline.check("Harvesting")
+            timeout = min(timeout, deadline.remaining())
+        previous_timeout = driver.timeouts.script
+        driver.set_script_timeout(timeout)
+        try:
+            with span("scroll harvest", "extraction"):
+                result = driver.execute_async_script(
+                    harvest_script, *self.__harvest_args__(extract_script, extract_args, prepare_script, key)
+                )
+        finally:
+            driver.set_script_timeout(previous_timeout)
+        return self.__harvested_items__(result)
+
+    def harvest_steps(
+        self,
+        driver: webdriver.Chrome,
+        extract_script: str,
+        extract_args: Union[List, None] = None,
+        prepare_script: Union[str, None] = None,
+        key: Union[str, None] = None,
+        deadline: Union[Deadline, None] = None,
+        poll_interval: float = 0.25,
+    ) -> Generator[float, None, List[dict]]:
+        """
+        Same loop as harvest, but started without waiting for it and polled between yields, so a
+        scheduler can switch to other tabs while this one scrolls
+        :param poll_interval: Seconds yielded between two polls of the page
+        :return: All harvested items, as the value of the StopIteration
+        :raise DeadlineExceeded: when the harvest did not finish within harvest_timeout or the deadline
+        """
+        harvest_deadline = Deadline(self.harvest_timeout, deadline)
+        harvest_deadline.check("Harvesting")
+        with span("start scroll harvest", "extraction"):
+            driver.execute_script(
+                harvest_start_script, *self.__harvest_args__(extract_script, extract_args, prepare_script, key)
+            )
+        while True:
+            yield poll_interval
+            result = driver.execute_script(harvest_poll_script)
+            if result is not None:
+                return self.__harvested_items__(result)
+            harvest_deadline.check("Harvesting")
+
+    def __harvest_args__(self, extract_script, extract_args, prepare_script, key) -> list:
+        return [
+            self.scrollable_element_provider(),
+            self.scroll_amount,
+            None if self.max_scroll == math.inf else self.max_scroll,
+            self.settle_ms,
+            self.step_timeout_ms,
+            prepare_script,
+            extract_script,
+            extract_args or [],
+            key,
+        ]
+
+    @staticmethod
+    def __harvested_items__(result: dict) -> List[dict]:
+        if "error" in result:
+            raise Exception(f"Harvesting failed: {result['error']}")
+        return result["items"]
 
     def collect(
-        self, driver: webdriver.Chrome, collector: Callable[[WebElement], Dict[str, T]]
+        self,
+        driver: webdriver.Chrome,
+        collector: Callable[[WebElement], Dict[str, T]],
+        deadline: Union[Deadline, None] = None,
     ) -> Dict[str, T]:
+        with span("scroll collect", "extraction"):
+            return run_steps(
+                self.steps(driver, collector, deadline), self.readiness.timings if self.readiness else None
+            )
+
+    def steps(
+        self,
+        driver: webdriver.Chrome,
+        collector: Callable[[WebElement], Dict[str, T]],
+        deadline: Union[Deadline, None] = None,
+    ) -> Generator[float, None, Dict[str, T]]:
+        """
+        Same scroll loop as collect, but yields the seconds to wait before each step instead of
+        sleeping. This lets a scheduler interleave several scroll boxes on one driver.
+        :param deadline: Checked before every scroll step
+        :return: The collected elements, as the value of the StopIteration
+        :raise DeadlineExceeded: when the deadline passes before the end of the box
+        """
         max_height = self.__get_scroll_height__(driver)
 
         current_scroll = 0
         collected_elements = {}
         while current_scroll < max_height:
+            if deadline is not None:
+                deadline.check("Scrolling")
             max_height = self.__get_scroll_height__(driver)
 
-            time.sleep(random.random() + 1)
-            element = self.scrollable_element_provider()
-            collected_elements.update(collector(element))
+            if self.readiness is None:
+                yield random.random() + 1
+            else:
+                yield from self.readiness.steps(driver)
+            # Only the work between two yields is a span, other scroll boxes may run during the waits
+            with span("collect visible", "extraction"):
+                element = self.scrollable_element_provider()
+                collected_elements.update(collector(element))
 
             current_scroll += self.scroll_amount
             driver.execute_script(
@@ -0,0 +1,365 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import List, Dict, Union, Type, Iterator
+
+from src.Cache import overview_key
+from src.Dtos import GameDetailDto, GameOverviewDto
+from src.ScrapingService import Webscraper, HostRateLimiter, quit_driver
+from src.Trace import span
+from src.Utils import Deadline
+
+# Shared by the coordinator and all workers, so it has to be on a volume every one of them mounts. SQLite
+# needs working file locks, which network file systems don't always have
+queue_path = os.environ.get("WORK_QUEUE_PATH", "./data/work_queue.sqlite")
+
+# Seconds a worker holds a job without renewing its lease, after that the job goes back to the queue
+lease_seconds = 120
+# Leases of a job before it's given up as failed, a match crashing every worker doesn't get retried forever
+max_attempts = 3
+# Seconds between the checks of the coordinator and the idle workers
+poll_seconds = 5
+
+schema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    scraper TEXT NOT NULL,
+    match_key TEXT NOT NULL,
+    overview TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated REAL NOT NULL,
+    UNIQUE (run_id, scraper, match_key)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, scraper);
+"""
+
+
+@dataclass
+class Job:
+    id: int
+    run_id: str
+    scraper: str
+    overview: GameOverviewDto
+    attempts: int
+
+
+class WorkQueue:
+    """
+    Detail jobs of the matches found by the coordinator. A job is pending until a worker leases it, and
+    a lease that isn't renewed in time puts the job back to pending, so the jobs of a dead worker get
+    picked up by the others.
+    """
+
+    def __init__(self, path: str = queue_path, lease_seconds: float = lease_seconds, max_attempts: int = max_attempts):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.executescript(schema)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        A connection per transaction, so the lease renewal threads don't share one. The write lock is
+        taken up front, two workers never lease the same job.
+        """
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            yield connection
+            connection.execute("COMMIT")
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def enqueue(self, run_id: str, scraper: str, overviews: List[GameOverviewDto]) -> int:
+        """
+        :return: Number of jobs added, matches already queued for the run are skipped
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (run_id, scraper, match_key, overview, status, updated) "
+                "VALUES (?, ?, ?, ?, 'pending', ?)",
+                [(run_id, scraper, overview_key(overview), overview.to_json(), now) for overview in overviews],
+            )
+            return connection.total_changes - before
+
+    def add_results(self, run_id: str, scraper: str, games: List[GameDetailDto]):
+        """
+        Stores games known without fetching them, like the cached ones, as done jobs of the run
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (run_id, scraper, match_key, overview, status, result, updated) "
+                "VALUES (?, ?, ?, ?, 'done', ?, ?)",
+                [(run_id, scraper, overview_key(game.overview), game.overview.to_json(), game.to_json(), now)
+                 for game in games],
+            )
+
+    def requeue_expired(self, connection: Union[sqlite3.Connection, None] = None) -> int:
+        """
+        :return: Number of jobs whose lease ran out, they're pending again or failed after max_attempts
+        """
+        if connection is None:
+            with self.transaction() as connection:
+                return self.requeue_expired(connection)
+        now = time.time()
+        cursor = connection.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, worker = NULL, "
+            "lease_expires = NULL, error = 'Lease expired', updated = ? WHERE status = 'leased' AND lease_expires < ?",
+            (self.max_attempts, now, now),
+        )
+        if cursor.rowcount:
+            print(f"[DEBUG] Requeued {cursor.rowcount} jobs of workers whose lease expired")
+        return cursor.rowcount
+
+    def lease(self, worker: str, scrapers: List[str]) -> Union[Job, None]:
+        """
+        Jobs are only leased from the latest run, the ones a crashed coordinator left pending are never
+        collected for nothing
+        :return: The oldest pending job of the given scrapers, None when there's none
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            self.requeue_expired(connection)
+            row = connection.execute(
+                f"SELECT id, run_id, scraper, overview, attempts FROM jobs WHERE status = 'pending' "
+                f"AND run_id = (SELECT run_id FROM jobs ORDER BY id DESC LIMIT 1) "
+                f"AND scraper IN ({', '.join('?' * len(scrapers))}) ORDER BY id LIMIT 1",
+                scrapers,
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated = ? WHERE id = ?",
+                (worker, now + self.lease_seconds, now, row[0]),
+            )
+        return Job(row[0], row[1], row[2], GameOverviewDto.from_json(row[3]), row[4] + 1)
+
+    def renew(self, job: Job, worker: str) -> bool:
+        """
+        :return: Whether the worker still holds the lease
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, job.id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job: Job, worker: str, game: GameDetailDto):
+        """
+        The game is kept even when the lease already ran out, unless another worker finished the job first
+        """
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'done', worker = ?, lease_expires = NULL, result = ?, error = NULL, "
+                "updated = ? WHERE id = ? AND status NOT IN ('done', 'cancelled')",
+                (worker, game.to_json(), time.time(), job.id),
+            )
+
+    def fail(self, job: Job, worker: str, reason: str):
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, worker = NULL, "
+                "lease_expires = NULL, error = ?, updated = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, reason, time.time(), job.id, worker),
+            )
+
+    def cancel(self, run_id: str, scraper: str) -> int:
+        """
+        Gives up the jobs left once the coordinator stopped waiting for the run, the workers don't pick
+        them up anymore and the late results of leased ones are dropped
+        :return: Number of cancelled jobs
+        """
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'cancelled', worker = NULL, lease_expires = NULL, updated = ? "
+                "WHERE run_id = ? AND scraper = ? AND status IN ('pending', 'leased')",
+                (time.time(), run_id, scraper),
+            )
+            return cursor.rowcount
+
+    def counts(self, run_id: str, scraper: str) -> Dict[str, int]:
+        with self.transaction() as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE run_id = ? AND scraper = ? GROUP BY status",
+                (run_id, scraper),
+            ).fetchall()
+        return dict(rows)
+
+    def results(self, run_id: str, scraper: str) -> List[GameDetailDto]:
+        with self.transaction() as connection:
+            rows = connection.execute(
+                "SELECT result FROM jobs WHERE run_id = ? AND scraper = ? AND status = 'done' ORDER BY id",
+                (run_id, scraper),
+            ).fetchall()
+        return [GameDetailDto.from_json(row[0]) for row in rows]
+
+
+class LeaseKeeper:
+    """
+    Renews the lease of the job a worker is on, so a slow match isn't handed to another worker while
+    this one is still alive
+    """
+
+    def __init__(self, work_queue: WorkQueue, worker: str):
+        self.work_queue = work_queue
+        self.worker = worker
+        self.job: Union[Job, None] = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="lease-keeper", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.work_queue.lease_seconds / 3):
+            job = self.job
+            if job is not None and not self.work_queue.renew(job, self.worker):
+                print(f"[DEBUG] Lost the lease of {job.overview.home_team} vs {job.overview.away_team}")
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def coordinate(
+    scraper: Type[Webscraper],
+    work_queue: WorkQueue,
+    run_id: str,
+    rate_limiter: Union[HostRateLimiter, None] = None,
+) -> List[GameDetailDto]:
+    """
+    Discovers the matches of the scraper, queues them as jobs of the run and waits for the workers to
+    collect them
+    :return: The games of the run, like fetch_games
+    """
+    with span(scraper.__name__, "scraper"):
+        with span("start driver", "driver"):
+            driver = scraper.create_driver(scraper)
+        instance = None
+        try:
+            instance = scraper(driver, rate_limiter)
+            with span("discover jobs", "navigation"):
+                overviews, known = instance.discover_jobs()
+        finally:
+            if instance is not None:
+                instance.commands.detach()
+            quit_driver(driver)
+
+    for game in known:
+        instance.record(game)
+    work_queue.add_results(run_id, scraper.__name__, known)
+    added = work_queue.enqueue(run_id, scraper.__name__, overviews)
+    print(f"[DEBUG] {scraper.__name__}: queued {added} matches, {len(known)} known without fetching")
+
+    last_counts = None
+    try:
+        while True:
+            counts = work_queue.counts(run_id, scraper.__name__)
+            if counts != last_counts:
+                print(f"[DEBUG] {scraper.__name__}: {counts}")
+                last_counts = counts
+            if not counts.get("pending") and not counts.get("leased"):
+                break
+            if instance.run_deadline.expired():
+                print(f"[DEBUG] {scraper.__name__}: run budget exhausted with {counts} jobs, "
+                      f"keeping the games collected")
+                break
+            work_queue.requeue_expired()
+            time.sleep(poll_seconds)
+    finally:
+        cancelled = work_queue.cancel(run_id, scraper.__name__)
+        if cancelled:
+            print(f"[DEBUG] {scraper.__name__}: cancelled {cancelled} jobs left in the queue")
+
+    games = work_queue.results(run_id, scraper.__name__)
+    if instance.cache is not None:
+        for game in games:
+            instance.cache.put(game)
+        instance.cache.save()
+    if counts.get("failed"):
+        print(f"[DEBUG] {scraper.__name__}: {counts['failed']} jobs failed, see the failed files of the workers")
+    return instance.merge_captured(games)
+
+
+def work(
+    scrapers: List[Type[Webscraper]],
+    work_queue: WorkQueue,
+    worker: str,
+    rate_limiter: Union[HostRateLimiter, None] = None,
+    idle_exit_seconds: Union[float, None] = None,
+) -> int:
+    """
+    Leases the jobs of the given scrapers and collects them until no job came in for idle_exit_seconds.
+    The browser of a scraper is started with its first job and kept for the following ones.
+    :param idle_exit_seconds: None keeps the worker waiting for jobs
+    :return: Number of collected games
+    """
+    scrapers_by_name = {scraper.__name__: scraper for scraper in scrapers}
+    instances: Dict[str, Webscraper] = {}
+    keeper = LeaseKeeper(work_queue, worker)
+    collected = 0
+    idle_since = time.time()
+    try:
+        while True:
+            job = work_queue.lease(worker, list(scrapers_by_name))
+            if job is None:
+                if idle_exit_seconds is not None and time.time() - idle_since > idle_exit_seconds:
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            instance = instances.get(job.scraper)
+            if instance is None:
+                scraper = scrapers_by_name[job.scraper]
+                with span("start driver", "driver"):
+                    instance = scraper(scraper.create_driver(scraper), rate_limiter)
+                # A worker outlives the run budget, every job is only bounded by the match budget
+                instance.run_deadline = Deadline()
+                instances[job.scraper] = instance
+
+            print(f"[DEBUG] {worker}: collecting {job.overview.home_team} vs {job.overview.away_team} "
+                  f"for {job.scraper}, attempt {job.attempts}")
+            keeper.job = job
+            try:
+                game = instance.fetch_job(job.overview)
+            except Exception as e:
+                print(f"[DEBUG] Failed collecting {job.overview.url}: {e}")
+                instance.record_failure(job.overview, str(e))
+                work_queue.fail(job, worker, str(e))
+            else:
+                instance.record(game)
+                work_queue.complete(job, worker, game)
+                collected += 1
+            finally:
+                keeper.job = None
+            idle_since = time.time()
+    finally:
+        keeper.stop()
+        for name, instance in instances.items():
+            instance.commands.detach()
+            print(instance.timings.report(name))
+            print(instance.commands.report(name))
+            quit_driver(instance.driver)
+    return collected
@@ -1,18 +1,28 @@
+import concurrent.futures
+import os
+import queue
+import socket
 import subprocess
 import tempfile
 import time
 from datetime import datetime
 from datetime import time as time_parser
-from typing import List, Type, Dict
+from typing import List, Type, Dict, Union, Tuple
 
+import requests
+from lxml import html
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.wait import WebDriverWait
 
+from src.CdpDriver import CdpDriver
 from src.Dtos import GameDetailDto, GameOverviewDto, StatDto
-from src.ScrapingService import Webscraper
-from src.Utils import parse_float, try_get_element_text, read_stamp, click_element
+from src.Json import read_overviews, write_overviews
+from src.ScrapingService import Webscraper, Readiness, ReadinessProfile, NetworkCapture, CapturedPayload, \
+    enable_performance_log, PerformanceLog, BlockingProfile, apply_blocking, save_snapshot, save_payloads
+from src.Trace import span
+from src.Utils import parse_float, read_stamp, click_element, get_state_folder, flatmap, has_class, inner_text, \
+    first, Deadline
 
 winner_stat_name = "Vencedor do Mapa 1"
 total_inhibitors_stat_name = "Total de Inibidores"
@@ -27,14 +37,141 @@ first_blood_stat_name = "First Blood"
 money_line = "Moneyline"
 duration_map_stat_name = "Mapa 1 - Duração do Mapa - 2 Opções"
 
-browser_redirect_wait = 3
+# Define the list of leagues you want to scrape
+# target_leagues = ["LOL - LEC Winter","LOL - Ultraliga", "LOL - LLA Opening", "LOL - LCK CL Spring",
+#                    "LOL - LCK Spring", "LOL - LFL Spring","LOL - LVP Superliga Spring",
+#                 "LOL - Prime League Spring","LOL - PCS Spring", "LOL - TCL Winter", "LOL - LPL Spring", "LOL - LJL Spring"]  # Add your target leagues here
+#target_leagues = ["LOL - LPL Spring", "LOL - LCK Spring"]
+#arget_leagues = ["LOL - LFL Spring", "LOL - LVP Superliga Spring", "LOL - TCL Winter","LOL - NLC Spring"]
+#target_leagues = ["LOL - LEC Winter - Playoffs"]
+# Leave it empty to go through every league, the team index then skips the uncovered matches
+target_leagues = ["LOL - Prime League Spring"]
+#target_leagues = ["LOL - CBLOL Split 1", "LOL - LCS Spring"]
+#arget_leagues = ["LOL - LCO Split 1", "LOL - LLA Opening", "LOL - LEC Winter - Playoffs"]
+
+# Point this to a local fixture server to run the scraper without reaching bet365
+site_url = os.environ.get("BET365_URL", "https://www.bet365.com/#/AC/B151/C1/D50/E3/F163/")
+
+# The floor keeps some pacing between page loads, the rest of each wait depends on the page readiness
+readiness_profile = ReadinessProfile(min_wait=1, timeout=15, dom_quiet_ms=500)
 chrome_path = "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe"
 
-
-def open_url(url: str) -> webdriver.Chrome:
-    print(f"[DEBUG] Opening anti bot browser")
-
-    temp_user_data_dir = tempfile.mkdtemp(prefix="chrome_user_data_")
+# Discovered matchups get stored in the state folder of the day, so the detail pass can be restarted
+# with resume_mode
+discovery_file_name = "matchups_Bet365Webscraper.json"
+
+matchup_rows_selector = "div.gl-MarketGroupContainer > div:nth-child(1) > div"
+# Moneyline columns next to the matchup rows, one price per matchup in each column
+list_odds_columns_selector = "div.gl-MarketGroupContainer > div.sgl-MarketOddsExpand"
+list_odds_selector = ".sgl-ParticipantOddsOnly80_Odds"
+# Match details are reused while the list page moneyline stays the same, for up to this many seconds
+detail_cache_ttl = 3 * 60 * 60
+read_league_groups_script = """
+    return Array.from(document.getElementsByClassName("src-CompetitionMarketGroup")).map(group => {
+        const button = group.querySelector(".rcl-CompetitionMarketGroupButton");
+        const rows = Array.from(group.querySelectorAll(arguments[0]));
+        return {
+            league: button ? button.innerText.trim() : "",
+            odds: Array.from(group.querySelectorAll(arguments[1])).map(column =>
+                Array.from(column.querySelectorAll(arguments[2])).map(odds => odds.innerText.trim())
+            ),
+            rows: rows.map(row => {
+                const details = row.querySelector(".ses-ParticipantFixtureDetailsEsports_Details");
+                const teams = row.querySelectorAll(
+                    ".ses-ParticipantFixtureDetailsEsports_TeamAndScoresContainer > div > div"
+                );
+                return {
+                    clazz: row.className,
+                    text: row.innerText,
+                    time: details ? details.innerText.trim() : "",
+                    teams: Array.from(teams).map(team => team.innerText.trim()),
+                };
+            }),
+        };
+    });
+"""
+
+# Walks every market group of a match page in one call and returns the plain row data the table
+# parsing needs, instead of several webdriver round trips per row
+read_market_groups_script = """
+    const text = (root, selector, fallback) => {
+        const element = root.querySelector(selector);
+        return element ? element.innerText.trim() : fallback;
+    };
+    const xpathText = (root, xpath) => {
+        const node = document.evaluate(
+            xpath, root, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+        ).singleNodeValue;
+        return node ? node.innerText.trim() : null;
+    };
+    return Array.from(document.getElementsByClassName("gl-MarketGroup")).map(group => ({
+        title: text(group, ".gl-MarketGroupButton_Text", ""),
+        duration: {
+            threshold: xpathText(group, './/div[contains(@class, "srb-ParticipantLabelCentered_Name")]'),
+            over: xpathText(group, './/div[contains(text(), "Mais de ou Exatamente")]/following-sibling::div/span'),
+            under: xpathText(group, './/div[contains(text(), "Menos de")]/following-sibling::div/span'),
+        },
+        rows: Array.from(group.querySelectorAll(".gl-MarketGroupContainer > div > div")).map(row => ({
+            clazz: row.className,
+            text: row.innerText.trim(),
+            odds: text(row, ".srb-ParticipantCenteredStackedMarketRow_Odds", "-1"),
+            handicap: text(row, ".srb-ParticipantCenteredStackedMarketRow_Handicap", "-1"),
+            spans: Array.from(row.getElementsByTagName("span")).map(span => span.innerText.trim()),
+        })),
+    }));
+"""
+
+debugger_address = "127.0.0.1:9222"
+browser_start_timeout = 10
+
+# Session mode keeps a single chrome with a persistent profile attached on the debugging port
+# for the whole crawl. Match pages get opened in place instead of relaunching the browser.
+session_mode = True
+session_profile_dir = os.path.join(tempfile.gettempdir(), "bet365_chrome_profile")
+
+# Number of tabs fetching match details at the same time in the session browser
+detail_workers = 3
+
+# Local port held by the worker taking the bet365 jobs of a machine. The session browser listens on the one
+# debugging port, so a second worker would drive the same tabs
+worker_lock_port = 9223
+worker_lock: Union[socket.socket, None] = None
+
+
+def is_browser_listening() -> bool:
+    try:
+        return requests.get(f"http://{debugger_address}/json/version", timeout=1).ok
+    except requests.RequestException:
+        return False
+
+
+def claim_session_browser() -> bool:
+    """
+    :return: Whether this process holds the session browser of the machine, the lock is kept until it exits
+    """
+    global worker_lock
+    if worker_lock is not None:
+        return True
+    lock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        lock.bind(("127.0.0.1", worker_lock_port))
+    except OSError:
+        lock.close()
+        return False
+    worker_lock = lock
+    return True
+
+
+def wait_for_browser(timeout: float = browser_start_timeout) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if is_browser_listening():
+            return True
+        time.sleep(0.25)
+    return False
+
+
+def launch_browser(url: str, user_data_dir: str):
     chrome_cmd = [
         chrome_path,
         "--no-sandbox",
@@ -43,24 +180,67 @@ def open_url(url: str) -> webdriver.Chrome:
         "--disable-fre",
         "--no-default-browser-check",
         "--no-first-run",
-        f"--user-data-dir={temp_user_data_dir}",
+        f"--user-data-dir={user_data_dir}",
         url,
     ]
     subprocess.Popen(chrome_cmd, shell=True)
 
-    time.sleep(10)
-    chrome_options = Options()
-    chrome_options.add_experimental_option("debuggerAddress", "127.0.0.1:9222")
-    return webdriver.Chrome(options=chrome_options)
 
+def attach_driver() -> Union[webdriver.Chrome, CdpDriver]:
+    """
+    The cdp backend talks to the debugging port itself, without starting a chromedriver for every attach
+    """
+    performance_log = Bet365Webscraper.uses_performance_log()
+    if Bet365Webscraper.driver_backend == "cdp":
+        driver = CdpDriver.attach(debugger_address, performance_log)
+    else:
+        chrome_options = Options()
+        chrome_options.add_experimental_option("debuggerAddress", debugger_address)
+        if performance_log:
+            enable_performance_log(chrome_options)
+        driver = webdriver.Chrome(options=chrome_options)
+    if Bet365Webscraper.blocking_profile is not None:
+        apply_blocking(driver, Bet365Webscraper.blocking_profile)
+    return driver
+
+
+def open_session_url(url: str) -> webdriver.Chrome:
+    """
+    Attaches to the warm session browser, starting it with the persistent profile when nothing
+    listens on the debugging port yet
+    """
+    if is_browser_listening():
+        print("[DEBUG] Reusing anti bot browser session")
+        driver = attach_driver()
+        driver.get(url)
+        return driver
+
+    print("[DEBUG] Opening anti bot browser session")
+    os.makedirs(session_profile_dir, exist_ok=True)
+    launch_browser(url, session_profile_dir)
+    if not wait_for_browser():
+        print(f"[DEBUG] Browser did not open the debugging port within {browser_start_timeout}s")
+    return attach_driver()
+
+
+def open_url(url: str) -> webdriver.Chrome:
+    if session_mode:
+        return open_session_url(url)
+
+    print("[DEBUG] Opening anti bot browser")
+
+    temp_user_data_dir = tempfile.mkdtemp(prefix="chrome_user_data_")
+    launch_browser(url, temp_user_data_dir)
 
-def create_detail_dto(url: str, overview_dto: GameOverviewDto) -> GameDetailDto:
-    time.sleep(browser_redirect_wait)
+    if not wait_for_browser():
+        print(f"[DEBUG] Browser did not open the debugging port within {browser_start_timeout}s")
+    return attach_driver()
 
-    # Tricking bet365 again
-    driver = open_url(url + "I2/")
-    time.sleep(browser_redirect_wait)
 
+def parse_market_groups(market_groups: List[dict]) -> Dict[str, List[StatDto]]:
+    """
+    Runs the multi state table parsing over the market groups returned by read_market_groups_script
+    """
     stats: Dict[str, List[StatDto]] = {}
 
     def get_stat(name) -> StatDto:
@@ -68,70 +248,40 @@ def create_detail_dto(url: str, overview_dto: GameOverviewDto) -> GameDetailDto:
             stats[name] = [StatDto(-1, -1, -1)]
         return stats[name][0]
 
-    stat_elements = driver.find_elements(By.CLASS_NAME, "gl-MarketGroup")
-    for stat_element in stat_elements:
-        title = stat_element.find_element(
-            By.CLASS_NAME, "gl-MarketGroupButton_Text"
-        ).text
-        stat_groups = stat_element.find_elements(
-            By.CSS_SELECTOR, ".gl-MarketGroupContainer > div > div"
-        )
+    for market_group in market_groups:
+        title = market_group["title"]
 
-        # Teste
-        if title == "Mapa 1 - Duração do Mapa - 2 Opções":
+        if title == duration_map_stat_name:
+            duration = market_group["duration"]
             try:
                 # Extract the duration threshold (e.g. 29:30)
-                duration_threshold_str = stat_element.find_element(By.XPATH, './/div[contains(@class, "srb-ParticipantLabelCentered_Name")]').text
                 duration_to_float = lambda s: float(s.split(':')[0]) + float(s.split(':')[1])/60
-                duration_threshold = duration_to_float(duration_threshold_str)   
+                duration_threshold = duration_to_float(duration["threshold"])
 
-                # Extract the "Mais de ou Exatamente" odds 
-                over_odds = float(stat_element.find_element(By.XPATH, './/div[contains(text(), "Mais de ou Exatamente")]/following-sibling::div/span').text)
+                # Extract the "Mais de ou Exatamente" and "Menos de" odds
+                over_odds = float(duration["over"])
+                under_odds = float(duration["under"])
 
-                # Extract the "Menos de" odds
-                under_odds = float(stat_element.find_element(By.XPATH, './/div[contains(text(), "Menos de")]/following-sibling::div/span').text)
-                
-                game_duration_stat = StatDto(
-                    total_amount=duration_threshold, 
-                    home_team_score=over_odds, 
+                stats[duration_map_stat_name] = [StatDto(
+                    total_amount=duration_threshold,
+                    home_team_score=over_odds,
                     away_team_score=under_odds
-                )
-                stats[duration_map_stat_name] = [game_duration_stat]
-
+                )]
                 continue  # skip the rest of the loop for this stat and move on to the next
-
             except Exception as e:
                 print(f"Failed to extract {title} stat. Error: {e}")
-        # Teste
 
         labels = []
         table_index = 0
         home_team = True
         # Parsing multi state table
-        for group in stat_groups:
-            clazz = group.get_attribute("class")
-
-            odds = parse_float(
-                try_get_element_text(
-                    group,
-                    By.CLASS_NAME,
-                    "srb-ParticipantCenteredStackedMarketRow_Odds",
-                    "-1",
-                )
-            )
-            handicap = parse_float(
-                try_get_element_text(
-                    group,
-                    By.CLASS_NAME,
-                    "srb-ParticipantCenteredStackedMarketRow_Handicap",
-                    "-1",
-                )
-            )
+        for row in market_group["rows"]:
+            clazz = row["clazz"]
+            odds = parse_float(row["odds"])
+            handicap = parse_float(row["handicap"])
 
             if "gl-ParticipantBorderless" in clazz:
-                team_value = parse_float(
-                    group.find_elements(By.TAG_NAME, "span")[1].text
-                )
+                team_value = parse_float(row["spans"][1])
 
                 stat = get_stat(title)
                 if stat.home_team_score == -1:
@@ -139,7 +289,7 @@ def create_detail_dto(url: str, overview_dto: GameOverviewDto) -> GameDetailDto:
                 else:
                     stat.away_team_score = team_value
             elif "srb-ParticipantLabel" in clazz:
-                labels.append(group.text)
+                labels.append(row["text"])
             elif home_team and "srb-ParticipantCenteredStackedMarketRow" in clazz:
                 stat = get_stat(labels[table_index])
                 stat.home_team_score = odds
@@ -154,8 +304,128 @@ def create_detail_dto(url: str, overview_dto: GameOverviewDto) -> GameDetailDto:
             elif "gl-MarketColumnHeader" in clazz and table_index > 0:
                 table_index = 0
                 home_team = False
-
-    driver.close()
+    return stats
+
+
+def read_market_groups_html(page: html.HtmlElement) -> List[dict]:
+    """
+    Same market group data as read_market_groups_script, read from a page source
+    """
+    def text(root, class_name, fallback):
+        return inner_text(first(root.xpath(f".//*[{has_class(class_name)}]")), fallback)
+
+    market_groups = []
+    for group in page.xpath(f"//*[{has_class('gl-MarketGroup')}]"):
+        market_groups.append({
+            "title": text(group, "gl-MarketGroupButton_Text", ""),
+            "duration": {
+                "threshold": inner_text(first(group.xpath(
+                    './/div[contains(@class, "srb-ParticipantLabelCentered_Name")]'
+                ))),
+                "over": inner_text(first(group.xpath(
+                    './/div[contains(text(), "Mais de ou Exatamente")]/following-sibling::div/span'
+                ))),
+                "under": inner_text(first(group.xpath(
+                    './/div[contains(text(), "Menos de")]/following-sibling::div/span'
+                ))),
+            },
+            "rows": [{
+                "clazz": row.get("class", ""),
+                "text": inner_text(row),
+                "odds": text(row, "srb-ParticipantCenteredStackedMarketRow_Odds", "-1"),
+                "handicap": text(row, "srb-ParticipantCenteredStackedMarketRow_Handicap", "-1"),
+                "spans": [inner_text(span) for span in row.iter("span")],
+            } for row in group.xpath(f".//*[{has_class('gl-MarketGroupContainer')}]/div/div")],
+        })
+    return market_groups
+
+
+def parse_page_source(page_source: str) -> Dict[str, List[StatDto]]:
+    """
+    Stats of a saved match page, without a browser
+    """
+    return parse_market_groups(read_market_groups_html(html.fromstring(page_source)))
+
+
+def fractional_to_decimal(odds: str) -> str:
+    try:
+        numerator, denominator = odds.split("/")
+        return str(round(float(numerator) / float(denominator) + 1, 2))
+    except ValueError:
+        return "-1"
+
+
+def decode_payloads(payloads: List[CapturedPayload]) -> Dict[str, List[StatDto]]:
+    """
+    Decodes the captured bet365 market data into the stats of a match. The data is pipe delimited:
+    records are separated by "|", start with their type (MG market group, MA market column,
+    PA participant) and continue with KEY=VALUE; fields. The decoded columns are laid out as the
+    rows of read_market_groups_script, so the same table parsing applies.
+    Experimental like decode_mode, the record keys haven't been checked against the live site.
+    """
+    market_groups: List[dict] = []
+    for payload in payloads:
+        for record in payload.body.split("|"):
+            fields = record.split(";")
+            # The first record of a message carries the message header in front of its type
+            record_type = fields[0][-2:]
+            values = dict(field.split("=", 1) for field in fields[1:] if "=" in field)
+            if record_type == "MG":
+                market_groups.append({"title": values.get("NA", ""), "columns": []})
+            elif record_type == "MA" and market_groups:
+                market_groups[-1]["columns"].append([])
+            elif record_type == "PA" and market_groups and market_groups[-1]["columns"]:
+                market_groups[-1]["columns"][-1].append(values)
+
+    decoded_groups = []
+    for market_group in market_groups:
+        columns = [column for column in market_group["columns"] if column]
+        label_columns = [column for column in columns if not any("OD" in x for x in column)]
+        odds_columns = [column for column in columns if any("OD" in x for x in column)]
+        participants = [participant for column in odds_columns for participant in column]
+
+        rows = []
+        if label_columns:
+            rows += [{"clazz": "srb-ParticipantLabel", "text": x.get("NA", ""), "odds": "-1",
+                      "handicap": "-1", "spans": []} for x in label_columns[0]]
+            for column in odds_columns:
+                rows.append({"clazz": "gl-MarketColumnHeader", "text": "", "odds": "-1", "handicap": "-1",
+                             "spans": []})
+                rows += [{"clazz": "srb-ParticipantCenteredStackedMarketRow", "text": "",
+                          "odds": fractional_to_decimal(x.get("OD", "")), "handicap": x.get("HA", "-1"),
+                          "spans": []} for x in column]
+        else:
+            rows += [{"clazz": "gl-ParticipantBorderless", "text": "", "odds": "-1", "handicap": "-1",
+                      "spans": [x.get("NA", ""), fractional_to_decimal(x.get("OD", ""))]} for x in participants]
+
+        duration = {
+            "threshold": next((x["HA"] for x in participants if ":" in x.get("HA", "")), None),
+            "over": next((fractional_to_decimal(x["OD"]) for x in participants
+                          if x.get("NA", "").startswith("Mais de") and "OD" in x), None),
+            "under": next((fractional_to_decimal(x["OD"]) for x in participants
+                           if x.get("NA", "").startswith("Menos de") and "OD" in x), None),
+        }
+        decoded_groups.append({"title": market_group["title"], "duration": duration, "rows": rows})
+    return parse_market_groups(decoded_groups)
+
+
+def create_detail_dto(
+    url: str,
+    overview_dto: GameOverviewDto,
+    session_driver: Union[webdriver.Chrome, None] = None,
+    readiness: Union[Readiness, None] = None,
+    capture: Union[NetworkCapture, None] = None,
+    deadline: Union[Deadline, None] = None,
+) -> GameDetailDto:
+    """
+    :param capture: Capture of the session driver. When its payloads decode to stats, the DOM isn't read
+    :param deadline: Budget of the match, checked between the steps and bounding the page waits
+    :raise DeadlineExceeded: when the match ran out of its budget
+    """
+    with span(f"{overview_dto.home_team} vs {overview_dto.away_team}", "match", url=url):
+        stats = read_match_stats(
+            url, overview_dto, session_driver, readiness or Readiness(readiness_profile), capture, deadline
+        )
 
     return GameDetailDto(
         overview=overview_dto,
@@ -177,122 +447,292 @@ def create_detail_dto(url: str, overview_dto: GameOverviewDto) -> GameDetailDto:
         game_duration=stats.get(duration_map_stat_name, [])
     )
 
+def read_match_stats(
+    url: str,
+    overview_dto: GameOverviewDto,
+    session_driver: Union[webdriver.Chrome, None],
+    readiness: Readiness,
+    capture: Union[NetworkCapture, None],
+    deadline: Union[Deadline, None] = None,
+) -> Dict[str, List[StatDto]]:
+    deadline = deadline or Deadline()
+    deadline.check("Opening the match")
+    readiness.throttle(url)
+    with span("load match page", "navigation"):
+        if session_driver is None:
+            readiness.pause()
+
+            # Tricking bet365 again
+            driver = open_url(url + "I2/")
+        else:
+            # The session browser already passed the bot check, so the match page opens in place
+            driver = session_driver
+            if capture is not None:
+                capture.clear()
+            driver.get(url + "I2/")
+
+    stats: Dict[str, List[StatDto]] = {}
+    payloads: List[CapturedPayload] = []
+    if capture is not None and session_driver is not None:
+        readiness.wait(driver, network_idle=True, deadline=deadline)
+        payloads = capture.collect()
+        if Bet365Webscraper.decode_mode:
+            with span("decode payloads", "parsing"):
+                stats = decode_payloads(payloads)
+    if not stats:
+        readiness.wait(driver, (By.CLASS_NAME, "gl-MarketGroup"), network_idle=True, deadline=deadline)
+        deadline.check("Reading the market groups")
+        with span("read market groups", "extraction"):
+            market_groups = driver.execute_script(read_market_groups_script)
+        with span("parse market groups", "parsing"):
+            stats = parse_market_groups(market_groups)
+        if Bet365Webscraper.snapshot_mode:
+            save_snapshot(driver, Bet365Webscraper.__name__, overview_dto)
+            save_payloads(Bet365Webscraper.__name__, overview_dto, payloads)
+
+    if session_driver is None:
+        driver.close()
+    return stats
+
+
+def fetch_details_worker(
+    jobs: "queue.Queue[Tuple[int, GameOverviewDto]]", scraper: "Bet365Webscraper"
+) -> List[Tuple[int, GameDetailDto]]:
+    """
+    Attaches its own driver to the session browser and works through the jobs in a dedicated tab
+    """
+    readiness = scraper.readiness
+    driver = scraper.commands.attach(attach_driver())
+    driver.switch_to.new_window("tab")
+    if Bet365Webscraper.blocking_profile is not None:
+        apply_blocking(driver, Bet365Webscraper.blocking_profile)
+    capture = None
+    if Bet365Webscraper.capture_mode:
+        capture = NetworkCapture(PerformanceLog(driver), Bet365Webscraper.capture_url_patterns)
+    games: List[Tuple[int, GameDetailDto]] = []
+    try:
+        while True:
+            try:
+                idx, overview_dto = jobs.get_nowait()
+            except queue.Empty:
+                break
+
+            if scraper.run_deadline.expired():
+                scraper.record_failure(overview_dto, "Run budget exhausted")
+                continue
+            print(f"[DEBUG]: Collecting matchup index: {idx}")
+            # start_match keeps a single deadline on the scraper, every worker thread needs its own
+            deadline = scraper.new_match_deadline()
+            scraper.track_commands(overview_dto)
+            try:
+                game = create_detail_dto(overview_dto.url, overview_dto, driver, readiness, capture, deadline)
+            except Exception as e:
+                print(f"[DEBUG] Failed collecting {overview_dto.url}: {e}")
+                scraper.record_failure(overview_dto, str(e))
+                continue
+            scraper.record(game)
+            games.append((idx, game))
+    finally:
+        driver.close()
+        driver.quit()
+    return games
+
+
+def fetch_details_concurrently(
+    overviews: List[GameOverviewDto], workers: int, scraper: "Bet365Webscraper"
+) -> List[GameDetailDto]:
+    jobs: "queue.Queue[Tuple[int, GameOverviewDto]]" = queue.Queue()
+    for job in enumerate(overviews):
+        jobs.put(job)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        worker_count = min(workers, len(overviews))
+        results = executor.map(fetch_details_worker, [jobs] * worker_count, [scraper] * worker_count)
+
+    # Merged back in discovery order, as if the matches were fetched one by one
+    return [game for _, game in sorted(flatmap(lambda x: x, results), key=lambda x: x[0])]
+
+
 class Bet365Webscraper(Webscraper):
+    readiness_profile = readiness_profile
+    detail_cache_ttl = detail_cache_ttl
+    capture_url_patterns = [r"bet365\.com/SportsBook\.API", r"premws|pshudws"]
+    # Stylesheets and fonts stay, the page layout has to match what the anti bot checks expect
+    blocking_profile = BlockingProfile(blocked=["images", "media", "trackers"])
+
     @staticmethod
     def create_driver(scraper: Type[Webscraper]) -> webdriver.Chrome:
         return open_url(scraper.get_url())
 
     @staticmethod
     def get_url() -> str:
-        return "https://www.bet365.com/#/AC/B151/C1/D50/E3/F163/"
+        return site_url
 
     def fetch_games(self) -> List[GameDetailDto]:
-        # Define the list of leagues you want to scrape
-        # target_leagues = ["LOL - LEC Winter","LOL - Ultraliga", "LOL - LLA Opening", "LOL - LCK CL Spring",
-        #                    "LOL - LCK Spring", "LOL - LFL Spring","LOL - LVP Superliga Spring",
-        #                 "LOL - Prime League Spring","LOL - PCS Spring", "LOL - TCL Winter", "LOL - LPL Spring", "LOL - LJL Spring"]  # Add your target leagues here
-        #target_leagues = ["LOL - LPL Spring", "LOL - LCK Spring"]
-        #arget_leagues = ["LOL - LFL Spring", "LOL - LVP Superliga Spring", "LOL - TCL Winter","LOL - NLC Spring"]
-        #target_leagues = ["LOL - LEC Winter - Playoffs"]
-        target_leagues = ["LOL - Prime League Spring"]
-        #target_leagues = ["LOL - CBLOL Split 1", "LOL - LCS Spring"]
-        #arget_leagues = ["LOL - LCO Split 1", "LOL - LLA Opening", "LOL - LEC Winter - Playoffs"]
-        
-        league_games = self.driver.find_elements(By.CLASS_NAME, "src-CompetitionMarketGroup")
-        print(f"[DEBUG] Leagues: {len(league_games)}")
-        games: List[GameDetailDto] = []
-        league_game_idx = 0
-        try:
-            while league_game_idx < len(league_games):
-                league_game = league_games[league_game_idx]
+        discovery_path = f"{get_state_folder()}/{discovery_file_name}"
+        if self.resume_mode and os.path.exists(discovery_path):
+            print(f"[DEBUG] Resuming from discovered matchups in {discovery_path}")
+            overviews = read_overviews(discovery_path)
+            cached: List[GameDetailDto] = []
+        else:
+            overviews, cached = self.discover_games()
+            write_overviews(discovery_path, overviews + [game.overview for game in cached])
+
+        for game in cached:
+            self.record(game)
+        # Matches captured by an interrupted run are kept, only the missing and failed ones get fetched
+        games = self.fetch_details([overview for overview in overviews if not self.is_captured(overview)])
+        if self.cache is not None:
+            for game in games:
+                self.cache.put(game)
+        return cached + games
 
-                league = league_game.find_element(By.CLASS_NAME, "rcl-CompetitionMarketGroupButton").text
+    @staticmethod
+    def supports_work_queue() -> bool:
+        # A worker opens the match urls in the session browser of its machine. It's launched from the windows
+        # chrome_path, so machines without it, like the containers, leave the bet365 jobs to the others
+        return session_mode and os.path.exists(chrome_path)
 
-                # Check if the league is in your list of target leagues
-                if league not in target_leagues:
-                    league_game_idx += 1
+    @staticmethod
+    def claim_worker_slot() -> bool:
+        return claim_session_browser()
+
+    def discover_jobs(self) -> Tuple[List[GameOverviewDto], List[GameDetailDto]]:
+        overviews, cached = self.discover_games()
+        return [overview for overview in overviews if not self.is_captured(overview)], cached
+
+    def fetch_job(self, overview_dto: GameOverviewDto) -> GameDetailDto:
+        deadline = self.start_match(overview_dto)
+        return create_detail_dto(overview_dto.url, overview_dto, self.driver, self.readiness, self.capture, deadline)
+
+    def discover_games(self) -> Tuple[List[GameOverviewDto], List[GameDetailDto]]:
+        """
+        Discovery pass: reads every matchup of the target leagues from the league page in a single
+        script call and resolves the match url of each of them
+        :return: The overviews of the matches to fetch, with their match url, and the cached details
+        of the matches whose list page moneyline didn't change
+        """
+        self.find_elements(By.CLASS_NAME, "src-CompetitionMarketGroup")
+        with span("read league groups", "extraction"):
+            leagues = self.driver.execute_script(
+                read_league_groups_script, matchup_rows_selector, list_odds_columns_selector, list_odds_selector
+            )
+        print(f"[DEBUG] Leagues: {len(leagues)}")
+
+        pending = []
+        for league_idx, league_group in enumerate(leagues):
+            league = league_group["league"]
+            if target_leagues and league not in target_leagues:
+                continue
+
+            print(f"[DEBUG] Collecting League: {league}")
+            current_match_date = datetime.now()
+            matchup_idx = -1
+            for row_idx, row in enumerate(league_group["rows"]):
+                if "rcl-MarketHeaderLabel-isdate" in row["clazz"]:
+                    current_match_date = read_stamp(" ".join(row["text"].strip().split(" ")[1:]))
                     continue
+                matchup_idx += 1
 
-                match_ups = league_game.find_elements(
-                    By.CSS_SELECTOR,
-                    "div.gl-MarketGroupContainer > div:nth-child(1) > div",
-                )
-                print(f"[DEBUG]: Matchups: {len(match_ups)}")
-                current_match_date = datetime.now()
-                match_up_idx = 0
-                print(f"[DEBUG] Collecting League: {league}")
-                while match_up_idx < len(match_ups):
-                    print(
-                        f"[DEBUG]: Collecting matchup index: {match_up_idx} / {len(match_ups)}"
-                    )
-                    match_up = match_ups[match_up_idx]
-                    match_up_idx += 1
-
-                    if "rcl-MarketHeaderLabel-isdate" in match_up.get_attribute(
-                        "class"
-                    ):
-                        current_match_date = read_stamp(
-                            " ".join(match_up.text.strip().split(" ")[1:])
-                        )
-                        continue
-
-                    print(f"[DEBUG] Collecting Match")
-                    time_string = match_up.find_element(
-                        By.CLASS_NAME, "ses-ParticipantFixtureDetailsEsports_Details"
-                    ).text
-                    print(time_string)
-                    try:
-                        date = datetime.combine(
-                            current_match_date, time_parser.fromisoformat(time_string)
-                        )
-                    except Exception:
-                        print("[DEBUG] Invalid date provided. Skipping...")
-                        continue
-
-                    team_elements = match_up.find_elements(
-                        By.CSS_SELECTOR,
-                        ".ses-ParticipantFixture"
-                        "DetailsEsports_TeamAndScores"
-                        "Container > div > div",
-                    )
-
-                    home_team = team_elements[0].text
-                    away_team = team_elements[1].text
-                    # overview_dto = GameOverviewDto(
-                    #     date, self.driver.current_url, league, home_team, away_team
-                    # )
-
-                    click_element(self.driver, match_up)
-                    url = self.driver.current_url
-                    print(url)
-
-                    overview_dto = GameOverviewDto(
-                        date, url , league, home_team, away_team
+                try:
+                    date = datetime.combine(
+                        current_match_date, time_parser.fromisoformat(row["time"])
                     )
+                except Exception:
+                    print("[DEBUG] Invalid date provided. Skipping...")
+                    continue
 
-                    self.driver.close()
-                    time.sleep(browser_redirect_wait)
-
-                    games.append(create_detail_dto(url, overview_dto))
-                    print(games)
-                    # Tricking bet365
-                    time.sleep(browser_redirect_wait)
-                    self.driver = self.create_driver(Bet365Webscraper)
-                    self.wait = WebDriverWait(self.driver, 10)
-
-                    time.sleep(browser_redirect_wait)
+                if len(row["teams"]) < 2:
+                    continue
+                overview_dto = GameOverviewDto(date, "", league, row["teams"][0], row["teams"][1])
+                if not self.is_covered(overview_dto):
+                    continue
+                fingerprint = "|".join(
+                    column[matchup_idx] for column in league_group.get("odds", []) if matchup_idx < len(column)
+                )
+                pending.append((league_idx, row_idx, fingerprint, overview_dto))
+
+        print(f"[DEBUG] Matchups: {len(pending)}")
+        overviews: List[GameOverviewDto] = []
+        cached: List[GameDetailDto] = []
+        for league_idx, row_idx, fingerprint, overview_dto in pending:
+            cached_game = self.cache.fresh(overview_dto, fingerprint) if self.cache is not None else None
+            if cached_game is not None:
+                # The match url is known from the cached run, so the matchup doesn't need a click
+                overview_dto.url = cached_game.overview.url
+                cached.append(cached_game)
+                continue
+            if self.run_deadline.expired():
+                self.record_failure(overview_dto, "Run budget exhausted")
+                continue
+            try:
+                overview_dto.url = self.resolve_match_url(league_idx, row_idx)
+            except Exception as e:
+                print(f"[DEBUG] Failed resolving url of {overview_dto.home_team} vs {overview_dto.away_team}: {e}")
+                self.record_failure(overview_dto, str(e))
+                continue
+            print(f"[DEBUG] Resolved {overview_dto.home_team} vs {overview_dto.away_team}: {overview_dto.url}")
+            overviews.append(overview_dto)
+        return overviews, cached
+
+    def resolve_match_url(self, league_idx: int, row_idx: int) -> str:
+        """
+        Clicks the matchup on the league page and reloads the league page for the next one
+        :raise Exception: when the reloaded league page lost the league or row read by the discovery pass
+        """
+        deadline = self.start_match()
+        with span("resolve match url", "navigation"):
+            league_games = self.find_elements(By.CLASS_NAME, "src-CompetitionMarketGroup")
+            if league_idx >= len(league_games):
+                raise Exception(f"League page shows {len(league_games)} leagues, league {league_idx} is gone")
+            rows = league_games[league_idx].find_elements(By.CSS_SELECTOR, matchup_rows_selector)
+            if row_idx >= len(rows):
+                raise Exception(f"League {league_idx} shows {len(rows)} rows, row {row_idx} is gone")
+            self.readiness.throttle(self.get_url())
+            click_element(self.driver, rows[row_idx], deadline)
+            url = self.driver.current_url
+            self.readiness.throttle(self.get_url())
+            self.driver.get(self.get_url())
+            # The url is already resolved, so the wait for the next matchup isn't cut by this match's deadline
+            self.readiness.wait(self.driver, (By.CLASS_NAME, "src-CompetitionMarketGroup"))
+        if url == self.get_url():
+            raise Exception("Matchup click did not navigate to the match page")
+        return url
+
+    def fetch_details(self, overviews: List[GameOverviewDto]) -> List[GameDetailDto]:
+        """
+        Detail pass: visits every match url directly and never goes back to the league page.
+        A failing match is skipped, so the pass can be restarted from the discovery file.
+        """
+        if session_mode and detail_workers > 1:
+            return fetch_details_concurrently(overviews, detail_workers, self)
+
+        if not session_mode:
+            # The legacy relaunch needs the debugging port free for each match
+            self.driver.close()
+            self.driver.quit()
 
-                    print(f"[DEBUG] Refreshing for stale to prevent stale referencing")
-                    league_games = self.driver.find_elements(
-                        By.CLASS_NAME, "src-CompetitionMarketGroup"
+        games: List[GameDetailDto] = []
+        for idx, overview_dto in enumerate(overviews):
+            if self.run_deadline.expired():
+                self.record_failure(overview_dto, "Run budget exhausted")
+                continue
+            print(f"[DEBUG]: Collecting matchup index: {idx} / {len(overviews)}")
+            deadline = self.start_match(overview_dto)
+            try:
+                if session_mode:
+                    game = create_detail_dto(
+                        overview_dto.url, overview_dto, self.driver, self.readiness, self.capture, deadline
                     )
-                    league_game = league_games[league_game_idx]
-                    match_ups = league_game.find_elements(
-                        By.CSS_SELECTOR,
-                        "div.gl-MarketGroupContainer > div:nth-child(1) > div",
+                else:
+                    game = create_detail_dto(
+                        overview_dto.url, overview_dto, readiness=self.readiness, deadline=deadline
                     )
-
-                league_game_idx += 1
-        except Exception as e:
-            print(e)
-        return games
\ No newline at end of file
+                    self.readiness.pause()
+            except Exception as e:
+                print(f"[DEBUG] Failed collecting {overview_dto.url}: {e}")
+                self.record_failure(overview_dto, str(e))
+                continue
+            self.record(game)
+            games.append(game)
+        return games
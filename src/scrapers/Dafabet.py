@@ -1,16 +1,20 @@
+import json
+import os
 import random
 import time
+from collections import deque
 from datetime import datetime, date
-from typing import Literal, List, Tuple, Union, Dict
-from selenium.common import NoSuchElementException
+from typing import Literal, List, Tuple, Union, Dict, Generator
+from lxml import html
 from selenium.webdriver import ActionChains, Keys
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.wait import WebDriverWait
 from src.Dtos import GameOverviewDto, GameDetailDto, StatDto
-from src.ScrapingService import Webscraper
+from src.ScrapingService import Webscraper, ReadinessProfile, CapturedPayload, BlockingProfile, save_payloads
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from src.Utils import parse_float, ScrollBox, remove_duplicates
+from src.Trace import span, tracer
+from src.Utils import parse_float, ScrollBox, remove_duplicates, run_steps, Deadline, has_class, inner_text, first
 import logging
 from selenium.common.exceptions import StaleElementReferenceException
 
@@ -19,8 +23,39 @@ logging.getLogger('selenium').setLevel(logging.WARNING)
 logging.getLogger('urllib3').setLevel(logging.WARNING)
 
 
+# Point this to a local fixture server to run the scraper without reaching dafabet
+site_url = os.environ.get(
+    "DAFABET_URL",
+    "https://esports.e1q1j0ov.com/esportsite/index.html?v=231219200001&id=1032&token=&languageCode=0&liveStream=1"
+    "&theme=default&streamer=1&streamerLiveStream=1#/",
+)
 date_format = "%m/%d %H:%M"
 max_scroll_height = 2000  # Prevent the scraper from making useless requests by scraping stats for unused values
+detail_tabs = 3  # Match tabs scrolled at the same time, 1 scrolls them one after another
+harvest_mode = True  # Runs the scroll loop inside the page and polls it, instead of one round trip per scroll step
+detail_cache_ttl = 3 * 60 * 60  # Seconds a match detail is reused while its list entry shows the same odds
+
+# Serializes every market item in the page, so the stats are built from one webdriver call
+read_market_items_script = """
+    const text = (root, outer, inner) => {
+        const wrapper = root.querySelector("." + outer);
+        const element = wrapper && wrapper.querySelector("." + inner);
+        return element ? element.innerText.trim() : null;
+    };
+    return Array.from(document.querySelectorAll(".PrematchMarket_eachItem")).map(item => ({
+        description: text(item, "itemContent_center", "resultDescription"),
+        home: text(item, "itemTeamAContent_left", "odds_value"),
+        away: text(item, "itemTeamBContent_right", "odds_value"),
+        total: text(item, "totalAmount_wrap", "totalAmount"),
+    }));
+"""
+
+# Keys of the market items in the captured api payloads. Like the stat names, update them to match
+# recorded payloads when the site changes
+market_name_key = "betTypeName"
+home_odds_key = "homeOdds"
+away_odds_key = "awayOdds"
+total_amount_key = "line"
 
 
 def xpath_for_team_name(team_type: Literal["Home", "Away"]) -> str:
@@ -37,27 +72,110 @@ def calculate_fair_odds(probability):
         return float('inf')
     return 1 / probability
 
-def map_element_to_stat_dto(stat: WebElement) -> Tuple[str, StatDto]:
-    home_team_odds = parse_float(stat.find_element(By.CLASS_NAME, "itemTeamAContent_left")
-                                 .find_element(By.CLASS_NAME, "odds_value").text)
-    away_team_odds = parse_float(stat.find_element(By.CLASS_NAME, "itemTeamBContent_right")
-                                 .find_element(By.CLASS_NAME, "odds_value").text)
-    result_description = (stat.find_element(By.CLASS_NAME, "itemContent_center")
-                          .find_element(By.CLASS_NAME, "resultDescription").text)
-    try:
-        total_amount = parse_float(stat.find_element(By.CLASS_NAME, "totalAmount_wrap")
-                                   .find_element(By.CLASS_NAME, "totalAmount").text)
-    except NoSuchElementException:
-        total_amount = -1
-
-    return result_description, StatDto(total_amount, home_team_odds, away_team_odds)
+def map_item_to_stat_dto(item: dict) -> Union[Tuple[str, StatDto], None]:
+    """
+    Maps a market item serialized by read_market_items_script to its name and stat
+    """
+    if item["description"] is None or item["home"] is None or item["away"] is None:
+        return None
+    total_amount = -1 if item["total"] is None else parse_float(item["total"])
+    return item["description"], StatDto(total_amount, parse_float(item["home"]), parse_float(item["away"]))
+
+
+def map_items_to_stats(market_items: List[dict]) -> Dict[str, List[StatDto]]:
+    stats: Dict[str, List[StatDto]] = {}
+    for (name, stat) in filter(None, map(map_item_to_stat_dto, market_items)):
+        if name not in stats:
+            stats[name] = []
+
+        stats[name].append(stat)
+    return remove_duplicates(stats)
+
+
+def read_market_items_html(page: html.HtmlElement) -> List[dict]:
+    """
+    Same market items as read_market_items_script, read from a page source
+    """
+    def text(root, outer, inner):
+        wrapper = first(root.xpath(f".//*[{has_class(outer)}]"))
+        return None if wrapper is None else inner_text(first(wrapper.xpath(f".//*[{has_class(inner)}]")))
+
+    return [{
+        "description": text(item, "itemContent_center", "resultDescription"),
+        "home": text(item, "itemTeamAContent_left", "odds_value"),
+        "away": text(item, "itemTeamBContent_right", "odds_value"),
+        "total": text(item, "totalAmount_wrap", "totalAmount"),
+    } for item in page.xpath(f"//*[{has_class('PrematchMarket_eachItem')}]")]
+
+
+def parse_page_source(page_source: str) -> Dict[str, List[StatDto]]:
+    """
+    Stats of a saved match page, without a browser
+    """
+    return map_items_to_stats(read_market_items_html(html.fromstring(page_source)))
+
+
+def decode_payloads(payloads: List[CapturedPayload]) -> Dict[str, List[StatDto]]:
+    """
+    Builds the stats of a match from the captured api payloads. Every json object holding a market
+    name and both odds counts as a market item, wherever it's nested.
+    Experimental like decode_mode, the keys haven't been checked against the live site.
+    """
+    items = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if all(key in node for key in (market_name_key, home_odds_key, away_odds_key)):
+                items.append({
+                    "description": str(node[market_name_key]),
+                    "home": str(node[home_odds_key]),
+                    "away": str(node[away_odds_key]),
+                    "total": None if node.get(total_amount_key) is None else str(node[total_amount_key]),
+                })
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    for payload in payloads:
+        try:
+            walk(json.loads(payload.body))
+        except ValueError:
+            continue
+    return map_items_to_stats(items)
+
+
+def create_detail_dto(overview_dto: GameOverviewDto, stats: Dict[str, List[StatDto]]) -> GameDetailDto:
+    return GameDetailDto(
+        overview=overview_dto,
+        winner=stats.get("Game 1 Win", []),
+        first_blood=stats.get("Game 1 First Blood", []),
+        first_kill_baron=stats.get("Game 1 First Baron", []),
+        first_destroy_inhibitor=stats.get("Game 1 First To Take Inhibitor", []),
+        total_kills=stats.get("Game 1 Total Kills", []),
+        total_barons=stats.get("Game 1 Total Barons", []),
+        total_towers=stats.get("Game 1 Total Turrets Taken - OFF", []),
+        tower_handicap=stats.get("Game 1 Total Turrets - OFF", []),
+        first_tower=stats.get("Game 1 First Turret", []),
+        kill_handicap=stats.get("Game 1 Kills Handicap", []),
+        total_dragons=stats.get("Game 1 Total Dragons", []),
+        first_dragon=stats.get("Game 1 First Dragon", []),  # Not the total, just to provide a value
+        total_inhibitors=stats.get("Game Total Inhibitor - OFF", []),  # Not the total, just to provide a value
+        game_duration=stats.get("Game 1 Duration Minutes", [])
+    )
 
 
 class DafabetWebscraper(Webscraper):
+    readiness_profile = ReadinessProfile(min_wait=0.5)
+    capture_url_patterns = [r"e1q1j0ov\.com/.*/api/"]
+    # The scroll container needs the stylesheets to get its height
+    blocking_profile = BlockingProfile(blocked=["images", "fonts", "media", "trackers"])
+    detail_cache_ttl = detail_cache_ttl
 
     @staticmethod
     def get_url() -> str:
-        return "https://esports.e1q1j0ov.com/esportsite/index.html?v=231219200001&id=1032&token=&languageCode=0&liveStream=1&theme=default&streamer=1&streamerLiveStream=1#/"
+        return site_url
 
     def fetch_games(self) -> List[GameDetailDto]:
         wait = WebDriverWait(self.driver, 10)
@@ -95,9 +213,12 @@ class DafabetWebscraper(Webscraper):
                 logging.debug(f"Collecting League: {league}")
 
                 elements = self.driver.find_elements(By.XPATH, "//div[@id='scrContainer']/div/div/a")
-                for element in elements:
-                    dto = self.map_element_to_detail_dto(league, element)
-                    print(dto)
+                # Captured payloads can't be told apart between tabs, so capture scrolls one tab at a time
+                if detail_tabs > 1 and self.capture is None:
+                    dtos = self.map_elements_to_detail_dtos(league, elements)
+                else:
+                    dtos = map(lambda x: self.map_element_to_detail_dto(league, x), elements)
+                for dto in dtos:
                     if dto is None:
                         continue
                     detail_dtos.append(dto)
@@ -119,64 +240,196 @@ class DafabetWebscraper(Webscraper):
         return detail_dtos
 
     def get_stats(self, element: WebElement) -> Dict[str, List[StatDto]]:
-        stat_elements = self.driver.execute_script("return document.querySelectorAll('.PrematchMarket_eachItem');")
-        stats: Dict[str, List[StatDto]] = {}
-        for (name, stat) in map(map_element_to_stat_dto, stat_elements):
-            if name not in stats:
-                stats[name] = []
-
-            stats[name].append(stat)
-        return remove_duplicates(stats)
+        return map_items_to_stats(self.driver.execute_script(read_market_items_script))
 
     def map_element_to_detail_dto(self, league, element: WebElement) -> Union[GameDetailDto, None]:
-        time.sleep(random.random() * 5 + 1)  # Add some random delay
-
         overview_dto = self.map_element_to_overview_dto(league, element)
+        if not self.is_covered(overview_dto) or self.is_captured(overview_dto):
+            return None
+        cached = self.cached_detail_dto(overview_dto, element)
+        if cached is not None:
+            self.record(cached)
+            return cached
+        if self.run_deadline.expired():
+            self.record_failure(overview_dto, "Run budget exhausted")
+            return None
+
+        self.timings.sleep(random.random() * 5 + 1)  # Add some random delay
         # logging.debug(f"Overview DTO: {overview_dto}")
         # if overview_dto.game_date <= datetime.now():
         #     return None
 
         main_window_handle = self.driver.current_window_handle
-        ActionChains(self.driver).key_down(Keys.CONTROL).click(element).key_up(Keys.CONTROL).perform()
-        new_tab_handle = None
-        for handle in self.driver.window_handles:
-            if handle != main_window_handle:
-                new_tab_handle = handle
+        if self.capture is not None:
+            self.capture.clear()
+        deadline = self.start_match(overview_dto)
+        with span(f"{overview_dto.home_team} vs {overview_dto.away_team}", "match", league=league):
+            new_tab_handle = self.open_detail_tab(element)
+            if new_tab_handle:
                 self.driver.switch_to.window(new_tab_handle)
-                break
-
-        wait = WebDriverWait(self.driver, 10)
-        game1_button = wait.until(
-            EC.presence_of_element_located((By.XPATH, "//div[text()='Game 1']"))
-        )
-        self.driver.execute_script("arguments[0].click();", game1_button)
-
-        stats: Dict[str, List[StatDto]] = (
-            ScrollBox(lambda: self.find_element(By.CLASS_NAME, "games_scroll"), max_scroll=max_scroll_height)
-            .collect(self.driver, self.get_stats)
-        )
+                self.apply_blocking()
+
+            try:
+                stats: Union[Dict[str, List[StatDto]], None] = run_steps(
+                    self.detail_tab_steps(overview_dto, deadline), self.timings
+                )
+            except Exception as e:
+                logging.error(f"Failed collecting {overview_dto.home_team} vs {overview_dto.away_team}: {e}")
+                self.record_failure(overview_dto, str(e))
+                stats = None
+            if stats is not None and self.snapshot_mode:
+                self.save_snapshot(overview_dto)
+
+            if new_tab_handle:
+                self.driver.close()
+            self.driver.switch_to.window(main_window_handle)
+        if stats is None:
+            return None
+
+        detail_dto = create_detail_dto(overview_dto, stats)
+        if self.cache is not None:
+            self.cache.put(detail_dto)
+        self.record(detail_dto)
+        return detail_dto
+
+    def map_elements_to_detail_dtos(self, league, elements: List[WebElement]) -> List[Union[GameDetailDto, None]]:
+        """
+        Scrolls up to detail_tabs matches at the same time. Every tab runs the same steps as
+        map_element_to_detail_dto, the driver switches to the tab whose next step is due.
+        """
+        main_window_handle = self.driver.current_window_handle
+        pending = deque()
+        # Tabs being scrolled as [due time, index, handle, overview, steps, deadline, span id]
+        tabs: List[list] = []
+        results: Dict[int, Union[GameDetailDto, None]] = {}
+        for index, element in enumerate(elements):
+            overview_dto = self.map_element_to_overview_dto(league, element)
+            if not self.is_covered(overview_dto) or self.is_captured(overview_dto):
+                results[index] = None
+                continue
+            cached = self.cached_detail_dto(overview_dto, element)
+            if cached is not None:
+                self.record(cached)
+                results[index] = cached
+            else:
+                pending.append((index, element, overview_dto))
+        next_open_at = time.time() + random.random() * 5 + 1  # Add some random delay
+
+        while pending or tabs:
+            can_open = pending and len(tabs) < detail_tabs
+            due_tab = min(tabs, key=lambda x: x[0]) if tabs else None
+            if can_open and (due_tab is None or next_open_at <= due_tab[0]):
+                if self.run_deadline.expired():
+                    index, _, overview_dto = pending.popleft()
+                    self.record_failure(overview_dto, "Run budget exhausted")
+                    results[index] = None
+                    continue
+                self.timings.sleep(max(0.0, next_open_at - time.time()))
+                index, element, overview_dto = pending.popleft()
+                self.driver.switch_to.window(main_window_handle)
+                handle = self.open_detail_tab(element)
+                if handle is None:
+                    logging.error(f"No tab opened for {overview_dto.home_team} vs {overview_dto.away_team}")
+                    self.record_failure(overview_dto, "No tab opened")
+                    results[index] = None
+                else:
+                    self.driver.switch_to.window(handle)
+                    self.apply_blocking()
+                    deadline = self.start_match(overview_dto)
+                    # The matches of the tabs overlap, so each one is a span of its own
+                    span_id = tracer.begin(f"{overview_dto.home_team} vs {overview_dto.away_team}", "match", league=league)
+                    tabs.append([
+                        time.time(), index, handle, overview_dto, self.detail_tab_steps(overview_dto, deadline), deadline, span_id
+                    ])
+                next_open_at = time.time() + random.random() * 5 + 1
+                continue
+
+            self.timings.sleep(max(0.0, due_tab[0] - time.time()))
+            _, index, handle, overview_dto, steps, deadline, span_id = due_tab
+            # find_element follows the budget of the tab being stepped, its commands count to its match
+            self.match_deadline = deadline
+            self.track_commands(overview_dto)
+            switched = False
+            try:
+                # A tab closed under the scraper fails its match only
+                self.driver.switch_to.window(handle)
+                switched = True
+                deadline.check("Collecting the match")
+                with span("tab step", "extraction", match=f"{overview_dto.home_team} vs {overview_dto.away_team}"):
+                    seconds = next(steps)
+                due_tab[0] = time.time() + seconds
+                continue
+            except StopIteration as result:
+                if self.snapshot_mode:
+                    self.save_snapshot(overview_dto)
+                results[index] = create_detail_dto(overview_dto, result.value)
+                if self.cache is not None:
+                    self.cache.put(results[index])
+                self.record(results[index])
+            except Exception as e:
+                logging.error(f"Failed collecting {overview_dto.home_team} vs {overview_dto.away_team}: {e}")
+                self.record_failure(overview_dto, str(e))
+                results[index] = None
+            tracer.end(span_id, collected=results[index] is not None)
+            if switched:
+                self.driver.close()
+            tabs.remove(due_tab)
 
-        if new_tab_handle:
-            self.driver.close()
         self.driver.switch_to.window(main_window_handle)
-
-        return GameDetailDto(
-            overview=overview_dto,
-            winner=stats.get("Game 1 Win", []),
-            first_blood=stats.get("Game 1 First Blood", []),
-            first_kill_baron=stats.get("Game 1 First Baron", []),
-            first_destroy_inhibitor=stats.get("Game 1 First To Take Inhibitor", []),
-            total_kills=stats.get("Game 1 Total Kills", []),
-            total_barons=stats.get("Game 1 Total Barons", []),
-            total_towers=stats.get("Game 1 Total Turrets Taken - OFF", []),
-            tower_handicap=stats.get("Game 1 Total Turrets - OFF", []),
-            first_tower=stats.get("Game 1 First Turret", []),
-            kill_handicap=stats.get("Game 1 Kills Handicap", []),
-            total_dragons=stats.get("Game 1 Total Dragons", []),
-            first_dragon=stats.get("Game 1 First Dragon", []),  # Not the total, just to provide a value
-            total_inhibitors=stats.get("Game Total Inhibitor - OFF", []),  # Not the total, just to provide a value
-            game_duration=stats.get("Game 1 Duration Minutes", [])
+        return [results[index] for index in range(len(elements))]
+
+    def cached_detail_dto(self, overview_dto: GameOverviewDto, element: WebElement) -> Union[GameDetailDto, None]:
+        """
+        The list entry shows the match winner odds, so its text changes whenever they move
+        """
+        if self.cache is None:
+            return None
+        return self.cache.fresh(overview_dto, element.text)
+
+    def open_detail_tab(self, element: WebElement) -> Union[str, None]:
+        self.readiness.throttle(element.get_attribute("href") or self.get_url())
+        handles_before = set(self.driver.window_handles)
+        with span("open match tab", "navigation"):
+            ActionChains(self.driver).key_down(Keys.CONTROL).click(element).key_up(Keys.CONTROL).perform()
+        for handle in self.driver.window_handles:
+            if handle not in handles_before:
+                return handle
+        return None
+
+    def detail_tab_steps(
+        self, overview_dto: GameOverviewDto, deadline: Deadline
+    ) -> Generator[float, None, Dict[str, List[StatDto]]]:
+        """
+        Steps of a single match tab, the driver has to be switched to the tab before each step
+        :param deadline: Budget of the match, the steps raise DeadlineExceeded once it passed
+        """
+        button_deadline = Deadline(10, deadline)
+        game1_buttons = self.driver.find_elements(By.XPATH, "//div[text()='Game 1']")
+        while not game1_buttons:
+            button_deadline.check("Finding the Game 1 button")
+            yield 0.25
+            game1_buttons = self.driver.find_elements(By.XPATH, "//div[text()='Game 1']")
+        self.driver.execute_script("arguments[0].click();", game1_buttons[0])
+
+        if self.capture is not None:
+            yield from self.readiness.steps(self.driver, network_idle=True, deadline=deadline)
+            payloads = self.capture.collect()
+            if self.decode_mode:
+                with span("decode payloads", "parsing"):
+                    stats = decode_payloads(payloads)
+                if stats:
+                    return stats
+            if self.snapshot_mode:
+                save_payloads(type(self).__name__, overview_dto, payloads)
+
+        scroll_box = ScrollBox(
+            lambda: self.find_element(By.CLASS_NAME, "games_scroll"), max_scroll=max_scroll_height, readiness=self.readiness
         )
+        if harvest_mode:
+            market_items = yield from scroll_box.harvest_steps(self.driver, read_market_items_script, deadline=deadline)
+            with span("parse market items", "parsing"):
+                return map_items_to_stats(market_items)
+        return (yield from scroll_box.steps(self.driver, self.get_stats, deadline))
 
     def map_element_to_overview_dto(self, league: str, element: WebElement) -> GameOverviewDto:
         home_team = element.find_element(By.XPATH, xpath_for_team_name("Home")).text
@@ -4,14 +4,17 @@ from datetime import datetime
 from typing import List, Dict
 
 import requests
+from lxml import html
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from src.Dtos import GameDetailDto, GameOverviewDto, StatDto
-from src.ScrapingService import Webscraper
-from src.Utils import ScrollBox, parse_float, remove_duplicates
+from src.scrapers import PinnacleApi
+from src.ScrapingService import Webscraper, ReadinessProfile, BlockingProfile
+from src.Trace import span
+from src.Utils import ScrollBox, parse_float, remove_duplicates, inner_text, first
 
 # Setting up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -51,6 +54,54 @@ interested_stats = {
     first_dragon_stat_name
 }
 
+market_groups_xpath = "//div[contains(@class,'style_marketGroups___6K0n') and contains(@class,'matchup-market-groups')]/div"
+expand_timeout_ms = 5000
+
+market_groups_js = """
+    const contentXPath = "./div[@class='style_content__23pgc collapse-content']";
+    const snapshot = (xpath, root) => {
+        const result = document.evaluate(xpath, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        return Array.from({length: result.snapshotLength}, (_, i) => result.snapshotItem(i));
+    };
+    const texts = (xpath, root) => snapshot(xpath, root).map(element => element.innerText.trim());
+    const groups = () => snapshot(arguments[0], document);
+    const isExpanded = group => !group.getAttribute("data-collapsed") && snapshot(contentXPath, group).length > 0;
+    const expandAll = () => groups().filter(group => group.getAttribute("data-collapsed")).forEach(group => {
+        try {
+            (group.querySelector("div.style_title__2wOdP") || group).click();
+        } catch (e) {}
+    });
+    const collect = () => groups().map(group => ({
+        title: texts("./div[contains(@class, 'style_title__2wOdP')]/span", group)[0] || "",
+        labels: texts(contentXPath + "/div/div/div/button/span[1]", group),
+        prices: texts(contentXPath + "/div/div/div/button/span[2]", group),
+    }));
+"""
+
+# Expands every collapsed market group at once, waits until their content rendered and returns the
+# titles, labels and prices of all groups in one payload
+expand_and_read_market_groups_script = market_groups_js + """
+    const [timeoutMs, done] = [arguments[1], arguments[2]];
+    expandAll();
+    const started = Date.now();
+    const poll = () => {
+        if (groups().every(isExpanded) || Date.now() - started > timeoutMs) {
+            done(collect());
+        } else {
+            setTimeout(poll, 100);
+        }
+    };
+    poll();
+"""
+
+# Prepare and extract functions of ScrollBox.harvest, the page waits for the expanded groups itself
+harvest_expand_script = market_groups_js + "expandAll();"
+harvest_read_script = market_groups_js + "return collect();"
+
+# Runs the scroll loop inside the page instead of one webdriver round trip per scroll step
+harvest_mode = True
+
+
 def extract_value_from_label(label: str) -> float:
     """
     Extract the numeric value from the given label.
@@ -64,8 +115,63 @@ def extract_value_from_label(label: str) -> float:
         logging.error("Failed to extract value from label: %s", label)
         return -1
     
+def parse_market_groups(market_groups: List[dict]) -> Dict[str, List[StatDto]]:
+    """
+    Parses the titles, labels and prices returned by expand_and_read_market_groups_script in bulk
+    """
+    stats: Dict[str, List[StatDto]] = {}
+    for market_group in market_groups:
+        stat_name = market_group["title"]
+        if stat_name not in interested_stats:
+            continue
+
+        teams = list(map(parse_float, market_group["prices"]))
+        labels = market_group["labels"]
+        logging.debug("Element, %s, teams: %s, labels: %s", stat_name, teams, labels)
+        content = list(zip(teams, labels))
+        pairwise = [[content[i], content[i + 1]] for i in range(0, len(content), 2)]
+        if stat_name not in stats:
+            stats[stat_name] = []
+
+        for home, away in pairwise:
+            value = -1
+            if ("Acima" in home[1] or "Mais" in home[1]) or (
+                not re.match(extract_number_regex, home[1])
+                and not re.match(extract_number_regex, away[1])
+            ):
+                if "Minutos" in home[1]:
+                    value = extract_value_from_label(home[1])
+                else:
+                    try:
+                        value = abs(parse_float(re.sub(extract_number_regex, "", home[1]))) / 10
+                    except ValueError:
+                        logging.error("Failed to parse float value from string: %s", home[1])
+
+            stats[stat_name].append(StatDto(value, home[0], away[0]))
+    return remove_duplicates(stats)
+
+
+def read_market_groups_html(page: html.HtmlElement, groups_xpath: str) -> List[dict]:
+    """
+    Same titles, labels and prices as the collect function of market_groups_js, read from a page source
+    """
+    content_xpath = "./div[@class='style_content__23pgc collapse-content']"
+    return [{
+        "title": inner_text(first(group.xpath("./div[contains(@class, 'style_title__2wOdP')]/span")), ""),
+        "labels": [inner_text(x) for x in group.xpath(content_xpath + "/div/div/div/button/span[1]")],
+        "prices": [inner_text(x) for x in group.xpath(content_xpath + "/div/div/div/button/span[2]")],
+    } for group in page.xpath(groups_xpath)]
+
+
+def parse_page_source(page_source: str, groups_xpath: str = market_groups_xpath) -> Dict[str, List[StatDto]]:
+    """
+    Stats of a saved match page with expanded market groups, without a browser
+    """
+    return parse_market_groups(read_market_groups_html(html.fromstring(page_source), groups_xpath))
+
+
 def request_matchups():
-    url = "https://guest.api.arcadia.pinnacle.com/0.1/sports/12/matchups?withSpecials=false&brandId=0"
+    url = f"{PinnacleApi.arcadia_base_url}/sports/12/matchups?withSpecials=false&brandId=0"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/116.0",
         "Accept": "application/json",
@@ -87,11 +193,26 @@ def request_matchups():
 
 
 class PinnacleWebscraper(Webscraper):
+    readiness_profile = ReadinessProfile(min_wait=0.5)
+    # The market groups are laid out and collapsed by the stylesheets, the odds don't need the rest
+    blocking_profile = BlockingProfile(blocked=["images", "fonts", "media", "trackers"])
+
     @staticmethod
     def get_url() -> str:
-        return "https://www.pinnacle.com/pt/esports/games/league-of-legends/matchups"
+        return f"{PinnacleApi.site_url}/pt/esports/games/league-of-legends/matchups"
+
+    @staticmethod
+    def uses_browser() -> bool:
+        return not PinnacleApi.http_mode
+
+    @staticmethod
+    def swaps_driver_between_matches() -> bool:
+        return True
 
     def fetch_games(self) -> List[GameDetailDto]:
+        if PinnacleApi.http_mode:
+            return PinnacleApi.fetch_scraper_games(self)
+
         logging.debug("Sending matchups request")
         data = request_matchups()
         lol_matchups = list(
@@ -114,104 +235,54 @@ class PinnacleWebscraper(Webscraper):
             )[0]["name"]
 
             date = datetime.strptime(matchup["startTime"], "%Y-%m-%dT%H:%M:%SZ")
-            self.driver.get(
-                f"https://www.pinnacle.com/pt/esports/league-of-legends-emea-masters/orbit-anonymo-vs"
-                f"-bisons/{matchup['id']}/#all"
-            )
-            self.timeout()
-
-            logging.debug("Getting Stats")
-            dtos.append(
-                self.collect_detail_dto(
-                    GameOverviewDto(
-                        date, self.driver.current_url, league, home_team, away_team
-                    )
-                )
-            )
+            listed_overview = GameOverviewDto(date, "", league, home_team, away_team)
+            if not self.is_covered(listed_overview) or self.is_captured(listed_overview):
+                continue
+            if self.run_deadline.expired():
+                self.record_failure(listed_overview, "Run budget exhausted")
+                continue
+            self.start_match(listed_overview)
+            url = PinnacleApi.matchup_url.format(site_url=PinnacleApi.site_url, id=matchup["id"])
+            with span(f"{home_team} vs {away_team}", "match", url=url):
+                self.readiness.throttle(url)
+                with span("load match page", "navigation"):
+                    self.driver.get(url)
+                self.readiness.wait(self.driver, (By.XPATH, market_groups_xpath))
+
+                logging.debug("Getting Stats")
+                overview_dto = GameOverviewDto(date, self.driver.current_url, league, home_team, away_team)
+                try:
+                    dtos.append(self.collect_detail_dto(overview_dto))
+                except Exception as e:
+                    # A match out of its budget or with a failed harvest is abandoned, the others still get collected
+                    logging.error("Failed collecting matchup %s: %s", matchup["id"], e)
+                    self.record_failure(overview_dto, str(e))
+                    continue
+            self.record(dtos[-1])
             logging.debug("Match collected")
             logging.debug("DTOs: %s", dtos)
         return dtos
 
     def get_stats(self, element: WebElement) -> Dict[str, List[StatDto]]:
         logging.debug("Started")
-        # stats_to_click = self.driver.find_elements(
-        #     By.CSS_SELECTOR,
-        #     "div.style_marketGroups__QCmgw.matchup-market" "-groups > div",
-        # )
-        stats_to_click = self.driver.find_elements(
-            By.CSS_SELECTOR,
-            "div.style_marketGroups___6K0n.matchup-market-groups > div",
+        market_groups = self.driver.execute_async_script(
+            expand_and_read_market_groups_script, market_groups_xpath, expand_timeout_ms
         )
-
-        #logging.debug(f"Stats to click, {stats_to_click}")
-        stats: Dict[str, List[StatDto]] = {}
-        for stat in stats_to_click:
-            if stat.get_attribute("data-collapsed"):
-                try:
-                    stat.click()
-                except Exception as e:
-                    break
-                self.timeout()
-            # stat_name = stat.find_element(
-            #     By.CSS_SELECTOR, "div.style_title__AkGLI > span"
-            # ).text
-            stat_name = stat.find_element(
-                By.CSS_SELECTOR, "div.style_title__2wOdP > span"
-            ).text
-            # AQUI
-            if stat_name not in interested_stats:
-                continue
-            logging.debug(f"Element, {stat_name}")
-            teams = list(
-                map(
-                    lambda x: parse_float(x.text),
-                    stat.find_elements(
-                        By.XPATH,
-                        "./div[@class='style_content__23pgc "
-                        "collapse-content']/div/div/div/button"
-                        "/span[2]",
-                    ),
-                )
-            )
-            logging.debug("teams: %s", teams)
-            labels = list(
-                map(
-                    lambda x: x.text,
-                    stat.find_elements(
-                        By.XPATH,
-                        "./div[@class='style_content__23pgc "
-                        "collapse-content']/div/div/div/button"
-                        "/span[1]",
-                    ),
-                )
-            )
-            logging.debug("labels: %s", labels)
-            content = list(zip(teams, labels))
-            pairwise = [[content[i], content[i + 1]] for i in range(0, len(content), 2)]
-            if stat_name not in stats:
-                stats[stat_name] = []
-
-            for home, away in pairwise:
-                value = -1
-                if ("Acima" in home[1] or "Mais" in home[1]) or (
-                    not re.match(extract_number_regex, home[1])
-                    and not re.match(extract_number_regex, away[1])
-                ):
-                    if "Minutos" in home[1]:
-                        value = extract_value_from_label(home[1])
-                    else:
-                        try:
-                            value = abs(parse_float(re.sub(extract_number_regex, "", home[1]))) / 10
-                        except ValueError:
-                            logging.error("Failed to parse float value from string: %s", home[1])
-
-                stats[stat_name].append(StatDto(value, home[0], away[0]))
-        return remove_duplicates(stats)
+        return parse_market_groups(market_groups)
 
     def collect_detail_dto(self, overview_dto: GameOverviewDto) -> GameDetailDto:
-        stats: Dict[str, List[StatDto]] = ScrollBox(
-            lambda: self.find_element(By.TAG_NAME, "html")
-        ).collect(self.driver, self.get_stats)
+        scroll_box = ScrollBox(lambda: self.find_element(By.TAG_NAME, "html"), readiness=self.readiness)
+        if harvest_mode:
+            market_groups = scroll_box.harvest(
+                self.driver, harvest_read_script, [market_groups_xpath], harvest_expand_script, key="title",
+                deadline=self.deadline(),
+            )
+            with span("parse market groups", "parsing"):
+                stats: Dict[str, List[StatDto]] = parse_market_groups(market_groups)
+        else:
+            stats: Dict[str, List[StatDto]] = scroll_box.collect(self.driver, self.get_stats, self.deadline())
+        if self.snapshot_mode:
+            self.save_snapshot(overview_dto)
 
         return GameDetailDto(
             overview=overview_dto,
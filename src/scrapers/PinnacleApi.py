@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import List, Dict, Union, Callable
+
+import httpx
+
+from src.Dtos import GameDetailDto, GameOverviewDto, StatDto
+from src.ScrapingService import HostRateLimiter, Webscraper, snapshot_path
+from src.Trace import tracer, span
+
+# Fetches the markets straight from the arcadia api instead of reading them from the browser. Off until the
+# special market descriptions and the side taken from their first participant are checked against responses
+# recorded with snapshot_mode, PINNACLE_HTTP_MODE=1 turns it on
+http_mode = os.environ.get("PINNACLE_HTTP_MODE", "0") == "1"
+
+# Responses of every matchup saved with snapshot_mode, the fixtures of tests/test_pinnacle_api.py
+snapshot_name = "PinnacleApi"
+
+# Point these to a local fixture server to run the scrapers without reaching pinnacle
+arcadia_base_url = os.environ.get("PINNACLE_API_URL", "https://guest.api.arcadia.pinnacle.com/0.1")
+site_url = os.environ.get("PINNACLE_URL", "https://www.pinnacle.com")
+matchup_url = "{site_url}/pt/esports/league-of-legends-emea-masters/orbit-anonymo-vs-bisons/{id}/#all"
+
+max_connections = 10
+max_concurrent_matchups = 5
+request_timeout_seconds = 15
+
+# Period of the markets on the first map, the match itself is period 0
+map_period = 1
+
+headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/116.0",
+    "Accept": "application/json",
+    "Accept-Language": "de,en-US;q=0.7,en;q=0.3",
+    "Referer": "https://www.pinnacle.com/",
+    "Content-Type": "application/json",
+    "X-API-Key": "CmX2KcMrXuFmNg6YFbmTxE0y9CIrOi0R",
+    "X-Device-UUID": "47c63eb4-db77bde8-11eade4e-3e26473b",
+    "Origin": "https://www.pinnacle.com",
+}
+
+# Related matchups counting kills carry the kill handicap and kill total markets
+kills_units = "Kills"
+
+# Descriptions of the special matchups as served by the api, mapped to the detail dto fields
+special_stat_fields = {
+    "(Map 1) First Blood": "first_blood",
+    "(Map 1) First Baron": "first_kill_baron",
+    "(Map 1) First Inhibitor": "first_destroy_inhibitor",
+    "(Map 1) First Tower": "first_tower",
+    "(Map 1) First Dragon": "first_dragon",
+    "(Map 1) Total Barons": "total_barons",
+    "(Map 1) Total Towers": "total_towers",
+    "(Map 1) Total Elemental Dragons": "total_dragons",
+    "(Map 1) Total Inhibitors": "total_inhibitors",
+    "(Map 1) Tower Handicap": "tower_handicap",
+    "(Map 1) Game Duration": "game_duration",
+}
+
+
+def american_to_decimal(price: float) -> float:
+    if price > 0:
+        return round(1 + price / 100, 3)
+    return round(1 + 100 / abs(price), 3)
+
+
+def is_pending_lol_matchup(matchup: dict) -> bool:
+    return ("League of Legends" in matchup["league"]["name"]
+            and matchup["status"] == "pending"
+            and matchup.get("parentId") is None)
+
+
+def map_overview(matchup: dict) -> GameOverviewDto:
+    home_team = list(filter(lambda x: x["alignment"] == "home", matchup["participants"]))[0]["name"]
+    away_team = list(filter(lambda x: x["alignment"] == "away", matchup["participants"]))[0]["name"]
+    date = datetime.strptime(matchup["startTime"], "%Y-%m-%dT%H:%M:%SZ")
+    return GameOverviewDto(
+        date, matchup_url.format(site_url=site_url, id=matchup["id"]), matchup["league"]["name"], home_team, away_team
+    )
+
+
+def price_for(market: dict, designation: str) -> Union[dict, None]:
+    return next((price for price in market["prices"] if price.get("designation") == designation), None)
+
+
+def map_two_way_market(market: dict, home: str, away: str) -> Union[StatDto, None]:
+    home_price = price_for(market, home)
+    away_price = price_for(market, away)
+    if home_price is None or away_price is None:
+        return None
+    return StatDto(
+        abs(home_price["points"]) if "points" in home_price else -1,
+        american_to_decimal(home_price["price"]),
+        american_to_decimal(away_price["price"]),
+    )
+
+
+def map_special_market(special: dict, market: dict) -> Union[StatDto, None]:
+    """
+    Specials price their participants by id instead of a designation. The first participant is
+    taken as the home/over side and the second one as the away/under side.
+    """
+    participant_ids = [participant["id"] for participant in special["participants"]]
+    prices = {price.get("participantId"): price for price in market["prices"]}
+    if len(participant_ids) != 2 or not all(x in prices for x in participant_ids):
+        return None
+    home_price, away_price = prices[participant_ids[0]], prices[participant_ids[1]]
+    return StatDto(
+        home_price.get("points", -1),
+        american_to_decimal(home_price["price"]),
+        american_to_decimal(away_price["price"]),
+    )
+
+
+def map_markets(matchup: dict, related: List[dict], markets: List[dict]) -> Dict[str, List[StatDto]]:
+    """
+    Maps the straight markets of a matchup and its related matchups to the detail dto fields
+    """
+    related_by_id = {x["id"]: x for x in related}
+    related_by_id[matchup["id"]] = matchup
+
+    stats: Dict[str, List[StatDto]] = {}
+
+    def add(field: str, stat: Union[StatDto, None]):
+        if stat is not None:
+            stats.setdefault(field, []).append(stat)
+
+    for market in markets:
+        if market.get("period") != map_period or market.get("status", "open") != "open":
+            continue
+        owner = related_by_id.get(market["matchupId"])
+        if owner is None:
+            continue
+
+        if owner.get("special"):
+            field = special_stat_fields.get(owner["special"].get("description"))
+            if field is not None:
+                add(field, map_special_market(owner, market))
+        elif owner.get("units") == kills_units:
+            if market["type"] == "spread":
+                add("kill_handicap", map_two_way_market(market, "home", "away"))
+            elif market["type"] == "total":
+                add("total_kills", map_two_way_market(market, "over", "under"))
+        elif owner["id"] == matchup["id"] and market["type"] == "moneyline":
+            add("winner", map_two_way_market(market, "home", "away"))
+    return {key: list(set(value)) for key, value in stats.items()}
+
+
+def create_detail_dto(matchup: dict, related: List[dict], markets: List[dict]) -> GameDetailDto:
+    stats = map_markets(matchup, related, markets)
+    return GameDetailDto(
+        overview=map_overview(matchup),
+        winner=stats.get("winner", []),
+        first_blood=stats.get("first_blood", []),
+        first_kill_baron=stats.get("first_kill_baron", []),
+        first_destroy_inhibitor=stats.get("first_destroy_inhibitor", []),
+        total_kills=stats.get("total_kills", []),
+        total_barons=stats.get("total_barons", []),
+        total_towers=stats.get("total_towers", []),
+        kill_handicap=stats.get("kill_handicap", []),
+        total_dragons=stats.get("total_dragons", []),
+        total_inhibitors=stats.get("total_inhibitors", []),
+        game_duration=stats.get("game_duration", []),
+        tower_handicap=stats.get("tower_handicap", []),
+        first_tower=stats.get("first_tower", []),
+        first_dragon=stats.get("first_dragon", [])
+    )
+
+
+async def get_json(client: httpx.AsyncClient, path: str, rate_limiter: Union[HostRateLimiter, None] = None):
+    if rate_limiter is not None:
+        await asyncio.sleep(rate_limiter.reserve(str(client.base_url)))
+    response = await client.get(path)
+    response.raise_for_status()
+    return response.json()
+
+
+def save_responses(matchup: dict, related: List[dict], markets: List[dict]):
+    responses = {"matchup": matchup, "related": related, "markets": markets}
+    with open(snapshot_path(snapshot_name, map_overview(matchup), ".api.json"), "w", encoding="utf-8") as f:
+        json.dump(responses, f, indent=2)
+
+
+async def fetch_detail_dto(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    matchup: dict,
+    rate_limiter: Union[HostRateLimiter, None] = None,
+    snapshot_mode: bool = False,
+) -> Union[GameDetailDto, None]:
+    async with semaphore:
+        logging.debug("Processing matchup ID: %s", matchup["id"])
+        # The matchups are fetched on one thread at the same time, so each one is a span of its own
+        span_id = tracer.begin(f"matchup {matchup['id']}", "match")
+        try:
+            related, markets = await asyncio.gather(
+                get_json(client, f"/matchups/{matchup['id']}/related", rate_limiter),
+                get_json(client, f"/matchups/{matchup['id']}/markets/related/straight", rate_limiter),
+            )
+        except httpx.HTTPError as e:
+            logging.error("Failed fetching markets of matchup %s: %s", matchup["id"], e)
+            tracer.end(span_id, collected=False)
+            return None
+    tracer.end(span_id, collected=True)
+    if snapshot_mode:
+        save_responses(matchup, related, markets)
+    return create_detail_dto(matchup, related, markets)
+
+
+async def fetch_games_async(
+    base_url: str = None,
+    rate_limiter: Union[HostRateLimiter, None] = None,
+    covers: Union[Callable[[GameOverviewDto], bool], None] = None,
+    snapshot_mode: bool = False,
+) -> List[GameDetailDto]:
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    async with httpx.AsyncClient(
+        base_url=base_url or arcadia_base_url, headers=headers, limits=limits, timeout=request_timeout_seconds
+    ) as client:
+        logging.debug("Sending matchups request")
+        data = await get_json(client, "/sports/12/matchups?withSpecials=false&brandId=0", rate_limiter)
+        lol_matchups = list(filter(is_pending_lol_matchup, data))
+        if covers is not None:
+            lol_matchups = [x for x in lol_matchups if covers(map_overview(x))]
+        logging.debug("Found %d pending lol matchups", len(lol_matchups))
+
+        semaphore = asyncio.Semaphore(max_concurrent_matchups)
+        dtos = await asyncio.gather(*[fetch_detail_dto(client, semaphore, x, rate_limiter, snapshot_mode) for x in lol_matchups])
+    return [dto for dto in dtos if dto is not None]
+
+
+def fetch_games(
+    base_url: str = None,
+    rate_limiter: Union[HostRateLimiter, None] = None,
+    covers: Union[Callable[[GameOverviewDto], bool], None] = None,
+    snapshot_mode: bool = False,
+) -> List[GameDetailDto]:
+    """
+    Fetches the straight markets of every pending lol matchup over the arcadia api, without a browser
+    :param rate_limiter: budget of the api host, requests wait for it without blocking the event loop
+    :param covers: filter on the matchups, the markets of the others aren't requested
+    :param snapshot_mode: saves the responses of every matchup with save_responses
+    """
+    return asyncio.run(fetch_games_async(base_url, rate_limiter, covers, snapshot_mode))
+
+
+def fetch_scraper_games(scraper: Webscraper) -> List[GameDetailDto]:
+    """
+    The http_mode run of the pinnacle scrapers, the captured and uncovered matchups are skipped
+    """
+    with span("arcadia api", "extraction"):
+        games = fetch_games(
+            rate_limiter=scraper.readiness.rate_limiter,
+            covers=lambda overview: not scraper.is_captured(overview) and scraper.is_covered(overview),
+            snapshot_mode=scraper.snapshot_mode,
+        )
+    for game in games:
+        scraper.record(game)
+    return games
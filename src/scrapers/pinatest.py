@@ -1,7 +1,7 @@
 import re
 import logging
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
 import requests
 from selenium.webdriver.common.by import By
@@ -10,8 +10,13 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from src.Dtos import GameDetailDto, GameOverviewDto, StatDto
-from src.ScrapingService import Webscraper
-from src.Utils import ScrollBox, parse_float, remove_duplicates
+from src.scrapers import PinnacleApi
+from src.scrapers import Pinnacle
+from src.scrapers.Pinnacle import expand_and_read_market_groups_script, expand_timeout_ms, parse_market_groups, \
+    harvest_mode, harvest_read_script, harvest_expand_script, market_groups_xpath
+from src.ScrapingService import Webscraper, ReadinessProfile, BlockingProfile
+from src.Trace import span
+from src.Utils import ScrollBox
 
 # Setting up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -51,6 +56,10 @@ interested_stats = {
     first_dragon_stat_name
 }
 
+# Only the market groups of the first map get expanded
+map_market_groups_xpath = "//div[contains(@class,'style_marketGroups___6K0n')]/div[.//span[contains(text(), '(Mapa 1)')]]"
+
+
 def extract_value_from_label(label: str) -> float:
     """
     Extract the numeric value from the given label.
@@ -64,8 +73,12 @@ def extract_value_from_label(label: str) -> float:
         logging.error("Failed to extract value from label: %s", label)
         return -1
     
+def parse_page_source(page_source: str) -> Dict[str, List[StatDto]]:
+    return Pinnacle.parse_page_source(page_source, map_market_groups_xpath)
+
+
 def request_matchups():
-    url = "https://guest.api.arcadia.pinnacle.com/0.1/sports/12/matchups?withSpecials=false&brandId=0"
+    url = f"{PinnacleApi.arcadia_base_url}/sports/12/matchups?withSpecials=false&brandId=0"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/116.0",
         "Accept": "application/json",
@@ -87,19 +100,57 @@ def request_matchups():
 
 
 class PinnacleWebscraper(Webscraper):
+    readiness_profile = ReadinessProfile(min_wait=0.5)
+    # The market groups are laid out and collapsed by the stylesheets, the odds don't need the rest
+    blocking_profile = BlockingProfile(blocked=["images", "fonts", "media", "trackers"])
+
     @staticmethod
     def get_url() -> str:
-        return "https://www.pinnacle.com/pt/esports/games/league-of-legends/matchups"
+        return f"{PinnacleApi.site_url}/pt/esports/games/league-of-legends/matchups"
+
+    @staticmethod
+    def uses_browser() -> bool:
+        return not PinnacleApi.http_mode
+
+    @staticmethod
+    def swaps_driver_between_matches() -> bool:
+        return True
 
     def fetch_games(self) -> List[GameDetailDto]:
+        if PinnacleApi.http_mode:
+            return PinnacleApi.fetch_scraper_games(self)
+
+        dtos: List[GameDetailDto] = []
+        overviews, _ = self.discover_jobs()
+        for overview_dto in overviews:
+            if self.run_deadline.expired():
+                self.record_failure(overview_dto, "Run budget exhausted")
+                continue
+            try:
+                dtos.append(self.fetch_job(overview_dto))
+            except Exception as e:
+                # A match out of its budget or with a failed harvest is abandoned, the others still get collected
+                logging.error("Failed collecting %s: %s", overview_dto.url, e)
+                self.record_failure(overview_dto, str(e))
+                continue
+            self.record(dtos[-1])
+            logging.debug("Match collected")
+            logging.debug("DTOs: %s", dtos)
+        return dtos
+
+    @staticmethod
+    def supports_work_queue() -> bool:
+        return not PinnacleApi.http_mode
+
+    def discover_jobs(self) -> Tuple[List[GameOverviewDto], List[GameDetailDto]]:
         logging.debug("Sending matchups request")
         data = request_matchups()
         lol_matchups = list(
             filter(lambda x: "League of Legends" in x["league"]["name"], data)
         )
         logging.debug("Found %d lol related matchups", len(lol_matchups))
-        dtos: List[GameDetailDto] = []
-        
+        overviews: List[GameOverviewDto] = []
+
         for matchup in lol_matchups:
             logging.debug("Processing matchup ID: %s", matchup['id'])
             if matchup["status"] != "pending":
@@ -114,97 +165,47 @@ class PinnacleWebscraper(Webscraper):
             )[0]["name"]
 
             date = datetime.strptime(matchup["startTime"], "%Y-%m-%dT%H:%M:%SZ")
-            self.driver.get(
-                f"https://www.pinnacle.com/pt/esports/league-of-legends-emea-masters/orbit-anonymo-vs"
-                f"-bisons/{matchup['id']}/#all"
-            )
-            self.timeout()
+            url = PinnacleApi.matchup_url.format(site_url=PinnacleApi.site_url, id=matchup["id"])
+            overview_dto = GameOverviewDto(date, url, league, home_team, away_team)
+            if not self.is_covered(overview_dto) or self.is_captured(overview_dto):
+                continue
+            overviews.append(overview_dto)
+        return overviews, []
+
+    def fetch_job(self, overview_dto: GameOverviewDto) -> GameDetailDto:
+        self.start_match(overview_dto)
+        with span(f"{overview_dto.home_team} vs {overview_dto.away_team}", "match", url=overview_dto.url):
+            self.readiness.throttle(overview_dto.url)
+            with span("load match page", "navigation"):
+                self.driver.get(overview_dto.url)
+            self.readiness.wait(self.driver, (By.XPATH, market_groups_xpath))
 
             logging.debug("Getting Stats")
-            dtos.append(
-                self.collect_detail_dto(
-                    GameOverviewDto(
-                        date, self.driver.current_url, league, home_team, away_team
-                    )
-                )
-            )
-            logging.debug("Match collected")
-            logging.debug("DTOs: %s", dtos)
-        return dtos
+            return self.collect_detail_dto(GameOverviewDto(
+                overview_dto.game_date, self.driver.current_url, overview_dto.league, overview_dto.home_team,
+                overview_dto.away_team
+            ))
 
     def get_stats(self, element: WebElement) -> Dict[str, List[StatDto]]:
         logging.debug("Started")
-        stats: Dict[str, List[StatDto]] = {}
-
-        stats_to_click = self.driver.find_elements(By.XPATH,
-        "//div[contains(@class,'style_marketGroups___6K0n')]/div[.//span[contains(text(), '(Mapa 1)')]]")
-        
-        for stat in stats_to_click:
-            if stat.get_attribute("data-collapsed"):
-                try:
-                    stat.click()
-                except Exception as e:
-                    break
-                self.timeout()
-
-            # Find the stat name
-            stat_name = stat.find_element(By.CSS_SELECTOR, "div.style_title__2wOdP > span").text
-            
-            # Check if stat_name is one of the interested stats
-            if stat_name not in interested_stats:
-                continue
-
-            logging.debug(f"Element, {stat_name}")
-            teams = list(
-                map(
-                    lambda x: parse_float(x.text),
-                    stat.find_elements(
-                        By.XPATH,
-                        "./div[@class='style_content__23pgc "
-                        "collapse-content']/div/div/div/button"
-                        "/span[2]",
-                    ),
-                )
-            )
-            logging.debug("teams: %s", teams)
-            labels = list(
-                map(
-                    lambda x: x.text,
-                    stat.find_elements(
-                        By.XPATH,
-                        "./div[@class='style_content__23pgc "
-                        "collapse-content']/div/div/div/button"
-                        "/span[1]",
-                    ),
-                )
-            )
-            logging.debug("labels: %s", labels)
-            content = list(zip(teams, labels))
-            pairwise = [[content[i], content[i + 1]] for i in range(0, len(content), 2)]
-            if stat_name not in stats:
-                stats[stat_name] = []
-
-            for home, away in pairwise:
-                value = -1
-                if ("Acima" in home[1] or "Mais" in home[1]) or (
-                    not re.match(extract_number_regex, home[1])
-                    and not re.match(extract_number_regex, away[1])
-                ):
-                    if "Minutos" in home[1]:
-                        value = extract_value_from_label(home[1])
-                    else:
-                        try:
-                            value = abs(parse_float(re.sub(extract_number_regex, "", home[1]))) / 10
-                        except ValueError:
-                            logging.error("Failed to parse float value from string: %s", home[1])
-
-                stats[stat_name].append(StatDto(value, home[0], away[0]))
-        return remove_duplicates(stats)
+        market_groups = self.driver.execute_async_script(
+            expand_and_read_market_groups_script, map_market_groups_xpath, expand_timeout_ms
+        )
+        return parse_market_groups(market_groups)
 
     def collect_detail_dto(self, overview_dto: GameOverviewDto) -> GameDetailDto:
-        stats: Dict[str, List[StatDto]] = ScrollBox(
-            lambda: self.find_element(By.TAG_NAME, "html")
-        ).collect(self.driver, self.get_stats)
+        scroll_box = ScrollBox(lambda: self.find_element(By.TAG_NAME, "html"), readiness=self.readiness)
+        if harvest_mode:
+            market_groups = scroll_box.harvest(
+                self.driver, harvest_read_script, [map_market_groups_xpath], harvest_expand_script, key="title",
+                deadline=self.deadline(),
+            )
+            with span("parse market groups", "parsing"):
+                stats: Dict[str, List[StatDto]] = parse_market_groups(market_groups)
+        else:
+            stats: Dict[str, List[StatDto]] = scroll_box.collect(self.driver, self.get_stats, self.deadline())
+        if self.snapshot_mode:
+            self.save_snapshot(overview_dto)
 
         return GameDetailDto(
             overview=overview_dto,
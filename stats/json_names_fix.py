@@ -4,6 +4,7 @@ import json
 import os
 import glob
 import logging
+import sys
 from colorama import init, Fore
 
 # Configure logging
@@ -14,6 +15,10 @@ init(autoreset=True)
 current_script_directory = os.path.dirname(os.path.realpath(__file__))
 # Go up two levels to get the root directory
 root_directory = os.path.dirname(current_script_directory)
+sys.path.insert(0, root_directory)
+
+# Shared with the scrapers, which skip matches of teams missing from the database
+from src.TeamIndex import name_corrections
 
 def read_db_names(csv_filepath):
     df = pd.read_csv(csv_filepath)
@@ -95,26 +100,6 @@ def process_all_json_files(db_names, name_corrections):
                 # Pass name_corrections to process_json_files_in_directory
                 process_json_files_in_directory(db_names, day_path, log_file_path, name_corrections)
 
-name_corrections = {
-    "Karmine Corp.A": "Karmine Corp Blue",
-    "Team BDS.A": "Team BDS Academy",
-    "Orbit Anonymo": "Orbit Anonymo Esports",
-    "Kwangdong Freecs.Ch": "Kwangdong Freecs Challengers",
-    "DRX.Ch": "DRX Challengers",
-    "FearX.Y": "FearX Youth",
-    "Hanwha Life Esports.Ch":"Hanwha Life Esports Challengers",
-    "Gen.G.GA":"Gen.G Global Academy",
-    "T1.EA":"T1 Esports Academy",
-    "KT Rolster.Ch":"KT Rolster Challengers",
-    "OKSavingsBank BRION.Ch":"OKSavingsBank BRION Challengers",
-    "Dplus KIA.Ch":"Dplus KIA Challengers",
-    "Nongshim.EA":"",
-    "Besiktas Esports":"Beşiktaş Esports",
-    "BKROG": "BK ROG Esports",
-    "UCAM Tokiers": "UCAM Esports",
-    "big":"Berlin International Gaming",
-    "AF willhaben":"Austrian Force willhaben"
-}
 
 # Main execution
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+
+from src.Dtos import GameDetailDto, GameOverviewDto, StatDto
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    The scrapers write to ./data relative to the working directory, so every test gets its own
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def make_overview(home_team: str = "T1", away_team: str = "Gen.G", minute: int = 0, url: str = "") -> GameOverviewDto:
+    return GameOverviewDto(datetime(2030, 1, 1, 12, minute), url, "LCK", home_team, away_team)
+
+
+def make_detail(overview: GameOverviewDto = None, winner=None) -> GameDetailDto:
+    return GameDetailDto(overview or make_overview(), winner or [StatDto(-1, 1.5, 2.5)], *[[] for _ in range(13)])
+
+
+class StubDriver:
+    """
+    Stands in for a selenium driver: every command is recorded and answered with None
+    """
+
+    def __init__(self):
+        self.commands = []
+
+    def execute(self, driver_command: str, params: dict = None):
+        self.commands.append(driver_command)
+        return {"value": None}
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: dict):
+        return self.execute("executeCdpCommand", {"cmd": cmd, "params": cmd_args})["value"]
+
+    def get_log(self, log_type: str):
+        return []
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
@@ -0,0 +1,126 @@
+import socket
+import time
+
+import pytest
+
+from conftest import StubDriver, make_detail, make_overview
+from src.Json import write_overviews
+from src.ScrapingService import Readiness
+from src.Utils import get_state_folder, Deadline, DeadlineExceeded
+from src.scrapers import Bet365
+from src.scrapers.Bet365 import Bet365Webscraper
+
+
+class Resumable(Bet365Webscraper):
+    resume_mode = True
+    stream_output = False
+    prefilter_teams = False
+    detail_cache_ttl = None
+
+    def discover_games(self):
+        raise AssertionError("The discovery pass should be skipped")
+
+    def fetch_details(self, overviews):
+        return [make_detail(overview) for overview in overviews]
+
+
+def test_resume_mode_reuses_discovered_matchups(workdir):
+    overviews = [make_overview(minute=1, url="a"), make_overview(minute=2, url="b")]
+    write_overviews(f"{get_state_folder()}/{Bet365.discovery_file_name}", overviews)
+    games = Resumable(StubDriver()).fetch_games()
+    assert [game.overview.url for game in games] == ["a", "b"]
+
+
+class StubBrowser(StubDriver):
+    def __init__(self):
+        super().__init__()
+        self.switch_to = self
+
+    def new_window(self, type_hint: str):
+        pass
+
+
+class Budgeted(Bet365Webscraper):
+    stream_output = False
+    prefilter_teams = False
+    detail_cache_ttl = None
+    match_budget_seconds = 0.05
+
+
+def test_detail_workers_give_every_match_its_own_budget(monkeypatch):
+    started = []
+
+    def fake_create_detail_dto(url, overview_dto, driver, readiness, capture, deadline):
+        started.append(deadline)
+        deadline.check("Reading the match")
+        time.sleep(0.1)
+        return make_detail(overview_dto)
+
+    monkeypatch.setattr(Bet365, "attach_driver", StubBrowser)
+    monkeypatch.setattr(Bet365, "create_detail_dto", fake_create_detail_dto)
+    scraper = Budgeted(StubDriver())
+    overviews = [make_overview(minute=minute, url=str(minute)) for minute in range(3)]
+
+    games = Bet365.fetch_details_concurrently(overviews, 1, scraper)
+
+    # The first match going over its budget doesn't take the budget of the next ones
+    assert len(games) == 3
+    assert len({id(deadline) for deadline in started}) == 3
+
+
+def test_a_match_out_of_budget_is_not_opened():
+    driver = StubDriver()
+    with pytest.raises(DeadlineExceeded):
+        Bet365.read_match_stats("url", make_overview(), driver, Readiness(Bet365.readiness_profile), None, Deadline(0))
+    assert driver.commands == []
+
+
+def test_work_queue_needs_the_session_chrome(monkeypatch, tmp_path):
+    monkeypatch.setattr(Bet365, "session_mode", True)
+    monkeypatch.setattr(Bet365, "chrome_path", str(tmp_path / "chrome.exe"))
+    assert not Bet365Webscraper.supports_work_queue()
+
+    (tmp_path / "chrome.exe").touch()
+    assert Bet365Webscraper.supports_work_queue()
+
+
+class League:
+    def __init__(self, rows: int):
+        self.rows = rows
+
+    def find_elements(self, by: str, value: str):
+        return [object()] * self.rows
+
+
+class ReloadedLeaguePage(Bet365Webscraper):
+    stream_output = False
+    prefilter_teams = False
+    detail_cache_ttl = None
+
+    def find_elements(self, by: str, value: str):
+        # The league lost a row between the discovery pass and the reload
+        return [League(2)]
+
+
+@pytest.mark.parametrize("league_idx,row_idx,message", [(1, 0, "league 1 is gone"), (0, 2, "row 2 is gone")])
+def test_matchup_missing_after_the_reload_fails_that_match(league_idx, row_idx, message):
+    driver = StubDriver()
+    with pytest.raises(Exception, match=message):
+        ReloadedLeaguePage(driver).resolve_match_url(league_idx, row_idx)
+    assert driver.commands == []
+
+
+def test_a_single_worker_per_machine_takes_the_session_browser(monkeypatch):
+    other_worker = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    other_worker.bind(("127.0.0.1", 0))
+    monkeypatch.setattr(Bet365, "worker_lock_port", other_worker.getsockname()[1])
+    monkeypatch.setattr(Bet365, "worker_lock", None)
+    try:
+        assert not Bet365Webscraper.claim_worker_slot()
+        other_worker.close()
+        assert Bet365Webscraper.claim_worker_slot()
+        assert Bet365Webscraper.claim_worker_slot()
+    finally:
+        other_worker.close()
+        if Bet365.worker_lock is not None:
+            Bet365.worker_lock.close()
@@ -0,0 +1,43 @@
+import json
+
+from src.ScrapingService import BlockingProfile, BlockingReport, PerformanceLog, Webscraper
+from src.scrapers.Dafabet import DafabetWebscraper
+from conftest import StubDriver
+
+
+class LogDriver(StubDriver):
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    def get_log(self, log_type: str):
+        entries = [{"message": json.dumps({"message": {"method": method, "params": params}})}
+                   for method, params in self.events]
+        self.events = []
+        return entries
+
+
+def test_blocking_is_opt_in_and_does_not_need_the_performance_log():
+    assert Webscraper.blocking_profile is None
+    assert not DafabetWebscraper.uses_performance_log()
+    assert "*.css" not in DafabetWebscraper.blocking_profile.url_patterns()
+
+
+def test_blocking_report_counts_requests_and_measured_bytes():
+    driver = LogDriver([
+        ("Network.requestWillBeSent", {"requestId": "1", "type": "Image"}),
+        ("Network.loadingFailed", {"requestId": "1", "type": "Image", "blockedReason": "inspector"}),
+        ("Network.requestWillBeSent", {"requestId": "2", "type": "XHR"}),
+        ("Network.loadingFinished", {"requestId": "2", "encodedDataLength": 2_000_000}),
+    ])
+    report = BlockingReport(PerformanceLog(driver)).report("Test")
+
+    assert "blocked 1 requests {'Image': 1}" in report
+    assert "transferred 2.0 MB {'XHR': 2.0}" in report
+    assert "saving" not in report
+
+
+def test_profile_allows_patterns_of_a_blocked_group():
+    profile = BlockingProfile(blocked=["images"], allowed=["*.svg"])
+    assert "*.svg" not in profile.url_patterns()
+    assert not profile.blocks_images()
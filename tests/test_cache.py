@@ -0,0 +1,53 @@
+import time
+
+from conftest import make_detail, make_overview
+from src.Cache import DetailCache, refresh_interval, far_refresh_seconds, overview_key
+
+
+def test_refresh_interval_shrinks_towards_kickoff():
+    assert refresh_interval(5 * 60) == 2 * 60
+    assert refresh_interval(15 * 60) == 2 * 60
+    assert refresh_interval(15 * 60 + 1) == 10 * 60
+    assert refresh_interval(5 * 60 * 60) == 30 * 60
+    assert refresh_interval(12 * 60 * 60) == 60 * 60
+    assert refresh_interval(3 * 24 * 60 * 60) == far_refresh_seconds
+
+
+def test_overview_key_ignores_url():
+    assert overview_key(make_overview(url="a")) == overview_key(make_overview(url="b"))
+    assert overview_key(make_overview()) != overview_key(make_overview(home_team="DRX"))
+
+
+def test_cache_reuses_detail_while_fingerprint_is_unchanged(workdir):
+    cache = DetailCache("Test", ttl_seconds=24 * 60 * 60)
+    overview = make_overview()
+    assert cache.fresh(overview, "1.5|2.5") is None
+    cache.put(make_detail(overview))
+    cache.save()
+
+    reloaded = DetailCache("Test", ttl_seconds=24 * 60 * 60)
+    cached = reloaded.fresh(make_overview(url="new"), "1.5|2.5")
+    assert cached is not None
+    assert cached.overview.url == "new"
+    assert reloaded.fresh(overview, "1.4|2.6") is None
+    assert (reloaded.hits, reloaded.misses) == (1, 1)
+
+
+def test_cache_skips_matches_without_fingerprint(workdir):
+    cache = DetailCache("Test", ttl_seconds=60)
+    overview = make_overview()
+    assert cache.fresh(overview, "") is None
+    cache.put(make_detail(overview))
+    assert cache.entries == {}
+
+
+def test_cache_expires_close_to_kickoff(workdir, monkeypatch):
+    cache = DetailCache("Test", ttl_seconds=24 * 60 * 60)
+    overview = make_overview()
+    cache.fresh(overview, "x")
+    cache.put(make_detail(overview))
+    entry = cache.entries[overview_key(overview)]
+    # 10 minutes before kickoff the odds may only be 2 minutes old
+    entry.kickoff = time.time() + 10 * 60
+    entry.scraped_at = time.time() - 3 * 60
+    assert cache.fresh(overview, "x") is None
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import websockets
+from selenium.common import (
+    JavascriptException,
+    StaleElementReferenceException,
+    TimeoutException,
+    UnknownMethodException,
+    WebDriverException,
+)
+
+from src.CdpDriver import CdpDriver, CdpElement, event_loop
+from src.ScrapingService import Webscraper
+
+
+class FakeChrome:
+    """
+    Answers the DevTools commands of a browser with a single page, every command on a task of its own
+    so a slow one doesn't hold back the others
+    """
+
+    def __init__(self):
+        self.received = []
+
+    async def handle(self, websocket, path=None):
+        async for raw in websocket:
+            message = json.loads(raw)
+            self.received.append(message)
+            asyncio.ensure_future(self.answer(websocket, message))
+
+    async def answer(self, websocket, message: dict):
+        method, params = message["method"], message["params"]
+        session = {"sessionId": message["sessionId"]} if "sessionId" in message else {}
+        events = []
+        if method == "Target.getTargets":
+            response = {"result": {"targetInfos": [{"targetId": "page", "type": "page", "url": "about:blank"}]}}
+        elif method == "Target.attachToTarget":
+            response = {"result": {"sessionId": "session-" + params["targetId"]}}
+        elif method == "Page.navigate" and "unreachable" in params["url"]:
+            response = {"result": {"frameId": "frame", "errorText": "net::ERR_NAME_NOT_RESOLVED"}}
+        elif method == "Page.navigate":
+            loader_id = "loader-" + params["url"]
+            response = {"result": {"frameId": "frame", "loaderId": loader_id}}
+            events = [
+                {"method": "Network.requestWillBeSent", "params": {"requestId": "1", "type": "XHR"}, **session},
+                {"method": "Network.requestWillBeSent", "params": {"requestId": "2"}, "sessionId": "other"},
+            ]
+            if "hanging" not in params["url"]:
+                events.append({"method": "Page.lifecycleEvent", "params": {"name": "load", "loaderId": loader_id},
+                               **session})
+        elif method == "Runtime.evaluate" and params["expression"] == "throw":
+            response = {"result": {"result": {"type": "object"}, "exceptionDetails": {
+                "text": "Uncaught", "exception": {"description": "Error: thrown by the page"}}}}
+        elif method == "Runtime.evaluate":
+            if params["expression"] == "slow":
+                await asyncio.sleep(0.2)
+            response = {"result": {"result": {"type": "string", "value": params["expression"]}}}
+        elif method == "Runtime.callFunctionOn":
+            response = {"error": {"code": -32000, "message": "Could not find object with given id"}}
+        elif method == "Browser.crash":
+            await websocket.close()
+            return
+        else:
+            response = {"result": {}}
+
+        await websocket.send(json.dumps({"id": message["id"], **session, **response}))
+        for event in events:
+            await websocket.send(json.dumps(event))
+
+    def commands(self, method: str) -> list:
+        return [message for message in self.received if message["method"] == method]
+
+
+@pytest.fixture
+def chrome():
+    fake = FakeChrome()
+
+    async def serve():
+        return await websockets.serve(fake.handle, "127.0.0.1", 0)
+
+    # Served on the loop of the cdp drivers, like the other websocket ends it talks to
+    server = asyncio.run_coroutine_threadsafe(serve(), event_loop()).result()
+    websocket_url = "ws://127.0.0.1:%d/devtools/browser/fake" % server.sockets[0].getsockname()[1]
+
+    class VersionHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps({"webSocketDebuggerUrl": websocket_url}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), VersionHandler)
+    threading.Thread(target=http_server.serve_forever, args=(0.05,), daemon=True).start()
+    fake.debugger_address = "127.0.0.1:%d" % http_server.server_address[1]
+    yield fake
+    http_server.shutdown()
+    server.close()
+    asyncio.run_coroutine_threadsafe(server.wait_closed(), event_loop()).result()
+
+
+@pytest.fixture
+def driver(chrome):
+    driver = CdpDriver.attach(chrome.debugger_address, performance_log=True)
+    yield driver
+    driver.quit()
+
+
+def test_attaches_to_the_page_as_a_flat_session(chrome, driver):
+    assert driver.current_window_handle == "page"
+    assert chrome.commands("Target.attachToTarget")[0]["params"] == {"targetId": "page", "flatten": True}
+    assert all(message["sessionId"] == "session-page" for message in chrome.commands("Page.enable"))
+
+
+def test_responses_are_matched_to_their_command_by_id(chrome, driver):
+    results = {}
+    finished = []
+
+    def evaluate(expression: str):
+        results[expression] = driver.execute_cdp_cmd("Runtime.evaluate", {"expression": expression})
+        finished.append(expression)
+
+    slow = threading.Thread(target=evaluate, args=("slow",))
+    slow.start()
+    time.sleep(0.05)
+    evaluate("fast")
+    slow.join()
+
+    assert finished == ["fast", "slow"]
+    assert results["slow"]["result"]["value"] == "slow"
+    assert results["fast"]["result"]["value"] == "fast"
+    ids = [message["id"] for message in chrome.received]
+    assert len(ids) == len(set(ids))
+
+
+def test_load_and_network_events_are_dispatched_to_their_tab(driver):
+    driver.get("http://bookmaker/match")
+    log = [json.loads(entry["message"]) for entry in driver.get_log("performance")]
+
+    methods = [entry["message"]["method"] for entry in log]
+    assert methods == ["Network.requestWillBeSent", "Page.lifecycleEvent"]
+    assert all(entry["webview"] == "page" for entry in log)
+    # The log is handed out once, like the one of chromedriver
+    assert driver.get_log("performance") == []
+
+
+def test_page_load_times_out_without_a_load_event(driver):
+    driver.set_page_load_timeout(0.1)
+
+    with pytest.raises(TimeoutException):
+        driver.get("http://bookmaker/hanging")
+
+
+def test_failed_navigation_raises(driver):
+    with pytest.raises(WebDriverException, match="ERR_NAME_NOT_RESOLVED"):
+        driver.get("http://unreachable/")
+
+
+def test_page_exceptions_raise_javascript_exceptions(driver):
+    with pytest.raises(JavascriptException, match="thrown by the page"):
+        driver.run(driver.current_tab().evaluate("throw"))
+
+
+def test_protocol_errors_map_to_selenium_exceptions(driver):
+    element = CdpElement(driver, driver.current_tab(), "gone")
+
+    with pytest.raises(StaleElementReferenceException):
+        _ = element.text
+
+
+def test_unsupported_commands_raise(driver):
+    with pytest.raises(UnknownMethodException):
+        driver.execute("actions")
+
+
+def test_pending_commands_fail_when_the_websocket_closes(driver):
+    with pytest.raises(WebDriverException, match="websocket closed"):
+        driver.execute_cdp_cmd("Browser.crash", {})
+
+
+def test_selenium_stays_the_default_backend():
+    assert Webscraper.driver_backend == "selenium"
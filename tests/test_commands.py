@@ -0,0 +1,69 @@
+import pytest
+
+from src.ScrapingService import CommandBudgetExceeded, CommandCounter, Webscraper
+from conftest import StubDriver, make_overview
+
+
+class StrictScraper(Webscraper):
+    prefilter_teams = False
+    stream_output = False
+    command_budget = 2
+    strict_command_budget = True
+
+
+def test_the_command_going_over_the_strict_budget_raises_once():
+    driver = StubDriver()
+    commands = CommandCounter(strict_budget=2)
+    commands.attach(driver)
+    commands.track("match")
+    driver.execute("findElement")
+    driver.execute("getElementText")
+
+    with pytest.raises(CommandBudgetExceeded):
+        driver.execute("getElementText")
+    # The command went through, the cleanup of the match isn't stopped
+    driver.execute("closeWindow")
+
+    assert driver.commands == ["findElement", "getElementText", "getElementText", "closeWindow"]
+    assert commands.match_count("match") == 4
+
+
+def test_commands_outside_of_a_match_are_not_budgeted():
+    driver = StubDriver()
+    commands = CommandCounter(strict_budget=0)
+    commands.attach(driver)
+
+    driver.execute("get")
+    commands.track("match")
+    commands.track(None)
+    driver.execute("getWindowHandles")
+
+    assert driver.commands == ["get", "getWindowHandles"]
+
+
+def test_strict_scraper_fails_the_match_while_it_is_read():
+    scraper = StrictScraper(StubDriver())
+    overview = make_overview()
+    scraper.track_commands(overview)
+    scraper.driver.execute("findElement")
+    scraper.driver.execute("findElement")
+
+    with pytest.raises(CommandBudgetExceeded):
+        scraper.driver.execute("findElement")
+    scraper.record_failure(overview, "over budget")
+
+    assert scraper.over_budget == ["T1 vs Gen.G (3)"]
+
+
+def test_lenient_scraper_only_reports_the_match():
+    class Lenient(StrictScraper):
+        strict_command_budget = False
+
+    scraper = Lenient(StubDriver())
+    overview = make_overview()
+    scraper.track_commands(overview)
+    for _ in range(3):
+        scraper.driver.execute("findElement")
+    scraper.record_failure(overview, "over budget")
+
+    assert scraper.over_budget == ["T1 vs Gen.G (3)"]
@@ -0,0 +1,84 @@
+import pytest
+from selenium.common import NoSuchWindowException
+
+from conftest import StubDriver, make_overview
+from src.Utils import Deadline, DeadlineExceeded
+from src.scrapers import Dafabet
+from src.scrapers.Dafabet import DafabetWebscraper
+
+
+class TabDriver(StubDriver):
+    """
+    Switches between the tabs it was given, the ones closed under the scraper are gone
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.current_window_handle = "main"
+        self.switch_to = self
+        self.gone = set()
+        self.closed = []
+
+    def window(self, handle: str):
+        if handle in self.gone:
+            raise NoSuchWindowException(f"no such window: {handle}")
+        self.current_window_handle = handle
+
+    def close(self):
+        self.closed.append(self.current_window_handle)
+
+
+class Tabs(DafabetWebscraper):
+    stream_output = False
+    prefilter_teams = False
+    detail_cache_ttl = None
+
+    def __init__(self, driver):
+        super().__init__(driver)
+        self.timings.sleep = lambda seconds: None
+
+    def map_element_to_overview_dto(self, league, element):
+        return make_overview(minute=element)
+
+    def open_detail_tab(self, element):
+        return f"tab{element}"
+
+    def detail_tab_steps(self, overview_dto, deadline):
+        yield 0
+        if overview_dto.game_date.minute == 0:
+            # The first tab gets closed while the scraper steps the other one
+            self.driver.gone.add("tab0")
+            yield 0
+        return {}
+
+
+def test_a_tab_closed_under_the_scraper_fails_its_match_only(monkeypatch):
+    monkeypatch.setattr(Dafabet, "detail_tabs", 2)
+    driver = TabDriver()
+    scraper = Tabs(driver)
+
+    games = scraper.map_elements_to_detail_dtos("LCK", [0, 1])
+
+    assert games[0] is None
+    assert games[1].overview.game_date.minute == 1
+    assert scraper.failures == 1
+    assert driver.closed == ["tab1"]
+    assert driver.current_window_handle == "main"
+
+
+class NotReadyDriver(StubDriver):
+    def find_elements(self, by: str, value: str):
+        return ["Game 1"]
+
+    def execute_script(self, script: str, *args):
+        return {"complete": False, "domQuietMs": 0, "networkQuietMs": 0}
+
+
+def test_waiting_for_the_payloads_of_a_tab_follows_its_deadline():
+    scraper = DafabetWebscraper(NotReadyDriver())
+    scraper.capture = object()
+    steps = scraper.detail_tab_steps(make_overview(), Deadline(0))
+
+    with pytest.raises(DeadlineExceeded):
+        for _ in range(1000):
+            next(steps)
@@ -0,0 +1,29 @@
+import json
+
+from conftest import make_detail, make_overview
+from src.Dtos import GameDetailDto
+from src.Json import append_jsonl, read_jsonl
+
+
+def test_jsonl_round_trip(tmp_path):
+    file_path = str(tmp_path / "games.jsonl")
+    games = [make_detail(make_overview(minute=minute)) for minute in range(3)]
+    for game in games:
+        append_jsonl(file_path, game.to_json())
+    # Dates come back as timestamps, so the games are compared as they were written
+    assert [json.loads(game.to_json()) for game in read_jsonl(file_path, GameDetailDto)] == [json.loads(game.to_json()) for game in games]
+
+
+def test_jsonl_skips_line_cut_off_by_crash(tmp_path):
+    file_path = str(tmp_path / "games.jsonl")
+    first, second = make_detail(make_overview(minute=1)), make_detail(make_overview(minute=2))
+    append_jsonl(file_path, first.to_json())
+    with open(file_path, "a") as f:
+        f.write(second.to_json()[:40])
+    # The next line starts on a line of its own instead of being glued to the broken one
+    append_jsonl(file_path, second.to_json())
+    assert [json.loads(game.to_json()) for game in read_jsonl(file_path, GameDetailDto)] == [json.loads(first.to_json()), json.loads(second.to_json())]
+
+
+def test_missing_jsonl_reads_empty(tmp_path):
+    assert read_jsonl(str(tmp_path / "missing.jsonl"), GameDetailDto) == []
@@ -0,0 +1,32 @@
+import glob
+import os
+
+import pytest
+
+from src.ScrapingService import read_payloads
+from src.scrapers import Bet365, Dafabet
+
+# Payload decoder and page source parser of every scraper with a decoder, by its snapshot folder
+decoders = {
+    "Bet365Webscraper": (Bet365.decode_payloads, Bet365.parse_page_source),
+    "DafabetWebscraper": (Dafabet.decode_payloads, Dafabet.parse_page_source),
+}
+
+snapshot_folder = os.path.join(os.path.dirname(__file__), "..", "data", "snapshots")
+
+# Payloads recorded with capture_mode and snapshot_mode, next to the page they were recorded with
+fixtures = [
+    (name, file_path)
+    for name in decoders
+    for file_path in sorted(glob.glob(f"{snapshot_folder}/{name}/*.payloads.json"))
+]
+
+
+@pytest.mark.skipif(not fixtures, reason="No recorded payloads in data/snapshots, decode_mode stays experimental")
+@pytest.mark.parametrize("name,file_path", fixtures)
+def test_payloads_decode_to_the_stats_of_their_page(name, file_path):
+    decode, parse = decoders[name]
+    with open(file_path.replace(".payloads.json", ".html"), "r", encoding="utf-8") as f:
+        page_stats = parse(f.read())
+
+    assert decode(read_payloads(file_path)) == page_stats
@@ -0,0 +1,42 @@
+import pytest
+
+from conftest import StubDriver, make_detail
+from src.scrapers import Pinnacle, pinatest
+
+
+def matchup(matchup_id: int, home_team: str, away_team: str) -> dict:
+    return {
+        "id": matchup_id,
+        "status": "pending",
+        "league": {"name": "League of Legends - LCK"},
+        "participants": [{"alignment": "home", "name": home_team}, {"alignment": "away", "name": away_team}],
+        "startTime": "2030-01-01T12:00:00Z",
+    }
+
+
+class PageDriver(StubDriver):
+    current_url = ""
+
+    def get(self, url: str):
+        self.current_url = url
+
+
+@pytest.mark.parametrize("module", [Pinnacle, pinatest])
+def test_a_failed_harvest_fails_its_match_only(module, monkeypatch):
+    class Scraper(module.PinnacleWebscraper):
+        stream_output = False
+        prefilter_teams = False
+
+        def collect_detail_dto(self, overview_dto):
+            if overview_dto.home_team == "T1":
+                raise Exception("Harvesting failed: market groups not found")
+            return make_detail(overview_dto)
+
+    monkeypatch.setattr(module, "request_matchups", lambda: [matchup(1, "T1", "Gen.G"), matchup(2, "DRX", "FearX")])
+    scraper = Scraper(PageDriver())
+    scraper.readiness.wait = lambda *args, **kwargs: True
+
+    games = scraper.fetch_games()
+
+    assert [game.overview.home_team for game in games] == ["DRX"]
+    assert scraper.failures == 1
@@ -0,0 +1,60 @@
+import glob
+import json
+import os
+
+import pytest
+
+from src.scrapers import PinnacleApi
+from src.scrapers.pinatest import PinnacleWebscraper
+from conftest import StubDriver, make_detail, make_overview
+
+snapshot_folder = os.path.join(os.path.dirname(__file__), "..", "data", "snapshots")
+
+# Responses recorded with snapshot_mode and PINNACLE_HTTP_MODE=1, one file per matchup
+fixtures = sorted(glob.glob(f"{snapshot_folder}/{PinnacleApi.snapshot_name}/*.api.json"))
+
+
+@pytest.mark.skipif(not fixtures, reason="No recorded arcadia responses in data/snapshots, http_mode stays off")
+@pytest.mark.parametrize("file_path", fixtures)
+def test_recorded_responses_map_to_the_detail(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        responses = json.load(f)
+    matchup, related = responses["matchup"], responses["related"]
+    overview = PinnacleApi.map_overview(matchup)
+
+    stats = PinnacleApi.map_markets(matchup, related, responses["markets"])
+
+    assert stats.get("winner")
+    for special in (x["special"] for x in related if x.get("special")):
+        description = special.get("description", "")
+        if description.startswith("(Map 1)"):
+            assert description in PinnacleApi.special_stat_fields, f"Unmapped special {description}"
+    for special_matchup in (x for x in related if x.get("special")):
+        first_side = special_matchup["participants"][0]["name"]
+        # The first participant is taken as the home or over side
+        assert first_side in (overview.home_team, "Over", "Yes"), f"{first_side} isn't the home or over side"
+
+
+def test_scrapers_read_the_page_unless_http_mode_is_set():
+    assert not PinnacleApi.http_mode
+    assert PinnacleWebscraper.uses_browser()
+
+
+def test_http_mode_records_the_covered_games(monkeypatch):
+    class Scraper(PinnacleWebscraper):
+        stream_output = False
+        prefilter_teams = False
+
+    covered, skipped = make_overview("T1", "Gen.G"), make_overview("DRX", "FearX")
+
+    def fetch_games(rate_limiter=None, covers=None, snapshot_mode=False):
+        return [make_detail(overview) for overview in (covered, skipped) if covers(overview)]
+
+    monkeypatch.setattr(PinnacleApi, "http_mode", True)
+    monkeypatch.setattr(PinnacleApi, "fetch_games", fetch_games)
+    scraper = Scraper(StubDriver())
+    scraper.reuse([make_detail(skipped)])
+
+    games = scraper.fetch_games()
+
+    assert [game.overview.home_team for game in games] == ["T1"]
@@ -0,0 +1,136 @@
+from typing import List, Tuple
+
+import pytest
+
+from src.ScrapingService import DriverPool, PooledDriver, Webscraper, fetch_games
+from conftest import StubDriver, make_overview
+
+
+class SwitchTo:
+    def __init__(self, driver: "BrowserDriver"):
+        self.driver = driver
+
+    def window(self, window_name: str):
+        self.driver.current_window_handle = window_name
+
+
+class BrowserDriver(StubDriver):
+    """
+    Keeps the tabs opened by ctrl clicks and the pages loaded through get
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.window_handles = ["main"]
+        self.current_window_handle = "main"
+        self.switch_to = SwitchTo(self)
+        self.loaded = []
+        self.quitted = False
+
+    def get(self, url: str):
+        self.loaded.append(url)
+
+    def open_tab(self) -> str:
+        handle = f"tab{len(self.window_handles)}"
+        self.window_handles.append(handle)
+        return handle
+
+    def implicitly_wait(self, time_to_wait: float):
+        pass
+
+    def quit(self):
+        self.quitted = True
+
+
+class ByUrl(Webscraper):
+    stream_output = False
+    prefilter_teams = False
+
+    @staticmethod
+    def swaps_driver_between_matches() -> bool:
+        return True
+
+
+class ByList(ByUrl):
+    @staticmethod
+    def swaps_driver_between_matches() -> bool:
+        return False
+
+
+def test_pooled_driver_counts_page_loads_and_new_tabs():
+    driver = BrowserDriver()
+    pooled = PooledDriver(driver)
+
+    driver.get("https://example.com")
+    tab = driver.open_tab()
+    driver.switch_to.window(tab)
+    driver.switch_to.window("main")
+    driver.switch_to.window(tab)
+
+    assert pooled.pages == 2
+    assert driver.current_window_handle == tab
+
+
+def run_matches(scraper: type, matches: int) -> Tuple[PooledDriver, List[BrowserDriver]]:
+    started: List[BrowserDriver] = []
+
+    def start_browser() -> BrowserDriver:
+        started.append(BrowserDriver())
+        return started[-1]
+
+    pool = DriverPool(start_browser, size=1, max_pages=2)
+    try:
+        pooled = pool.acquire(timeout=5)
+        instance = scraper(pooled.driver)
+        instance.pool, instance.pooled = pool, pooled
+        for minute in range(matches):
+            instance.start_match(make_overview(minute=minute))
+            instance.driver.get(f"https://example.com/{minute}")
+        return instance.pooled, started
+    finally:
+        pool.close()
+
+
+def test_scrapers_opening_matches_by_url_swap_used_up_browsers_between_matches():
+    pooled, started = run_matches(ByUrl, 5)
+    # Every browser loads max_pages pages before the next match gets a fresh one
+    assert len(started) == 3
+    assert started[0].quitted and started[1].quitted
+    assert pooled.driver is started[2]
+    assert pooled.pages == 1
+
+
+def test_scrapers_reading_a_list_page_keep_their_browser_until_released():
+    pooled, started = run_matches(ByList, 5)
+    assert len(started) == 1
+    assert pooled.pages == 5
+
+
+class FailsAfterSwap(ByUrl):
+    @staticmethod
+    def get_url() -> str:
+        return "https://example.com"
+
+    def fetch_games(self):
+        for minute in range(3):
+            self.start_match(make_overview(minute=minute))
+            self.driver.get(f"https://example.com/{minute}")
+        raise Exception("Page didn't load")
+
+
+def test_failed_run_flags_the_browser_it_swapped_to_as_broken():
+    started: List[BrowserDriver] = []
+
+    def start_browser() -> BrowserDriver:
+        started.append(BrowserDriver())
+        return started[-1]
+
+    pool = DriverPool(start_browser, size=1, max_pages=3)
+    try:
+        with pytest.raises(Exception, match="Page didn't load"):
+            fetch_games(FailsAfterSwap, pool=pool)
+        # The first browser got used up before the last match, the run failed on its replacement
+        assert started[0].quitted and started[1].quitted
+        assert started[1].loaded == ["https://example.com/2"]
+    finally:
+        pool.close()
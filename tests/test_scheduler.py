@@ -0,0 +1,37 @@
+import time
+from datetime import datetime, timedelta
+
+from src.Cache import overview_key
+from src.Dtos import GameOverviewDto
+from src.Scheduler import BookmakerSchedule
+from conftest import make_detail
+
+
+def game_in(minutes: float, home_team: str):
+    kickoff = datetime.now() + timedelta(minutes=minutes)
+    return make_detail(GameOverviewDto(kickoff, "", "LCK", home_team, "Gen.G"))
+
+
+def test_only_the_matches_needing_fresher_odds_get_scraped_again():
+    soon, later = game_in(10, "T1"), game_in(2 * 24 * 60, "DRX")
+    schedule = BookmakerSchedule("Test")
+    schedule.scraped([soon, later])
+    assert not schedule.is_due()
+    assert len(schedule.fresh_games()) == 2
+
+    # Matches 15 minutes from kickoff get new odds every 2 minutes
+    later_scraped_at = schedule.scraped_at[overview_key(later.overview)] = time.time() - 5 * 60
+    schedule.scraped_at[overview_key(soon.overview)] = time.time() - 3 * 60
+    schedule.next_run = schedule.next_due()
+    assert schedule.is_due()
+    assert schedule.fresh_games() == [later]
+
+    schedule.scraped([soon, later])
+    assert schedule.scraped_at[overview_key(later.overview)] == later_scraped_at
+    assert schedule.scraped_at[overview_key(soon.overview)] > later_scraped_at
+
+
+def test_started_matches_are_never_reused():
+    schedule = BookmakerSchedule("Test")
+    schedule.scraped([game_in(-1, "T1")])
+    assert schedule.fresh_games() == []
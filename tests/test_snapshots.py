@@ -0,0 +1,19 @@
+import glob
+import os
+
+import pytest
+
+from src.scrapers import Dafabet
+from conftest import make_overview
+
+snapshot_folder = os.path.join(os.path.dirname(__file__), "..", "data", "snapshots")
+
+
+@pytest.mark.parametrize("file_path", sorted(glob.glob(f"{snapshot_folder}/DafabetWebscraper/*.html")))
+def test_dafabet_snapshots_use_the_market_names_of_the_detail(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        stats = Dafabet.parse_page_source(f.read())
+
+    detail = Dafabet.create_detail_dto(make_overview(), stats)
+
+    assert detail.winner and detail.first_blood and detail.total_kills and detail.kill_handicap
@@ -0,0 +1,39 @@
+import copy
+
+from src import ScrapingService
+from src.Dtos import GameDetailDto, StatDto
+from src.Json import read_jsonl
+from src.ScrapingService import Webscraper
+from conftest import make_detail, make_overview
+
+
+class Streaming(Webscraper):
+    prefilter_teams = False
+
+
+def test_only_changed_games_are_appended_to_the_stream(workdir, monkeypatch):
+    monkeypatch.setattr(ScrapingService, "streamed_games", {})
+    first, second = make_detail(make_overview(minute=1)), make_detail(make_overview(minute=2))
+    Streaming(None).record(first)
+    Streaming(None).record(second)
+
+    # The next refresh finds the same odds for the first match and new ones for the second
+    refresh = Streaming(None)
+    refresh.record(copy.deepcopy(first))
+    moved = copy.deepcopy(second)
+    moved.winner = [StatDto(-1, 1.4, 2.9)]
+    refresh.record(moved)
+
+    streamed = read_jsonl(refresh.stream_path, GameDetailDto)
+    assert [game.winner[0].home_team_score for game in streamed] == [1.5, 1.5, 1.4]
+
+
+def test_games_streamed_by_an_earlier_process_are_not_appended_again(workdir, monkeypatch):
+    monkeypatch.setattr(ScrapingService, "streamed_games", {})
+    game = make_detail()
+    Streaming(None).record(game)
+
+    monkeypatch.setattr(ScrapingService, "streamed_games", {})
+    restarted = Streaming(None)
+    restarted.record(copy.deepcopy(game))
+    assert len(read_jsonl(restarted.stream_path, GameDetailDto)) == 1
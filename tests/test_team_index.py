@@ -0,0 +1,44 @@
+import pytest
+
+from conftest import make_overview
+from src.TeamIndex import TeamIndex, load_team_index, normalize_team_name
+
+
+def test_normalize_drops_case_accents_and_punctuation():
+    assert normalize_team_name("Beşiktaş Esports") == "besiktas esports"
+    assert normalize_team_name("Gen.G") == "gen g"
+    assert normalize_team_name("KT Rolster.Ch") == "kt rolster challengers"
+
+
+def test_index_covers_known_and_close_names():
+    index = TeamIndex({"T1", "Gen.G", "KT Rolster Challengers", "Berlin International Gaming"})
+    assert index.covers(make_overview("T1", "Gen.G"))
+    assert index.covers(make_overview("KT Rolster.Ch", "big"))
+    assert index.covers_team("Gen.G.")
+    assert not index.covers(make_overview("T1", "Unknown Team"))
+    assert not index.covers_team("")
+
+
+@pytest.mark.parametrize("team_name", ["Gen.G Esports", "T1 Esports", "Hanwha Life", "Bilibili Gaming Dreamsmart"])
+def test_index_covers_the_names_json_names_fix_corrects(team_name):
+    index = TeamIndex({"T1", "Gen.G", "Hanwha Life Esports", "Bilibili Gaming", "DRX"})
+    assert index.covers_team(team_name)
+
+
+def test_index_skips_names_json_names_fix_keeps_unmatched():
+    index = TeamIndex({"T1", "Gen.G", "Hanwha Life Esports", "Bilibili Gaming", "DRX"})
+    assert not index.covers_team("Fnatic")
+    assert not index.covers_team("G2 Esports")
+
+
+def test_index_loads_teams_of_database(tmp_path):
+    file_path = tmp_path / "data_transformed.csv"
+    file_path.write_text("t1,t2\nT1,Gen.G\nDRX,FearX\n", encoding="utf-8")
+    index = load_team_index(str(file_path))
+    assert index.covers(make_overview("DRX", "Gen.G"))
+    assert not index.covers(make_overview("DRX", "Hanwha Life Esports"))
+
+
+def test_missing_database_fails_loudly(tmp_path):
+    with pytest.raises(FileNotFoundError, match="prefilter_teams"):
+        load_team_index(str(tmp_path / "missing.csv"))
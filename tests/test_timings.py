@@ -0,0 +1,33 @@
+import threading
+import time
+
+from src.ScrapingService import ScrapeTimings
+
+
+def test_single_thread_report_splits_wall_time():
+    timings = ScrapeTimings()
+    timings.add_wait(0.5)
+    assert "0.5s waiting" in timings.report("Test")
+    assert "threads" not in timings.report("Test")
+
+
+def test_waits_are_kept_per_thread():
+    timings = ScrapeTimings()
+
+    def worker():
+        timings.sleep(0.05)
+        timings.sleep(0.05)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    time.sleep(0.01)
+
+    assert len(timings.threads) == 5
+    assert all(abs(t.waiting - 0.1) < 0.01 for t in list(timings.threads.values())[1:])
+    report = timings.report("Test")
+    assert "on 5 threads" in report
+    # Summed waits exceed the wall time, so they are reported as thread time with the overlap
+    assert "x overlap" in report
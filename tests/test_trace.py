@@ -0,0 +1,42 @@
+import json
+
+from src import Trace
+from src.Trace import Tracer
+
+
+def test_span_records_complete_event(tmp_path):
+    tracer = Tracer()
+    with tracer.span("load match page", "navigation", url="x"):
+        pass
+    file_path = tmp_path / "trace.json"
+    assert tracer.export(str(file_path)) == 1
+
+    events = json.loads(file_path.read_text())["traceEvents"]
+    metadata = [event for event in events if event["ph"] == "M"]
+    spans = [event for event in events if event["ph"] == "X"]
+    assert metadata[0]["name"] == "thread_name"
+    assert spans[0]["name"] == "load match page" and spans[0]["args"] == {"url": "x"}
+    assert spans[0]["dur"] >= 0
+    # Exported events are forgotten
+    assert tracer.export(str(file_path)) == 0
+
+
+def test_async_span_pairs_begin_and_end(tmp_path):
+    tracer = Tracer()
+    first = tracer.begin("tab 1", "match")
+    second = tracer.begin("tab 2", "match")
+    tracer.end(first, collected=True)
+    tracer.end(second, collected=False)
+    events = tracer.events
+    assert [(event["ph"], event["id"]) for event in events] == [("b", first), ("b", second), ("e", first), ("e", second)]
+    assert events[2]["name"] == "tab 1" and events[2]["args"] == {"collected": True}
+    assert tracer.open_spans == {}
+
+
+def test_disabled_tracing_records_nothing(monkeypatch):
+    monkeypatch.setattr(Trace, "tracing", False)
+    tracer = Tracer()
+    with tracer.span("x", "y"):
+        pass
+    tracer.end(tracer.begin("x", "y"))
+    assert tracer.events == []
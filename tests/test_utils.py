@@ -0,0 +1,75 @@
+import pytest
+from selenium.common import TimeoutException
+from selenium.webdriver.common.timeouts import Timeouts
+
+from src.Utils import Deadline, DeadlineExceeded, ScrollBox, run_steps
+
+
+class HarvestDriver:
+    """
+    Answers the harvest polls with None until the page loop is done
+    """
+
+    def __init__(self, polls_until_done: int, result: dict):
+        self.polls_until_done = polls_until_done
+        self.result = result
+        self.scripts = []
+
+    def execute_script(self, script: str, *args):
+        self.scripts.append(script)
+        if script.startswith("return window.__scrollHarvest"):
+            self.polls_until_done -= 1
+            return self.result if self.polls_until_done <= 0 else None
+        return None
+
+
+def test_harvest_steps_yields_until_the_page_is_done():
+    driver = HarvestDriver(3, {"items": [{"title": "Game 1 Win"}]})
+    steps = ScrollBox(lambda: "box").harvest_steps(driver, "return [];", poll_interval=0.01)
+
+    waits = []
+    with pytest.raises(StopIteration) as result:
+        while True:
+            waits.append(next(steps))
+
+    assert result.value.value == [{"title": "Game 1 Win"}]
+    assert waits == [0.01, 0.01, 0.01]
+    assert len(driver.scripts) == 4  # the start and three polls
+
+
+def test_harvest_steps_raises_the_page_error():
+    driver = HarvestDriver(1, {"error": "TypeError"})
+    with pytest.raises(Exception, match="TypeError"):
+        run_steps(ScrollBox(lambda: "box").harvest_steps(driver, "return [];", poll_interval=0))
+
+
+def test_harvest_steps_gives_up_with_the_deadline():
+    driver = HarvestDriver(1000, {"items": []})
+    steps = ScrollBox(lambda: "box").harvest_steps(driver, "return [];", deadline=Deadline(0.05), poll_interval=0.01)
+    with pytest.raises(DeadlineExceeded):
+        run_steps(steps)
+
+
+class TimeoutDriver:
+    def __init__(self, script_timeout: float):
+        self.script_timeout = script_timeout
+        self.timeouts_during_script = []
+
+    @property
+    def timeouts(self):
+        return Timeouts(script=self.script_timeout)
+
+    def set_script_timeout(self, time_to_wait: float):
+        self.script_timeout = time_to_wait
+
+    def execute_async_script(self, script: str, *args):
+        self.timeouts_during_script.append(self.script_timeout)
+        raise TimeoutException("script timeout")
+
+
+def test_harvest_restores_the_script_timeout():
+    driver = TimeoutDriver(30)
+    with pytest.raises(TimeoutException):
+        ScrollBox(lambda: "box", harvest_timeout=5).harvest(driver, "return [];")
+    assert driver.timeouts_during_script == [5]
+    assert driver.script_timeout == 30
@@ -0,0 +1,208 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from src import WorkQueue as work_queue_module
+from src.Dtos import GameOverviewDto, StatDto
+from src.ScrapingService import Webscraper
+from src.WorkQueue import LeaseKeeper, WorkQueue, coordinate, work
+from conftest import StubDriver, make_detail, make_overview
+
+
+@pytest.fixture
+def queue_path(workdir):
+    return str(workdir / "data" / "work_queue.sqlite")
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(work_queue_module, "poll_seconds", 0.01)
+
+
+def overviews(count: int):
+    return [make_overview(f"Home {i}", f"Away {i}", minute=i, url=f"https://bookmaker/{i}") for i in range(count)]
+
+
+class QueuedScraper(Webscraper):
+    stream_output = False
+    prefilter_teams = False
+    matches = overviews(3)
+    # Matches whose page fails on every worker
+    broken = {"https://bookmaker/2"}
+
+    @staticmethod
+    def create_driver(scraper: type):
+        return StubDriver()
+
+    @staticmethod
+    def supports_work_queue() -> bool:
+        return True
+
+    def discover_jobs(self):
+        return self.matches, []
+
+    def fetch_job(self, overview_dto: GameOverviewDto):
+        self.start_match(overview_dto)
+        if overview_dto.url in self.broken:
+            raise Exception("Page didn't load")
+        return make_detail(overview_dto)
+
+
+def test_jobs_are_queued_once_per_run_and_leased_oldest_first(queue_path):
+    queue = WorkQueue(queue_path)
+
+    assert queue.enqueue("run", "Scraper", overviews(2)) == 2
+    assert queue.enqueue("run", "Scraper", overviews(3)) == 1
+    first = queue.lease("worker-1", ["Scraper"])
+    second = queue.lease("worker-2", ["Scraper"])
+
+    assert (first.overview.home_team, first.attempts) == ("Home 0", 1)
+    assert second.overview.home_team == "Home 1"
+    assert queue.lease("worker-1", ["Other"]) is None
+    assert queue.counts("run", "Scraper") == {"leased": 2, "pending": 1}
+
+
+def test_jobs_of_older_runs_are_not_leased(queue_path):
+    queue = WorkQueue(queue_path)
+    queue.enqueue("crashed run", "Scraper", overviews(2))
+    queue.enqueue("run", "Scraper", overviews(1))
+
+    assert queue.lease("worker", ["Scraper"]).run_id == "run"
+    assert queue.lease("worker", ["Scraper"]) is None
+    assert queue.counts("crashed run", "Scraper") == {"pending": 2}
+
+
+def test_cancelled_jobs_drop_their_late_results(queue_path):
+    queue = WorkQueue(queue_path)
+    queue.enqueue("run", "Scraper", overviews(2))
+    job = queue.lease("worker", ["Scraper"])
+
+    assert queue.cancel("run", "Scraper") == 2
+    queue.complete(job, "worker", make_detail(job.overview))
+
+    assert not queue.renew(job, "worker")
+    assert queue.lease("worker", ["Scraper"]) is None
+    assert queue.counts("run", "Scraper") == {"cancelled": 2}
+
+
+def test_expired_lease_goes_back_to_the_queue(queue_path):
+    queue = WorkQueue(queue_path, lease_seconds=0.05)
+    queue.enqueue("run", "Scraper", overviews(1))
+    job = queue.lease("dead-worker", ["Scraper"])
+    time.sleep(0.1)
+
+    retried = queue.lease("worker", ["Scraper"])
+
+    assert (retried.id, retried.attempts) == (job.id, 2)
+    assert not queue.renew(job, "dead-worker")
+    assert queue.renew(retried, "worker")
+
+
+def test_job_fails_after_max_attempts(queue_path):
+    queue = WorkQueue(queue_path, lease_seconds=0.05, max_attempts=2)
+    queue.enqueue("run", "Scraper", overviews(1))
+    queue.fail(queue.lease("worker", ["Scraper"]), "worker", "Page didn't load")
+    queue.lease("worker", ["Scraper"])
+    time.sleep(0.1)
+
+    assert queue.requeue_expired() == 1
+    assert queue.counts("run", "Scraper") == {"failed": 1}
+    assert queue.lease("worker", ["Scraper"]) is None
+
+
+def test_late_result_is_kept_unless_another_worker_finished_first(queue_path):
+    queue = WorkQueue(queue_path, lease_seconds=0.05)
+    queue.enqueue("run", "Scraper", overviews(1))
+    slow = queue.lease("slow-worker", ["Scraper"])
+    time.sleep(0.1)
+    fast = queue.lease("fast-worker", ["Scraper"])
+
+    queue.complete(fast, "fast-worker", make_detail(fast.overview, winner=[StatDto(-1, 1.2, 3.0)]))
+    queue.complete(slow, "slow-worker", make_detail(slow.overview))
+
+    assert [game.winner for game in queue.results("run", "Scraper")] == [[StatDto(-1, 1.2, 3.0)]]
+
+
+def test_transactions_take_the_write_lock_up_front(queue_path):
+    queue = WorkQueue(queue_path)
+    with queue.transaction():
+        other = sqlite3.connect(queue_path, timeout=0, isolation_level=None)
+        try:
+            with pytest.raises(sqlite3.OperationalError, match="locked"):
+                other.execute("BEGIN IMMEDIATE")
+        finally:
+            other.close()
+
+
+def test_concurrent_workers_never_lease_the_same_job(queue_path):
+    queue = WorkQueue(queue_path)
+    queue.enqueue("run", "Scraper", overviews(40))
+    leased = []
+
+    def lease_all(worker: str):
+        while True:
+            job = queue.lease(worker, ["Scraper"])
+            if job is None:
+                return
+            leased.append(job.id)
+
+    threads = [threading.Thread(target=lease_all, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(leased) == sorted(set(leased))
+    assert len(leased) == 40
+
+
+def test_lease_keeper_renews_the_job_it_holds(queue_path):
+    queue = WorkQueue(queue_path, lease_seconds=0.3)
+    queue.enqueue("run", "Scraper", overviews(1))
+    keeper = LeaseKeeper(queue, "worker")
+    try:
+        keeper.job = queue.lease("worker", ["Scraper"])
+        time.sleep(0.6)
+
+        assert queue.lease("other-worker", ["Scraper"]) is None
+    finally:
+        keeper.stop()
+    time.sleep(0.4)
+
+    assert queue.lease("other-worker", ["Scraper"]) is not None
+
+
+def test_coordinator_collects_the_games_of_the_workers(queue_path):
+    queue = WorkQueue(queue_path, max_attempts=1)
+    collected = []
+    workers = [
+        threading.Thread(target=lambda name=name: collected.append(work([QueuedScraper], queue, name, None, 0.2)))
+        for name in ("worker-1", "worker-2")
+    ]
+    for worker in workers:
+        worker.start()
+
+    games = coordinate(QueuedScraper, queue, "run")
+    for worker in workers:
+        worker.join()
+
+    assert sorted(game.overview.home_team for game in games) == ["Home 0", "Home 1"]
+    assert sum(collected) == 2
+    assert queue.counts("run", "QueuedScraper") == {"done": 2, "failed": 1}
+
+
+class OutOfBudget(QueuedScraper):
+    run_budget_seconds = 0.01
+
+    def discover_jobs(self):
+        time.sleep(0.02)
+        return super().discover_jobs()
+
+
+def test_coordinator_out_of_budget_cancels_the_jobs_left(queue_path):
+    queue = WorkQueue(queue_path)
+
+    assert coordinate(OutOfBudget, queue, "run") == []
+    assert queue.counts("run", "OutOfBudget") == {"cancelled": 3}